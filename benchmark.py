@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark on synthetic ontologies (see synthetic_ontology.py).
+
+For every scale the pipeline stages run in this process and are timed
+individually, with peak traced memory per stage:
+
+  generate        build the synthetic graph
+  export          route node/relationship records through bulk_export's
+                  BulkRouter and build every level document (the Python
+                  side of the export; no database round trips)
+  write_json      write the level exports
+  hierarchy       build and save the CSR rollup index (hierarchy.py)
+  load_aggregate  read them back and run render_one.aggregate_relationships
+  render_cards    render every card with the shared Jinja environment
+  diagrams        generate the DOT files (--graphviz also runs dot)
+  assemble        title page + diagrams section + cards into one document
+
+Results are written as JSON so runs can be compared between commits:
+
+    python3 benchmark.py --scales 1 10 --out bench/base.json
+    python3 benchmark.py --scales 1 10 --compare bench/base.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import bulk_export
+import export_level
+import generate_diagrams
+import hierarchy
+import render_all
+import render_one
+import synthetic_ontology
+from export_format import load_export
+from schema_cache import SchemaCache
+
+
+BENCHMARK_VERSION = 1
+
+LEVELS = [
+    "Hub", "Category", "Kind", "Family",
+    "AirType", "AirSubType", "AirVariant", "AirSubVariant", "AirModel", "AirSubModel", "AirInstance",
+    "ShipType", "ShipSubType", "ShipClass", "ShipSubClass", "ShipInstance",
+]
+
+
+class StageTimer:
+    def __init__(self, *, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.trace_memory:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = None
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            self.stages[name] = {"seconds": round(seconds, 6), "peak_bytes": peak}
+            mem = f", peak {peak / 2**20:,.1f} MiB" if peak is not None else ""
+            print(f"  {name:<15} {seconds:9.3f}s{mem}")
+
+
+def git_revision(root: Path) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root, check=True, capture_output=True, text=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, check=True,
+            capture_output=True, text=True,
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def run_scale(scale: int, args, work_dir: Path, root: Path) -> Dict[str, Any]:
+    timer = StageTimer(trace_memory=not args.no_memory)
+    json_dir = work_dir / "json"
+    cards_dir = work_dir / "cards"
+    diagrams_dir = work_dir / "diagrams"
+    for d in (json_dir, cards_dir, diagrams_dir):
+        d.mkdir(parents=True, exist_ok=True)
+
+    with timer.stage("generate"):
+        graph = synthetic_ontology.generate(scale, args.seed)
+
+    with timer.stage("export"):
+        router = bulk_export.BulkRouter(LEVELS, stream=args.stream)
+        for labels, name in graph.node_records():
+            router.add_node(labels, name)
+        for rec in graph.relationship_records():
+            router.add_relationship(*rec)
+        schema = SchemaCache.from_nodes(zip(graph.node_labels, graph.node_props), {t for _, t, _ in graph.rels})
+        docs = router.documents({"database": f"synthetic-{scale}x"}, schema)
+        del router
+
+    with timer.stage("write_json"):
+        for lvl in LEVELS:
+            export_level.write_export(docs[lvl], str(json_dir / f"{lvl}.json"),
+                                      compact=args.compact, compress=args.gzip)
+    outgoing_rows = sum(len(d["card"]["relationships"]["outgoing"]) for d in docs.values())
+    del docs
+
+    with timer.stage("hierarchy"):
+        index_levels = hierarchy.hierarchy_levels(LEVELS)
+        rel_types = set(hierarchy.hierarchy_rel_types(index_levels))
+        index = hierarchy.build_index(
+            ((i, labels, graph.name(i)) for i, labels in enumerate(graph.node_labels)),
+            ((start, end) for start, rel_type, end in graph.rels if rel_type in rel_types),
+            index_levels,
+        )
+        index.save(hierarchy.index_dir_for(json_dir))
+
+    with timer.stage("load_aggregate"):
+        for lvl in LEVELS:
+            rels = load_export(json_dir / f"{lvl}.json")["card"]["relationships"]
+            render_one.aggregate_relationships(rels.get("outgoing", []))
+
+    with timer.stage("render_cards"):
+        env = render_one.make_env(root / "templates")
+        rendered_files = []
+        for lvl in LEVELS:
+            md_path = cards_dir / f"{lvl}.md"
+            data = load_export(json_dir / f"{lvl}.json")
+            md_path.write_text(render_one.render_card(data, env, hierarchy_index=index), encoding="utf-8")
+            rendered_files.append(md_path)
+
+    with timer.stage("diagrams"):
+        for name, generator, _ in generate_diagrams.DIAGRAMS:
+            dot_path = diagrams_dir / f"{name}.dot"
+            dot_path.write_text(generator(json_dir), encoding="utf-8")
+            if args.graphviz:
+                generate_diagrams.render_dot_to_pdf(dot_path, diagrams_dir / f"{name}.pdf")
+
+    stats = graph.statistics()
+    with timer.stage("assemble"):
+        sections = render_all.assemble_sections(root / "templates", LEVELS, rendered_files, stats)
+        with (work_dir / "ontology_cards.md").open("w", encoding="utf-8") as out:
+            out.writelines(text for _, text in sections)
+
+    return {
+        "scale": scale,
+        "graph": {
+            "nodes": stats["nodes"],
+            "relationships": stats["relationships"],
+            "exported_outgoing_rows": outgoing_rows,
+            "json_bytes": sum(p.stat().st_size for p in json_dir.iterdir() if p.is_file()),
+        },
+        "stages": timer.stages,
+    }
+
+
+def merge_repeats(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Best (minimum) time and largest peak per stage over repeated runs."""
+    merged = dict(runs[0])
+    stages = {}
+    for name in runs[0]["stages"]:
+        samples = [r["stages"][name] for r in runs]
+        peaks = [s["peak_bytes"] for s in samples if s["peak_bytes"] is not None]
+        stages[name] = {
+            "seconds": min(s["seconds"] for s in samples),
+            "peak_bytes": max(peaks) if peaks else None,
+            "samples": [s["seconds"] for s in samples],
+        }
+    merged["stages"] = stages
+    return merged
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    """Print per-stage time ratios against ``baseline``; returns the number of regressions."""
+    base_runs = {r["scale"]: r for r in baseline.get("runs", [])}
+    print(f"\nComparison with {baseline.get('commit') or 'baseline'} (regression > {threshold:.0%}):")
+    if baseline.get("options") != current.get("options"):
+        # e.g. tracemalloc on one side only skews every timing
+        print(f"  note: options differ (baseline {baseline.get('options')}, now {current.get('options')})")
+    print(f"  {'scale':>5}  {'stage':<15} {'base s':>10} {'now s':>10} {'ratio':>7}")
+    regressions = 0
+    for run in current["runs"]:
+        base = base_runs.get(run["scale"])
+        if base is None:
+            continue
+        for name, now in run["stages"].items():
+            before = base["stages"].get(name)
+            if not before or not before["seconds"]:
+                continue
+            ratio = now["seconds"] / before["seconds"]
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"  {run['scale']:>4}x  {name:<15} {before['seconds']:>10.3f} {now['seconds']:>10.3f} "
+                  f"{ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100],
+                    help="Synthetic graph sizes to run (default: 1 10 100)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=1,
+                    help="Run each scale this many times; keep the best time per stage (default: 1)")
+    ap.add_argument("--stream", action="store_true", help="Export with streaming aggregation (see --stream)")
+    ap.add_argument("--compact", action="store_true", help="Write compact exports (see export_format.py)")
+    ap.add_argument("--gzip", action="store_true", help="Gzip the exports")
+    ap.add_argument("--graphviz", action="store_true", help="Also render the DOT files to PDF with dot")
+    ap.add_argument("--no-memory", action="store_true",
+                    help="Skip tracemalloc (it slows allocation-heavy stages down)")
+    ap.add_argument("--work-dir", default=None,
+                    help="Keep generated exports, cards and diagrams here (default: temporary directory)")
+    ap.add_argument("--out", default=None, help="Write results JSON here")
+    ap.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.10,
+                    help="Relative slowdown reported as a regression with --compare (default: 0.10)")
+    ap.add_argument("--fail-on-regression", action="store_true",
+                    help="Exit with status 1 when --compare finds a regression")
+    args = ap.parse_args(argv)
+
+    root = Path(__file__).parent.resolve()
+    results: Dict[str, Any] = {
+        "benchmark_version": BENCHMARK_VERSION,
+        **git_revision(root),
+        "generated_utc": export_level.now_utc(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "stream": args.stream,
+            "compact": args.compact,
+            "gzip": args.gzip,
+            "graphviz": args.graphviz,
+            "memory": not args.no_memory,
+        },
+        "runs": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="ontology-bench-") as tmp:
+        base_dir = Path(args.work_dir) if args.work_dir else Path(tmp)
+        for scale in args.scales:
+            runs = []
+            for i in range(args.repeat):
+                print(f"Scale {scale}x" + (f" (run {i + 1}/{args.repeat})" if args.repeat > 1 else ""))
+                runs.append(run_scale(scale, args, base_dir / f"{scale}x", root))
+            results["runs"].append(merge_repeats(runs))
+            g = results["runs"][-1]["graph"]
+            print(f"  graph: {g['nodes']:,} nodes, {g['relationships']:,} relationships, "
+                  f"{g['json_bytes']:,} bytes of JSON")
+
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"Wrote {out}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(baseline, results, args.threshold)
+        if regressions and args.fail_on_regression:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
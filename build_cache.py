@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Content-addressed build cache for rendered artifacts.
+
+Each artifact (a Markdown card, a DOT file, a diagram PDF, the assembled
+document) is recorded in a per-namespace manifest with the hash of the
+inputs it was built from and the hash of the file that was written. On the
+next run the artifact is reused when both still match, so a no-op rebuild
+does no rendering at all.
+
+Each cache prints one summary line of hits and misses. With
+BUILD_CACHE_VERBOSE set in the environment (render_all.py --cache-verbose,
+inherited by its subprocesses) every lookup is also printed as a hit or miss.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+
+Part = Union[str, bytes]
+
+VERBOSE_ENV = "BUILD_CACHE_VERBOSE"
+
+
+def digest(*parts: Part) -> str:
+    """Hash a sequence of strings/bytes (length-prefixed, so parts cannot run together)."""
+    h = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8") if isinstance(part, str) else part
+        h.update(str(len(data)).encode("ascii") + b":")
+        h.update(data)
+    return h.hexdigest()
+
+
+def file_digest(path: Path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def files_digest(paths: Iterable[Path]) -> str:
+    """Digest of several files, including their names (missing files hash as empty)."""
+    parts = []
+    for p in sorted(Path(x) for x in paths):
+        parts.append(p.name)
+        parts.append(p.read_bytes() if p.exists() else b"")
+    return digest(*parts)
+
+
+def _json_default(obj):
+    # Lazy views over compact exports (export_format.OutgoingColumns) hash their encoded form.
+    to_json = getattr(obj, "to_json", None)
+    return to_json() if to_json is not None else str(obj)
+
+
+def card_digest(data: dict) -> str:
+    """Digest of the part of an exported level document that rendering reads (not meta)."""
+    return digest(json.dumps(data.get("card"), sort_keys=True, default=_json_default))
+
+
+class BuildCache:
+    def __init__(self, cache_dir: Path, namespace: str, *, enabled: bool = True, verbose: bool = False):
+        self.enabled = enabled
+        self.verbose = verbose
+        self.path = Path(cache_dir) / f"{namespace}.json"
+        self.namespace = namespace
+        self.entries: Dict[str, Dict[str, str]] = {}
+        self.hits = 0
+        self.misses = 0
+        if enabled and self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def is_fresh(self, artifact: Path, key: str) -> bool:
+        """True when ``artifact`` exists and was built from inputs hashing to ``key``."""
+        fresh = False
+        if self.enabled:
+            entry = self.entries.get(str(artifact))
+            artifact = Path(artifact)
+            fresh = (
+                entry is not None
+                and entry.get("key") == key
+                and artifact.exists()
+                and entry.get("output") == file_digest(artifact)
+            )
+
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.verbose:
+            print(f"  cache {'hit ' if fresh else 'miss'} {artifact}")
+        return fresh
+
+    def record(self, artifact: Path, key: str) -> None:
+        if self.enabled:
+            self.entries[str(artifact)] = {"key": key, "output": file_digest(Path(artifact))}
+
+    def save(self) -> None:
+        if not self.enabled:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self.entries, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return f"{self.namespace}: cache disabled"
+        return f"{self.namespace}: {self.hits} hit(s), {self.misses} miss(es)"
+
+
+def open_cache(cache_dir: Optional[Path], namespace: str) -> BuildCache:
+    """A cache for ``namespace``; passing no directory gives a disabled cache."""
+    return BuildCache(cache_dir or Path("."), namespace, enabled=cache_dir is not None,
+                      verbose=bool(os.environ.get(VERBOSE_ENV)))
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Single-scan export of every level.
+
+Instead of running the per-level label scans of export_level.py once per
+level, stream every (relevant) node once and every (relevant) relationship
+once, route each record to the levels it belongs to by label, and build each
+level's document with the same build_level_doc() used by export_level.py.
+Property names and types come from the run's schema cache (schema_cache.py),
+so the node scan does not read property keys; property profiles, when asked
+for, are separate bounded queries per level (property_profile.py).
+"""
+
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import property_profile
+import tracing
+from export_level import (
+    OutgoingAggregator,
+    build_level_doc,
+    config_from_env,
+    level_plan,
+    relationships_mode_for,
+    sanitize_label,
+    write_export,
+)
+from schema_cache import SchemaCache
+
+
+Q_NODES = """
+MATCH (n)
+WHERE any(l IN labels(n) WHERE l IN $levels)
+RETURN labels(n) AS labels, n.Shark_Name AS name
+"""
+
+Q_RELATIONSHIPS = """
+MATCH (src)-[r]->(tgt)
+WHERE any(l IN labels(src) WHERE l IN $levels) OR type(r) IN $levels
+RETURN
+  src.Shark_Name AS from_name,
+  type(r) AS rel_type,
+  tgt.Shark_Name AS to_name,
+  labels(src) AS source_labels,
+  labels(tgt) AS target_labels
+"""
+
+
+def cypher_sort_key(value: Any):
+    """Sort key matching Cypher ORDER BY for the scalar types Shark_Name takes."""
+    if isinstance(value, str):
+        return (0, value)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    return (3, str(value))
+
+
+def _is_listed_name(value: Any) -> bool:
+    # Cypher: n.Shark_Name IS NOT NULL AND trim(toString(n.Shark_Name)) <> ''
+    return value is not None and str(value).strip() != ""
+
+
+class LevelCollector:
+    """
+    Accumulates the rows the per-level export queries would have returned.
+
+    With ``stream`` set, outgoing rows of generalized levels go straight into
+    an OutgoingAggregator instead of being retained. Levels whose card lists
+    no nodes (see export_level.level_plan) keep no parent links and report
+    only their node count.
+    """
+
+    def __init__(self, level_label: str, *, stream: bool = False):
+        self.level_label = level_label
+        self.grouping: Set[str] = set()
+        self.node_names: Set[Any] = set()
+        self.outgoing: List[Dict[str, Any]] = []
+        self.parent_groups: Dict[Any, Set[Any]] = {}
+        self.aggregator: Optional[OutgoingAggregator] = None
+        self.plan = level_plan(level_label)
+        if stream:
+            detailed = relationships_mode_for(level_label) == "detailed"
+            self.aggregator = OutgoingAggregator(level_label, keep_rows=detailed)
+
+    def clear_nodes(self) -> None:
+        self.grouping.clear()
+        self.node_names.clear()
+
+    def clear_relationships(self) -> None:
+        self.outgoing = []
+        self.parent_groups = {}
+        if self.aggregator is not None:
+            self.aggregator = OutgoingAggregator(self.level_label, keep_rows=self.aggregator.keep_rows)
+
+    def add_node(self, labels: List[str], name: Any) -> None:
+        self.grouping.update(labels)
+        if _is_listed_name(name):
+            self.node_names.add(name)
+
+    def add_outgoing(self, row: Dict[str, Any]) -> None:
+        if row["from_name"] is None or row["to_name"] is None:
+            return
+        if self.aggregator is not None and not self.aggregator.keep_rows:
+            self.aggregator.add(row)
+        else:
+            self.outgoing.append(row)
+
+    def add_parent_link(self, parent_name: Any, child_name: Any) -> None:
+        if not self.plan["parent_groups"]:
+            return
+        if _is_listed_name(parent_name) and _is_listed_name(child_name):
+            self.parent_groups.setdefault(parent_name, set()).add(child_name)
+
+    def outgoing_aggregate(self) -> Optional[OutgoingAggregator]:
+        if self.aggregator is not None and self.aggregator.keep_rows:
+            # Detailed rows still need the server's ORDER BY before aggregation.
+            self.aggregator.extend(self.rows()["outgoing"])
+            self.outgoing = []
+        return self.aggregator
+
+    def rows(self) -> Dict[str, List[Dict[str, Any]]]:
+        outgoing = sorted(
+            self.outgoing,
+            key=lambda r: (
+                cypher_sort_key(r["from_name"]),
+                cypher_sort_key(r["rel_type"]),
+                cypher_sort_key(r["to_name"]),
+            ),
+        )
+        parent_groups = [
+            {"parent_name": parent, "child_names": list(children)}
+            for parent, children in sorted(self.parent_groups.items(), key=lambda kv: cypher_sort_key(kv[0]))
+        ]
+        rows = {
+            "grouping": [{"grouping": list(self.grouping)}],
+            "outgoing": outgoing,
+            "parent_groups": parent_groups,
+        }
+        if self.plan["show_node_list"]:
+            rows["nodes"] = [{"node_names": list(self.node_names)}]
+        else:
+            rows["node_count"] = [{"node_count": len(self.node_names)}]
+        return rows
+
+
+class BulkRouter:
+    """Routes streamed node and relationship records to per-level collectors."""
+
+    def __init__(self, levels: Iterable[str], *, stream: bool = False):
+        self.collectors: Dict[str, LevelCollector] = {
+            lvl: LevelCollector(lvl, stream=stream) for lvl in (sanitize_label(l) for l in levels)
+        }
+
+    def clear_nodes(self) -> None:
+        for collector in self.collectors.values():
+            collector.clear_nodes()
+
+    def clear_relationships(self) -> None:
+        for collector in self.collectors.values():
+            collector.clear_relationships()
+
+    def add_node(self, labels: List[str], name: Any) -> None:
+        for lbl in labels:
+            collector = self.collectors.get(lbl)
+            if collector is not None:
+                collector.add_node(labels, name)
+
+    def add_relationship(
+        self,
+        from_name: Any,
+        rel_type: str,
+        to_name: Any,
+        source_labels: List[str],
+        target_labels: List[str],
+    ) -> None:
+        for lbl in source_labels:
+            collector = self.collectors.get(lbl)
+            if collector is not None:
+                collector.add_outgoing(
+                    {
+                        "from_name": from_name,
+                        "rel_type": rel_type,
+                        "to_name": to_name,
+                        "source_labels": source_labels,
+                        "target_labels": target_labels,
+                    }
+                )
+
+        # Parent groups: (p)-[:Level]->(n:Level)
+        collector = self.collectors.get(rel_type)
+        if collector is not None and rel_type in target_labels:
+            collector.add_parent_link(from_name, to_name)
+
+    def documents(self, cfg: dict, schema: SchemaCache,
+                  profiles: Optional[Dict[str, dict]] = None) -> Dict[str, dict]:
+        docs = {}
+        for lvl, c in self.collectors.items():
+            outgoing = c.outgoing_aggregate()
+            docs[lvl] = build_level_doc(cfg, lvl, c.rows(), outgoing, schema=schema,
+                                        profile=(profiles or {}).get(lvl))
+        return docs
+
+
+def stream_into(router: BulkRouter, session) -> None:
+    """
+    Feed one node scan and one relationship scan from Neo4j into ``router``.
+
+    Each transaction function first clears what its scan collects:
+    execute_read runs it again on a transient error, and a retry must not
+    count the records of the failed attempt.
+    """
+    levels = list(router.collectors)
+
+    def consume_nodes(tx):
+        router.clear_nodes()
+        rows = 0
+        for rec in tx.run(Q_NODES, levels=levels):
+            router.add_node(rec["labels"], rec["name"])
+            rows += 1
+        return rows
+
+    def consume_relationships(tx):
+        router.clear_relationships()
+        expected = sum(tracing.expected_rows(lvl) or 0 for lvl in levels) or None
+        progress = tracing.progress("bulk relationships", expected)
+        rows = 0
+        for rec in tx.run(Q_RELATIONSHIPS, levels=levels):
+            router.add_relationship(
+                rec["from_name"], rec["rel_type"], rec["to_name"], rec["source_labels"], rec["target_labels"]
+            )
+            progress.advance()
+            rows += 1
+        progress.close()
+        return rows
+
+    with tracing.span("query", "cypher", query="bulk_nodes") as span:
+        span["rows"] = session.execute_read(consume_nodes)
+    with tracing.span("query", "cypher", query="bulk_relationships") as span:
+        span["rows"] = session.execute_read(consume_relationships)
+
+
+def bulk_export(cfg: dict, levels: List[str], driver=None, *, stream: bool = False,
+                schema: Optional[SchemaCache] = None, profile_budget: Optional[int] = None) -> Dict[str, dict]:
+    """Export all ``levels`` from two linear scans; returns {level: document}."""
+    if driver is None:
+        from neo4j import GraphDatabase
+
+        with GraphDatabase.driver(cfg["uri"], auth=(cfg["user"], cfg["password"])) as own_driver:
+            return bulk_export(cfg, levels, driver=own_driver, stream=stream, schema=schema,
+                               profile_budget=profile_budget)
+
+    router = BulkRouter(levels, stream=stream)
+    profiles = {}
+    with driver.session(database=cfg["database"]) as session:
+        if schema is None:
+            schema = SchemaCache.fetch(session)
+        stream_into(router, session)
+        if profile_budget:
+            for lvl in router.collectors:
+                profiles[lvl] = property_profile.profile_from_session(session, lvl, profile_budget)
+    return router.documents(cfg, schema, profiles)
+
+
+def main() -> None:
+    import argparse
+    from pathlib import Path
+
+    from render_all import read_levels_file
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--levels-file", default="levels.txt")
+    parser.add_argument("--levels", nargs="*", default=None)
+    parser.add_argument("--json-dir", default="export/json")
+    parser.add_argument("--stream", action="store_true",
+                        help="Aggregate outgoing relationships as they arrive (see export_level.py --stream)")
+    parser.add_argument("--compact", action="store_true",
+                        help="Write the compact export format (see export_format.py)")
+    parser.add_argument("--gzip", action="store_true", help="Gzip the exports (<Level>.json.gz)")
+    parser.add_argument("--property-profile", type=int, nargs="?", default=None, metavar="NODES",
+                        const=property_profile.DEFAULT_SCAN_BUDGET,
+                        help="Add property profiles (see export_level.py --property-profile)")
+    args = parser.parse_args()
+
+    levels = args.levels or read_levels_file(Path(args.levels_file))
+    if not levels:
+        raise SystemExit("No levels provided. Add labels to levels.txt or pass --levels ...")
+
+    docs = bulk_export(config_from_env(), levels, stream=args.stream, profile_budget=args.property_profile)
+    for lvl, doc in docs.items():
+        path = write_export(doc, os.path.join(args.json_dir, f"{lvl}.json"),
+                            compact=args.compact, compress=args.gzip)
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Local HTTP service that renders the card of one level on demand.
+
+    python3 card_server.py --port 8765
+    python3 card_server.py --snapshot graph.sqlite
+
+    GET /levels                    levels served (levels.txt or --levels)
+    GET /levels/<Level>.json       the level export (as export_level.py writes it)
+    GET /levels/<Level>.md         the rendered Markdown card
+    GET /levels/<Level>.html       the card as HTML (needs pandoc)
+    GET /diagrams/                 diagram files built by generate_diagrams.py
+    GET /diagrams/<path>           one diagram file (SVG, PNG, PDF, DOT)
+    GET /metrics                   cache hit rate, request latencies
+
+The server holds one graph source for its lifetime (for Neo4j, one driver
+and its connection pool; sessions are per request) and one Jinja
+environment. Requests run on threads (ThreadingHTTPServer); offline sources
+are single-threaded and are used under a lock.
+
+Results are kept in an LRU of --cache-size levels keyed by level, the
+level's change fingerprint (GraphSource.fingerprint: for Neo4j the
+count-store lookups of fingerprint.count_fingerprint, reused for
+--fingerprint-ttl seconds) and the hierarchy rollup index digest. The
+index has a count-store fingerprint of its own (hierarchy.counts_digest),
+checked as often; when it changes, one background thread rebuilds the
+index while requests keep using the previous one. Concurrent requests for
+the same uncached result wait for one build instead of repeating it.
+
+Diagrams cover the whole ontology and are served as generate_diagrams.py
+left them in --diagrams-dir; this service does not lay them out.
+"""
+
+import argparse
+import json
+import mimetypes
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+import export_level
+import hierarchy
+import property_profile
+import render_one
+from graph_source import Neo4jGraphSource, open_graph_source
+
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 64
+DEFAULT_FINGERPRINT_TTL = 2.0
+# Latency percentiles are computed over the most recent requests of each route
+LATENCY_WINDOW = 1024
+
+CONTENT_TYPES = {
+    "json": "application/json; charset=utf-8",
+    "md": "text/markdown; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+}
+
+
+class NotFound(Exception):
+    pass
+
+
+class Unavailable(Exception):
+    pass
+
+
+class CacheEntry:
+    """
+    Renderings of one (level, fingerprint, index digest), built on first
+    request: the export document ("doc"), the Markdown text ("card") and the
+    response bodies ("json", "md", "html").
+    """
+
+    def __init__(self):
+        self.values: Dict[str, Any] = {}
+        self.locks: Dict[str, threading.Lock] = {}
+
+
+class CardCache:
+    """Thread-safe LRU of CacheEntry objects with hit/miss counters."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries: "OrderedDict[tuple, CacheEntry]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _entry(self, key: tuple) -> CacheEntry:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = CacheEntry()
+                while len(self.entries) > self.capacity:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self.entries.move_to_end(key)
+            return entry
+
+    def get(self, key: tuple, fmt: str, build: Callable[[], Any], *, count: bool = True) -> Any:
+        """The ``fmt`` rendering for ``key``; one thread builds it, others wait for it."""
+        entry = self._entry(key)
+        with entry.locks.setdefault(fmt, threading.Lock()):
+            hit = fmt in entry.values
+            if not hit:
+                entry.values[fmt] = build()
+            value = entry.values[fmt]
+        if count:
+            with self.lock:
+                if hit:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+
+class RouteStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, seconds: float, error: bool) -> None:
+        self.count += 1
+        self.errors += error
+        self.total_s += seconds
+        self.max_s = max(self.max_s, seconds)
+        self.recent.append(seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        recent = sorted(self.recent)
+
+        def pct(q: float) -> Optional[float]:
+            if not recent:
+                return None
+            return round(recent[min(len(recent) - 1, int(q * len(recent)))] * 1000, 2)
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": round(self.total_s / self.count * 1000, 2) if self.count else None,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max_s * 1000, 2),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.routes: Dict[str, RouteStats] = {}
+        self.fingerprint_queries = 0
+        self.fingerprint_reuses = 0
+        self.index_rebuilds = 0
+
+    def record(self, route: str, seconds: float, error: bool) -> None:
+        with self.lock:
+            self.routes.setdefault(route, RouteStats()).record(seconds, error)
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "fingerprints": {"queries": self.fingerprint_queries, "reused": self.fingerprint_reuses},
+                "hierarchy_index_rebuilds": self.index_rebuilds,
+                "requests": {route: stats.summary() for route, stats in sorted(self.routes.items())},
+            }
+
+
+def markdown_to_html(markdown: str, title: str) -> str:
+    result = subprocess.run(
+        ["pandoc", "-f", "markdown", "-t", "html", "-s", "--metadata", f"title={title}"],
+        input=markdown, check=True, capture_output=True, text=True,
+    )
+    return result.stdout
+
+
+class CardService:
+    """Level exports and rendered cards from one graph source, cached by fingerprint."""
+
+    def __init__(self, source, cfg: dict, levels: List[str], templates_dir: Path, diagrams_dir: Path, *,
+                 cache_size: int = DEFAULT_CACHE_SIZE, fingerprint_ttl: float = DEFAULT_FINGERPRINT_TTL,
+                 stream: bool = False, server_aggregate: bool = False, profile_budget: Optional[int] = None):
+        self.source = source
+        self.cfg = cfg
+        self.levels = list(levels)
+        self.diagrams_dir = diagrams_dir
+        self.stream = stream
+        self.server_aggregate = server_aggregate
+        self.profile_budget = profile_budget
+        self.fingerprint_ttl = fingerprint_ttl
+
+        self.env = render_one.make_env(templates_dir)
+        self.cache = CardCache(cache_size)
+        self.metrics = Metrics()
+        # The neo4j driver is thread-safe (a session per call); the offline sources are not
+        self.source_lock = nullcontext() if isinstance(source, Neo4jGraphSource) else threading.Lock()
+        self.pandoc = shutil.which("pandoc") is not None
+
+        self.fingerprints: Dict[str, Tuple[float, str]] = {}
+        self.fingerprint_lock = threading.Lock()
+        self.index_lock = threading.Lock()
+        self.index_rebuild: Optional[threading.Thread] = None
+        # Offline sources never change while open; only Neo4j is checked for hierarchy changes
+        self.index_counts: Optional[Tuple[float, str]] = None
+        if isinstance(source, Neo4jGraphSource):
+            self.index_counts = (time.monotonic(), source.hierarchy_fingerprint(self.levels))
+        self.hierarchy_index = self.build_index()
+
+    def build_index(self) -> hierarchy.HierarchyIndex:
+        with self.source_lock:
+            index = hierarchy.build_from_source(self.source, self.levels)
+        with self.metrics.lock:
+            self.metrics.index_rebuilds += 1
+        return index
+
+    def level(self, name: str) -> str:
+        if name not in self.levels:
+            raise NotFound(f"unknown level {name!r}")
+        return name
+
+    def fingerprint(self, level: str) -> str:
+        """The level's fingerprint, queried at most once per --fingerprint-ttl."""
+        now = time.monotonic()
+        with self.fingerprint_lock:
+            cached = self.fingerprints.get(level)
+        if cached is not None and now - cached[0] < self.fingerprint_ttl:
+            with self.metrics.lock:
+                self.metrics.fingerprint_reuses += 1
+            return cached[1]
+
+        with self.source_lock:
+            fp = self.source.fingerprint(level)
+        with self.metrics.lock:
+            self.metrics.fingerprint_queries += 1
+        with self.fingerprint_lock:
+            self.fingerprints[level] = (now, fp)
+        return fp
+
+    def index(self) -> hierarchy.HierarchyIndex:
+        """
+        The current rollup index. Its count-store fingerprint is queried at
+        most once per --fingerprint-ttl; a change starts one background
+        rebuild, and the previous index is served until it is swapped in.
+        """
+        if self.index_counts is None:
+            return self.hierarchy_index
+        now = time.monotonic()
+        with self.index_lock:
+            checked, counts = self.index_counts
+            due = self.index_rebuild is None and now - checked >= self.fingerprint_ttl
+            if due:
+                # Claim this check, so concurrent requests do not repeat it
+                self.index_counts = (now, counts)
+        if due:
+            with self.source_lock:
+                current = self.source.hierarchy_fingerprint(self.levels)
+            with self.index_lock:
+                if current != counts and self.index_rebuild is None:
+                    self.index_rebuild = threading.Thread(target=self.rebuild_index, args=(current,), daemon=True)
+                    self.index_rebuild.start()
+        return self.hierarchy_index
+
+    def rebuild_index(self, counts: str) -> None:
+        try:
+            index = self.build_index()
+        except Exception as exc:  # keep serving the previous index; the next check retries
+            print(f"Hierarchy index rebuild failed: {exc!r}", file=sys.stderr)
+            index = None
+        with self.index_lock:
+            if index is not None:
+                self.hierarchy_index = index
+                self.index_counts = (time.monotonic(), counts)
+            self.index_rebuild = None
+
+    def key(self, level: str) -> tuple:
+        fp = self.fingerprint(level)
+        return level, fp, self.index().digest
+
+    def document(self, level: str, key: tuple) -> dict:
+        def build():
+            with self.source_lock:
+                return export_level.export_level(
+                    self.cfg, level, stream=self.stream, server_aggregate=self.server_aggregate,
+                    source=self.source, profile_budget=self.profile_budget,
+                )
+
+        return self.cache.get(key, "doc", build, count=False)
+
+    def markdown(self, level: str, key: tuple) -> str:
+        def build():
+            doc = self.document(level, key)
+            # prepare_card() adds render-only keys to the card: render a copy
+            data = {**doc, "card": dict(doc["card"])}
+            return render_one.render_card(data, self.env, hierarchy_index=self.hierarchy_index)
+
+        return self.cache.get(key, "card", build, count=False)
+
+    def render(self, name: str, fmt: str) -> bytes:
+        """The level's export (json) or card (md, html) as response bytes."""
+        level = self.level(name)
+        if fmt == "html" and not self.pandoc:
+            raise Unavailable("HTML cards need pandoc on PATH")
+        key = self.key(level)
+
+        def build():
+            if fmt == "json":
+                text = json.dumps(self.document(level, key), indent=2)
+            elif fmt == "md":
+                text = self.markdown(level, key)
+            else:
+                text = markdown_to_html(self.markdown(level, key), level)
+            return text.encode("utf-8")
+
+        return self.cache.get(key, fmt, build)
+
+    def diagram_files(self) -> List[str]:
+        if not self.diagrams_dir.is_dir():
+            return []
+        return sorted(p.relative_to(self.diagrams_dir).as_posix()
+                      for p in self.diagrams_dir.rglob("*") if p.is_file())
+
+    def diagram(self, rel_path: str) -> Path:
+        root = self.diagrams_dir.resolve()
+        path = (root / rel_path).resolve()
+        if not path.is_relative_to(root) or not path.is_file():
+            raise NotFound(f"no diagram {rel_path!r}")
+        return path
+
+    def metrics_summary(self) -> Dict[str, Any]:
+        summary = self.metrics.summary()
+        summary["cache"] = self.cache.stats()
+        return summary
+
+
+class CardRequestHandler(BaseHTTPRequestHandler):
+    server_version = "OntologyCards/1"
+
+    @property
+    def service(self) -> CardService:
+        return self.server.service
+
+    def send_body(self, body: bytes, content_type: str, status: int = HTTPStatus.OK) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, value: Any, status: int = HTTPStatus.OK) -> None:
+        self.send_body((json.dumps(value, indent=2) + "\n").encode("utf-8"), CONTENT_TYPES["json"], status)
+
+    def route(self, path: str) -> str:
+        """Serve ``path``; returns the route name the request is counted under."""
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        if parts == ["levels"]:
+            self.send_json(self.service.levels)
+            return "levels"
+        if len(parts) == 2 and parts[0] == "levels":
+            name, _, fmt = parts[1].rpartition(".")
+            if fmt not in CONTENT_TYPES:
+                raise NotFound(f"expected /levels/<Level>.json, .md or .html, not {path!r}")
+            self.send_body(self.service.render(name, fmt), CONTENT_TYPES[fmt])
+            return fmt
+        if parts == ["diagrams"] or parts == ["diagrams", ""]:
+            self.send_json(self.service.diagram_files())
+            return "diagrams"
+        if len(parts) > 1 and parts[0] == "diagrams":
+            file = self.service.diagram("/".join(parts[1:]))
+            content_type = mimetypes.guess_type(file.name)[0] or "application/octet-stream"
+            self.send_body(file.read_bytes(), content_type)
+            return "diagram"
+        if parts == ["metrics"]:
+            self.send_json(self.service.metrics_summary())
+            return "metrics"
+        raise NotFound(f"no route for {path!r}")
+
+    def do_GET(self):
+        started = time.perf_counter()
+        route, error = "other", False
+        try:
+            route = self.route(urlsplit(self.path).path)
+        except NotFound as exc:
+            error = True
+            self.send_json({"error": str(exc)}, HTTPStatus.NOT_FOUND)
+        except Unavailable as exc:
+            error = True
+            self.send_json({"error": str(exc)}, HTTPStatus.NOT_IMPLEMENTED)
+        except Exception as exc:  # report and keep serving
+            error = True
+            self.log_error("%s failed: %r", self.path, exc)
+            self.send_json({"error": f"{type(exc).__name__}: {exc}"}, HTTPStatus.INTERNAL_SERVER_ERROR)
+        self.service.metrics.record(route, time.perf_counter() - started, error)
+
+
+def make_server(service: CardService, host: str, port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), CardRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main() -> None:
+    from render_all import get_neo4j_config, read_levels_file
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--levels-file", default="levels.txt")
+    ap.add_argument("--levels", nargs="*", default=None)
+    ap.add_argument("--templates-dir", default="templates")
+    ap.add_argument("--diagrams-dir", default="diagrams")
+    ap.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                    help=f"Levels kept in the LRU cache (default: {DEFAULT_CACHE_SIZE})")
+    ap.add_argument("--fingerprint-ttl", type=float, default=DEFAULT_FINGERPRINT_TTL,
+                    help="Seconds a level fingerprint is reused before the database is asked again "
+                         f"(default: {DEFAULT_FINGERPRINT_TTL})")
+    ap.add_argument("--stream", action="store_true",
+                    help="Export with --stream (generalized levels store outgoing_total only)")
+    ap.add_argument("--server-aggregate", action="store_true",
+                    help="Export with --server-aggregate (implies --stream)")
+    ap.add_argument("--property-profile", type=int, nargs="?", default=None, metavar="NODES",
+                    const=property_profile.DEFAULT_SCAN_BUDGET,
+                    help="Add a Property Profile section to every card from at most NODES nodes per level "
+                         "(default: %(const)s; see property_profile.py)")
+    ap.add_argument("--graph-dump", default=None,
+                    help="Serve from a JSONL node/relationship dump held in memory instead of Neo4j")
+    ap.add_argument("--snapshot", default=None,
+                    help="Serve from a local SQLite snapshot written by snapshot.py instead of Neo4j")
+    args = ap.parse_args()
+
+    levels = args.levels or read_levels_file(Path(args.levels_file))
+    offline = args.graph_dump or args.snapshot
+    cfg = {"database": offline} if offline else get_neo4j_config()
+    with open_graph_source(cfg, dump=args.graph_dump, snapshot=args.snapshot) as source:
+        cfg = {**cfg, "database": source.database}
+        service = CardService(
+            source, cfg, levels, Path(args.templates_dir), Path(args.diagrams_dir),
+            cache_size=args.cache_size, fingerprint_ttl=args.fingerprint_ttl, stream=args.stream,
+            server_aggregate=args.server_aggregate, profile_budget=args.property_profile,
+        )
+        server = make_server(service, args.host, args.port)
+        print(f"Serving {len(levels)} level cards on http://{args.host}:{server.server_port}/ (Ctrl-C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Stopped")
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
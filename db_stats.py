@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Database statistics from the count store in one round trip.
+
+Totals (nodes, relationships, labels, relationship types, property keys)
+plus node counts per label, relationship counts per type and outgoing
+relationship counts per start label all come from
+``db.stats.retrieve('GRAPH COUNTS')``, which reads the count store and
+never scans data. The same numbers give the exporter cheap level-size
+estimates.
+
+When the stats procedure is not permitted for the connecting user, the
+collector falls back to two round trips: the token lists, then one
+generated query made only of count-store-backed patterns.
+
+Given the run's schema_cache.SchemaCache, the token lists and counts are
+taken from it instead of being queried again.
+"""
+
+from typing import Any, Dict, List
+
+
+STATS_QUERY = """
+CALL db.stats.retrieve('GRAPH COUNTS') YIELD data
+CALL { CALL db.labels() YIELD label RETURN count(label) AS labels }
+CALL { CALL db.relationshipTypes() YIELD relationshipType RETURN count(relationshipType) AS relationship_types }
+CALL { CALL db.propertyKeys() YIELD propertyKey RETURN count(propertyKey) AS properties }
+RETURN data, labels, relationship_types, properties
+"""
+
+GRAPH_COUNTS_QUERY = "CALL db.stats.retrieve('GRAPH COUNTS') YIELD data RETURN data"
+
+TOKENS_QUERY = """
+CALL { CALL db.labels() YIELD label RETURN collect(label) AS labels }
+CALL { CALL db.relationshipTypes() YIELD relationshipType RETURN collect(relationshipType) AS types }
+CALL { CALL db.propertyKeys() YIELD propertyKey RETURN count(propertyKey) AS properties }
+RETURN labels, types, properties
+"""
+
+
+def _quote_identifier(name: str) -> str:
+    return "`" + name.replace("`", "``") + "`"
+
+
+def _sorted_counts(counts: Dict[str, int]) -> Dict[str, int]:
+    return dict(sorted(counts.items(), key=lambda kv: (-kv[1], kv[0])))
+
+
+def parse_graph_counts(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a STATS_QUERY record into the statistics dict."""
+    data = record.get("data") or {}
+
+    nodes = 0
+    nodes_by_label: Dict[str, int] = {}
+    for entry in data.get("nodes") or []:
+        if "label" in entry:
+            nodes_by_label[entry["label"]] = entry.get("count", 0)
+        else:
+            nodes = entry.get("count", 0)
+
+    relationships = 0
+    relationships_by_type: Dict[str, int] = {}
+    outgoing_by_label: Dict[str, int] = {}
+    typed_outgoing_by_label: Dict[str, int] = {}
+    for entry in data.get("relationships") or []:
+        keys = {k for k in entry if k != "count"}
+        count = entry.get("count", 0)
+        if not keys:
+            relationships = count
+        elif keys == {"relationshipType"}:
+            relationships_by_type[entry["relationshipType"]] = count
+        elif keys == {"startLabel"}:
+            outgoing_by_label[entry["startLabel"]] = count
+        elif keys == {"startLabel", "relationshipType"}:
+            label = entry["startLabel"]
+            typed_outgoing_by_label[label] = typed_outgoing_by_label.get(label, 0) + count
+
+    # Servers that only report typed (startLabel, type) counts: sum them per label.
+    for label, count in typed_outgoing_by_label.items():
+        outgoing_by_label.setdefault(label, count)
+
+    return {
+        "nodes": nodes,
+        "relationships": relationships,
+        "labels": record.get("labels", len(nodes_by_label)),
+        "relationship_types": record.get("relationship_types", len(relationships_by_type)),
+        "properties": record.get("properties", 0),
+        "nodes_by_label": _sorted_counts(nodes_by_label),
+        "relationships_by_type": _sorted_counts(relationships_by_type),
+        "outgoing_by_label": _sorted_counts(outgoing_by_label),
+    }
+
+
+def count_store_query(labels: List[str], types: List[str]) -> str:
+    """One query of count-store-backed patterns: totals, per label, per type, outgoing per label."""
+    parts = [
+        "MATCH (n) RETURN 'nodes' AS kind, 0 AS i, count(n) AS cnt",
+        "MATCH ()-[r]->() RETURN 'relationships' AS kind, 0 AS i, count(r) AS cnt",
+    ]
+    for i, label in enumerate(labels):
+        q = _quote_identifier(label)
+        parts.append(f"MATCH (n:{q}) RETURN 'label' AS kind, {i} AS i, count(n) AS cnt")
+        parts.append(f"MATCH (:{q})-[r]->() RETURN 'outgoing' AS kind, {i} AS i, count(r) AS cnt")
+    for i, rel_type in enumerate(types):
+        parts.append(
+            f"MATCH ()-[r:{_quote_identifier(rel_type)}]->() RETURN 'type' AS kind, {i} AS i, count(r) AS cnt"
+        )
+    return "\nUNION ALL\n".join(parts)
+
+
+def _collect_from_count_queries(session, schema=None) -> Dict[str, Any]:
+    if schema is not None:
+        labels, types, properties = list(schema.labels), list(schema.rel_types), schema.property_keys
+    else:
+        tokens = session.run(TOKENS_QUERY).single()
+        labels = list(tokens["labels"] or [])
+        types = list(tokens["types"] or [])
+        properties = tokens["properties"]
+
+    stats: Dict[str, Any] = {
+        "nodes": 0,
+        "relationships": 0,
+        "labels": len(labels),
+        "relationship_types": len(types),
+        "properties": properties,
+    }
+    nodes_by_label: Dict[str, int] = {}
+    outgoing_by_label: Dict[str, int] = {}
+    relationships_by_type: Dict[str, int] = {}
+    for rec in session.run(count_store_query(labels, types)):
+        kind, i, cnt = rec["kind"], rec["i"], rec["cnt"]
+        if kind in ("nodes", "relationships"):
+            stats[kind] = cnt
+        elif kind == "label":
+            nodes_by_label[labels[i]] = cnt
+        elif kind == "outgoing":
+            outgoing_by_label[labels[i]] = cnt
+        elif kind == "type":
+            relationships_by_type[types[i]] = cnt
+
+    stats["nodes_by_label"] = _sorted_counts(nodes_by_label)
+    stats["relationships_by_type"] = _sorted_counts(relationships_by_type)
+    stats["outgoing_by_label"] = _sorted_counts(outgoing_by_label)
+    return stats
+
+
+def collect_db_statistics(session, schema=None) -> Dict[str, Any]:
+    """Totals plus per-label / per-type breakdowns, from the count store (token counts from ``schema``)."""
+    from neo4j.exceptions import ClientError
+
+    try:
+        record = session.run(STATS_QUERY if schema is None else GRAPH_COUNTS_QUERY).single()
+    except ClientError:
+        # e.g. db.stats.retrieve is restricted to admins
+        return _collect_from_count_queries(session, schema)
+    data = record.data() if record else {}
+    if schema is not None:
+        data.update(schema.token_counts())
+    return parse_graph_counts(data)
+
+
+def level_size_estimates(stats: Dict[str, Any], levels: List[str]) -> Dict[str, int]:
+    """Export cost estimate per level: node count plus outgoing relationship count."""
+    nodes = stats.get("nodes_by_label") or {}
+    outgoing = stats.get("outgoing_by_label") or {}
+    return {lvl: int(nodes.get(lvl, 0)) + int(outgoing.get(lvl, 0)) for lvl in levels}
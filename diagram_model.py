@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Indexed in-memory model of the exported levels, for the diagram generators.
+
+The parent -> child structure of the core levels (Hub, Category, Kind,
+Family) comes from each card's ``parent_groups`` and is held in dicts both
+ways, so "which Category is this Kind under" and "which Families are under
+this Kind" are single lookups. The type-level nodes below a Family
+(AirType, ShipType, WeaponType) and the descendant counts come from the
+hierarchy rollup index (hierarchy.py), which covers the rel_target_overrides
+targets too, so the diagrams do not depend on how Family was exported
+(--stream and friends keep no detailed relationship rows).
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import hierarchy
+from export_format import find_export, load_export
+from label_resolver import RULES as LABEL_RULES
+
+
+MODEL_LEVELS = list(LABEL_RULES.core_levels)
+
+# Levels directly below a Family ("type level" of each domain).
+TYPE_LEVELS = {LABEL_RULES.air_chain[0], LABEL_RULES.ship_chain[0], *LABEL_RULES.rel_target_overrides.values()}
+
+# Leaf levels counted as "instances" in rollups.
+INSTANCE_LEVELS = {LABEL_RULES.air_chain[-1], LABEL_RULES.ship_chain[-1]}
+
+
+class LevelModel:
+    def __init__(self, cards: Dict[str, dict], index: Optional[hierarchy.HierarchyIndex] = None):
+        self.cards = cards
+        self.index = index
+        # child level -> {child name: parent name} and {parent name: [child names]}
+        self._parent: Dict[str, Dict[Any, Any]] = {}
+        self._children: Dict[str, Dict[Any, List[Any]]] = {}
+        for level, card in cards.items():
+            parents, children = {}, {}
+            for group in card.get("parent_groups") or []:
+                children[group["parent"]] = list(group["nodes"])
+                for node in group["nodes"]:
+                    parents.setdefault(node, group["parent"])
+            self._parent[level] = parents
+            self._children[level] = children
+        self._types: Optional[Dict[Any, List[Tuple[str, Any]]]] = None
+
+    @classmethod
+    def from_exports(cls, json_dir: Path, index: Optional[hierarchy.HierarchyIndex] = None) -> "LevelModel":
+        """
+        Load the core level exports (plain, compact or gzipped) of
+        ``json_dir``, with the given rollup index or the one saved there.
+        """
+        cards = {}
+        for level in MODEL_LEVELS:
+            path = find_export(Path(json_dir) / f"{level}.json")
+            if path.exists():
+                cards[level] = load_export(path)["card"]
+        return cls(cards, index if index is not None else hierarchy.load_for(json_dir))
+
+    # -- core levels -----------------------------------------------------
+
+    def names(self, level: str) -> List[Any]:
+        return list((self.cards.get(level) or {}).get("node_names") or [])
+
+    def parent(self, level: str, name: Any) -> Optional[Any]:
+        """Parent (one level up) of a node of ``level``."""
+        return self._parent.get(level, {}).get(name)
+
+    def children(self, level: str, parent: Any) -> List[Any]:
+        """Nodes of ``level`` grouped under ``parent``."""
+        return self._children.get(level, {}).get(parent, [])
+
+    def groups(self, level: str) -> Dict[Any, List[Any]]:
+        """{parent name: [node names of ``level``]} in export order."""
+        return self._children.get(level, {})
+
+    # -- type level and counts -------------------------------------------
+
+    def type_children(self, family: Any) -> List[Tuple[str, Any]]:
+        """(level, name) of the type-level nodes directly below a Family, sorted."""
+        if self._types is None:
+            self._types = self._index_types()
+        return self._types.get(family, [])
+
+    def _index_types(self) -> Dict[Any, List[Tuple[str, Any]]]:
+        found: Dict[Any, set] = {}
+        index = self.index
+        if index is not None:
+            for node in index.level_range("Family"):
+                kids = found.setdefault(index.names[node], set())
+                for child in index.children(node):
+                    level = index.levels[index.level[child]]
+                    if level in TYPE_LEVELS:
+                        kids.add((level, index.names[child]))
+        return {
+            family: sorted(kids, key=lambda k: (k[0], k[1] is None, str(k[1])))
+            for family, kids in found.items()
+        }
+
+    def rollup(self, level: str, name: Any) -> Dict[str, int]:
+        """Descendants per level of one node (empty without an index)."""
+        node = self.index.find(level, name) if self.index is not None else None
+        return self.index.rollup(node) if node is not None else {}
+
+    def instances(self, level: str, name: Any) -> int:
+        """Instances below one node according to the rollup index (0 without an index)."""
+        return sum(c for lvl, c in self.rollup(level, name).items() if lvl in INSTANCE_LEVELS)
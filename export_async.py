@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Concurrent multi-level export on the neo4j async driver.
+
+Every level query (grouping, node names or count, outgoing, parent groups
+and, with a profile budget, the property profile) becomes one job. Jobs are
+queued most-expensive level first, judged from count-store estimates
+(db_stats.py), and drained by a fixed number of workers, so wall-clock time
+approaches the slowest level rather than the sum of all levels.
+"""
+
+import asyncio
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from neo4j import AsyncGraphDatabase
+from neo4j.exceptions import ClientError
+
+import property_profile
+import tracing
+from db_stats import STATS_QUERY, level_size_estimates, parse_graph_counts
+from export_level import (
+    OutgoingAggregator,
+    build_level_doc,
+    build_level_queries,
+    config_from_env,
+    generalized_outgoing_query,
+    planned_query_keys,
+    relationships_mode_for,
+    sanitize_label,
+    write_export,
+)
+from schema_cache import SCHEMA_QUERY, SchemaCache
+
+
+# Outgoing is by far the most expensive query, so it goes first within a level.
+QUERY_ORDER = ["outgoing", "nodes", "node_count", "grouping", "parent_groups", "profile"]
+
+
+async def run_read(driver, database: str, query: str, **params) -> List[Dict[str, Any]]:
+    async def work(tx):
+        result = await tx.run(query, **params)
+        return [r.data() async for r in result]
+
+    async with driver.session(database=database) as session:
+        return await session.execute_read(work)
+
+
+async def stream_outgoing_async(driver, database: str, level_label: str) -> OutgoingAggregator:
+    """Async counterpart of export_level.stream_outgoing()."""
+    detailed = relationships_mode_for(level_label) == "detailed"
+    query = build_level_queries(level_label, ordered_outgoing=detailed)["outgoing"]
+
+    async def work(tx):
+        # Made here so that a retried transaction function starts from zero
+        aggregator = OutgoingAggregator(level_label, keep_rows=detailed)
+        result = await tx.run(query)
+        async for rec in result:
+            aggregator.add(rec)
+        return aggregator
+
+    async with driver.session(database=database) as session:
+        return await session.execute_read(work)
+
+
+async def aggregate_outgoing_on_server_async(driver, database: str, level_label: str) -> OutgoingAggregator:
+    """Async counterpart of export_level.aggregate_outgoing_on_server()."""
+    query, params = generalized_outgoing_query(level_label)
+
+    async def work(tx):
+        aggregator = OutgoingAggregator(level_label, keep_rows=False)
+        result = await tx.run(query, **params)
+        async for rec in result:
+            aggregator.add_pattern(rec["from_level"], rec["rel_type"], rec["to_level"], rec["pattern_count"])
+        return aggregator
+
+    async with driver.session(database=database) as session:
+        return await session.execute_read(work)
+
+
+async def profile_properties_async(driver, database: str, level_label: str, scan_budget: int) -> dict:
+    """Async counterpart of property_profile.profile_from_session()."""
+    total = (await run_read(driver, database, property_profile.count_query(level_label)))[0]["total"]
+    fraction = property_profile.sample_fraction(total, scan_budget)
+
+    async def work(tx):
+        profiler = property_profile.PropertyProfiler(level_label, total, scan_budget)
+        result = await tx.run(property_profile.sample_query(level_label), fraction=fraction, limit=scan_budget)
+        async for rec in result:
+            profiler.add(rec["props"])
+        return profiler
+
+    async with driver.session(database=database) as session:
+        profiler = await session.execute_read(work)
+    return profiler.profile()
+
+
+async def fetch_schema(driver, database: str) -> SchemaCache:
+    """Async counterpart of SchemaCache.fetch()."""
+    rec = (await run_read(driver, database, SCHEMA_QUERY))[0]
+    return SchemaCache(rec["labels"] or [], rec["types"] or [], rec["node_properties"] or [], rec["property_keys"] or 0)
+
+
+async def estimate_level_costs(driver, database: str, levels: List[str]) -> Dict[str, int]:
+    """
+    Cheap per-level cost estimate: node count plus outgoing relationship count.
+
+    Taken from the db_stats collector (one count-store round trip); if the
+    stats procedure is not permitted, falls back to per-level count-store
+    queries. Nothing is scanned either way.
+    """
+    try:
+        rows = await run_read(driver, database, STATS_QUERY)
+    except ClientError:
+        rows = None
+    if rows:
+        return level_size_estimates(parse_graph_counts(rows[0]), levels)
+
+    costs: Dict[str, int] = {}
+    for level in levels:
+        label = sanitize_label(level)
+        rows = await run_read(
+            driver,
+            database,
+            f"""
+            CALL {{ MATCH (n:`{label}`) RETURN count(n) AS nodes }}
+            CALL {{ MATCH (:`{label}`)-[r]->() RETURN count(r) AS rels }}
+            RETURN nodes, rels
+            """,
+        )
+        row = rows[0] if rows else {}
+        costs[level] = int(row.get("nodes") or 0) + int(row.get("rels") or 0)
+    return costs
+
+
+def schedule_levels(levels: List[str], costs: Dict[str, int]) -> List[str]:
+    """Most expensive levels first; ties keep levels.txt order."""
+    position = {lvl: i for i, lvl in enumerate(levels)}
+    return sorted(levels, key=lambda lvl: (-costs.get(lvl, 0), position[lvl]))
+
+
+async def export_levels_async(
+    cfg: dict,
+    levels: List[str],
+    *,
+    concurrency: int = 4,
+    driver=None,
+    stream: bool = False,
+    server_aggregate: bool = False,
+    on_level_done: Optional[Callable[[str, dict], None]] = None,
+    schema: Optional[SchemaCache] = None,
+    profile_budget: Optional[int] = None,
+) -> Dict[str, dict]:
+    """
+    Export all ``levels`` with at most ``concurrency`` queries in flight.
+
+    Returns {level: document}. ``on_level_done`` is called as soon as each
+    level's last query has finished. ``stream`` and ``server_aggregate`` have
+    the same meaning as in export_level.export_level(); ``schema`` is the
+    run's SchemaCache (fetched once here if not given). ``profile_budget``
+    adds each level's property profile as one more job.
+    """
+    if concurrency < 1:
+        raise SystemExit("--concurrency must be at least 1")
+
+    if driver is None:
+        async with AsyncGraphDatabase.driver(
+            cfg["uri"], auth=(cfg["user"], cfg["password"])
+        ) as own_driver:
+            return await export_levels_async(
+                cfg,
+                levels,
+                concurrency=concurrency,
+                driver=own_driver,
+                stream=stream,
+                server_aggregate=server_aggregate,
+                on_level_done=on_level_done,
+                schema=schema,
+                profile_budget=profile_budget,
+            )
+
+    database = cfg["database"]
+    levels = [sanitize_label(lvl) for lvl in levels]
+    stream = stream or server_aggregate
+
+    if schema is None:
+        schema = await fetch_schema(driver, database)
+    costs = await estimate_level_costs(driver, database, levels)
+    order = schedule_levels(levels, costs)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    pending: Dict[str, int] = {}
+    rows: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    aggregators: Dict[str, OutgoingAggregator] = {}
+    profiles: Dict[str, dict] = {}
+    for level in order:
+        queries = build_level_queries(level)
+        rows[level] = {"parent_groups": []}
+        planned = planned_query_keys(level) + (["profile"] if profile_budget else [])
+        keys = [k for k in QUERY_ORDER if k in planned and (k != "parent_groups" or schema.has_rel_type(level))]
+        pending[level] = len(keys)
+        for key in keys:
+            queue.put_nowait((level, key, queries.get(key)))
+
+    docs: Dict[str, dict] = {}
+
+    async def worker(track: int):
+        while True:
+            try:
+                level, key, query = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            with tracing.span("query", "cypher", tid=track, level=level, query=key) as span:
+                if key == "outgoing" and server_aggregate and relationships_mode_for(level) == "generalized":
+                    aggregators[level] = await aggregate_outgoing_on_server_async(driver, database, level)
+                    span["rows"] = len(aggregators[level].generalized)
+                elif key == "outgoing" and stream:
+                    aggregators[level] = await stream_outgoing_async(driver, database, level)
+                    span["rows"] = aggregators[level].total
+                elif key == "profile":
+                    profiles[level] = await profile_properties_async(driver, database, level, profile_budget)
+                    span["rows"] = profiles[level]["scanned"]
+                else:
+                    rows[level][key] = await run_read(driver, database, query)
+                    span["rows"] = len(rows[level][key])
+            pending[level] -= 1
+            if pending[level] == 0:
+                docs[level] = build_level_doc(
+                    cfg, level, rows.pop(level), aggregators.pop(level, None), schema=schema,
+                    profile=profiles.pop(level, None),
+                )
+                if on_level_done is not None:
+                    on_level_done(level, docs[level])
+
+    workers = [asyncio.create_task(worker(1 + i)) for i in range(min(concurrency, queue.qsize()))]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        for w in workers:
+            w.cancel()
+        raise
+
+    return {lvl: docs[lvl] for lvl in levels}
+
+
+def export_levels_concurrently(
+    cfg: dict,
+    levels: List[str],
+    json_dir: str,
+    concurrency: int = 4,
+    stream: bool = False,
+    server_aggregate: bool = False,
+    compact: bool = False,
+    compress: bool = False,
+    schema: Optional[SchemaCache] = None,
+    profile_budget: Optional[int] = None,
+) -> Dict[str, str]:
+    """Synchronous entry point: export ``levels`` into ``json_dir``; returns {level: path}."""
+    paths: Dict[str, str] = {}
+
+    def write(level: str, doc: dict) -> None:
+        path = write_export(doc, os.path.join(json_dir, f"{level}.json"), compact=compact, compress=compress)
+        paths[level] = path
+        print(f"Wrote {path}")
+
+    asyncio.run(
+        export_levels_async(
+            cfg,
+            levels,
+            concurrency=concurrency,
+            stream=stream,
+            server_aggregate=server_aggregate,
+            on_level_done=write,
+            schema=schema,
+            profile_budget=profile_budget,
+        )
+    )
+    return {lvl: paths[lvl] for lvl in levels}
+
+
+def main() -> None:
+    import argparse
+    from pathlib import Path
+
+    from render_all import read_levels_file
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--levels-file", default="levels.txt")
+    parser.add_argument("--levels", nargs="*", default=None)
+    parser.add_argument("--json-dir", default="export/json")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Maximum number of export queries in flight (default: 4)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Aggregate outgoing relationships as they arrive (see export_level.py --stream)")
+    parser.add_argument("--server-aggregate", action="store_true",
+                        help="Generalize outgoing relationships in Cypher (see export_level.py --server-aggregate)")
+    parser.add_argument("--compact", action="store_true",
+                        help="Write the compact export format (see export_format.py)")
+    parser.add_argument("--gzip", action="store_true", help="Gzip the exports (<Level>.json.gz)")
+    parser.add_argument("--property-profile", type=int, nargs="?", default=None, metavar="NODES",
+                        const=property_profile.DEFAULT_SCAN_BUDGET,
+                        help="Add property profiles (see export_level.py --property-profile)")
+    args = parser.parse_args()
+
+    levels = args.levels or read_levels_file(Path(args.levels_file))
+    if not levels:
+        raise SystemExit("No levels provided. Add labels to levels.txt or pass --levels ...")
+
+    export_levels_concurrently(
+        config_from_env(), levels, args.json_dir, args.concurrency, args.stream, args.server_aggregate,
+        compact=args.compact, compress=args.gzip, profile_budget=args.property_profile,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Compact, dictionary-encoded level export format.
+
+The plain export repeats full ``source_labels`` / ``target_labels`` arrays
+and name strings on every ``card.relationships.outgoing`` row. The compact
+format stores each distinct name, relationship type and label set once in
+``tables`` and encodes the outgoing rows as columns of integer references:
+
+    {
+      "format": "ontology-doc/compact-level",
+      "format_version": 1,
+      "level": ..., "level_label": ..., "meta": {...},
+      "tables": {"names": [...], "rel_types": [...], "label_sets": [[...], ...]},
+      "card": {
+        ...,
+        "relationships": {
+          "outgoing": {"count": N, "columns": {"from_name": [...], "rel_type": [...],
+                                               "to_name": [...], "source_labels": [...],
+                                               "target_labels": [...]}},
+          "outgoing_generalized": [...], ...
+        }
+      }
+    }
+
+Either format may be gzip-compressed (``<Level>.json.gz``). load_export()
+reads all four variants; for compact files ``card.relationships.outgoing``
+is an OutgoingColumns view that yields row dicts one at a time instead of
+a materialized list.
+"""
+
+import gzip
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Union
+
+FORMAT_NAME = "ontology-doc/compact-level"
+FORMAT_VERSION = 1
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Outgoing row field -> table it references
+ROW_FIELDS = {
+    "from_name": "names",
+    "rel_type": "rel_types",
+    "to_name": "names",
+    "source_labels": "label_sets",
+    "target_labels": "label_sets",
+}
+
+PathLike = Union[str, Path]
+
+
+class _Interner:
+    def __init__(self):
+        self.values: List[Any] = []
+        self._index: Dict[Any, int] = {}
+
+    def __call__(self, value) -> int:
+        key = tuple(value) if isinstance(value, list) else value
+        i = self._index.get(key)
+        if i is None:
+            i = self._index[key] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+class OutgoingColumns:
+    """Read-only sequence view of column-encoded outgoing rows."""
+
+    def __init__(self, encoded: Dict[str, Any], tables: Dict[str, List[Any]]):
+        self.count = int(encoded.get("count", 0))
+        self.columns = encoded.get("columns") or {}
+        self.tables = tables
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        names = self.tables.get("names") or []
+        rel_types = self.tables.get("rel_types") or []
+        label_sets = self.tables.get("label_sets") or []
+        cols = [self.columns.get(f) or [] for f in ROW_FIELDS]
+        for src, rt, tgt, src_ls, tgt_ls in zip(*cols):
+            yield {
+                "from_name": names[src],
+                "rel_type": rel_types[rt],
+                "to_name": names[tgt],
+                "source_labels": list(label_sets[src_ls]),
+                "target_labels": list(label_sets[tgt_ls]),
+            }
+
+    def to_json(self) -> Dict[str, Any]:
+        """Self-contained JSON form (columns plus the tables they reference), e.g. for hashing."""
+        used = set(ROW_FIELDS.values())
+        return {
+            "count": self.count,
+            "columns": self.columns,
+            "tables": {k: v for k, v in self.tables.items() if k in used},
+        }
+
+
+def is_compact(doc: Dict[str, Any]) -> bool:
+    return doc.get("format") == FORMAT_NAME
+
+
+def encode_compact(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Plain level document -> compact document."""
+    tables = {name: _Interner() for name in set(ROW_FIELDS.values())}
+    columns: Dict[str, List[int]] = {f: [] for f in ROW_FIELDS}
+
+    card = dict(doc.get("card") or {})
+    rels = dict(card.get("relationships") or {})
+    rows = rels.get("outgoing") or []
+    count = 0
+    for r in rows:
+        for field, table in ROW_FIELDS.items():
+            value = r.get(field)
+            if table == "label_sets":
+                value = list(value or [])
+            columns[field].append(tables[table](value))
+        count += 1
+
+    rels["outgoing"] = {"count": count, "columns": columns}
+    card["relationships"] = rels
+
+    out = {"format": FORMAT_NAME, "format_version": FORMAT_VERSION}
+    out.update((k, v) for k, v in doc.items() if k != "card")
+    out["tables"] = {name: interner.values for name, interner in sorted(tables.items())}
+    out["card"] = card
+    return out
+
+
+def open_compact(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact document -> plain-shaped document with a lazy outgoing view."""
+    version = doc.get("format_version")
+    if version != FORMAT_VERSION:
+        raise SystemExit(f"Unsupported compact export version {version!r} (expected {FORMAT_VERSION})")
+
+    card = dict(doc.get("card") or {})
+    rels = dict(card.get("relationships") or {})
+    rels["outgoing"] = OutgoingColumns(rels.get("outgoing") or {}, doc.get("tables") or {})
+    card["relationships"] = rels
+
+    out = {k: v for k, v in doc.items() if k not in ("format", "format_version", "tables", "card")}
+    out["card"] = card
+    return out
+
+
+def find_export(path: PathLike) -> Path:
+    """``<Level>.json`` if present, else ``<Level>.json.gz`` if present, else ``path`` unchanged."""
+    path = Path(path)
+    if path.exists():
+        return path
+    gz = path.with_name(path.name + ".gz")
+    return gz if gz.exists() else path
+
+
+def load_export(path: PathLike) -> Dict[str, Any]:
+    """Read a level export in any format (plain/compact, optionally gzip)."""
+    raw = find_export(path).read_bytes()
+    if raw[:2] == GZIP_MAGIC:
+        raw = gzip.decompress(raw)
+    doc = json.loads(raw.decode("utf-8"))
+    return open_compact(doc) if is_compact(doc) else doc
+
+
+def write_export(data: Dict[str, Any], output_path: PathLike, *, compact: bool = False,
+                 compress: bool = False) -> str:
+    """
+    Write a level export; returns the path written.
+
+    ``compress`` appends ``.gz`` to the file name; the other variant of the
+    same export (plain vs. gzip) is removed so readers never see a stale one.
+    """
+    output_path = str(output_path)
+    plain_path = output_path[:-3] if output_path.endswith(".gz") else output_path
+    target = plain_path + ".gz" if compress else plain_path
+    stale = plain_path if compress else plain_path + ".gz"
+
+    dirname = os.path.dirname(target)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+
+    if compact:
+        text = json.dumps(encode_compact(data), separators=(",", ":"))
+    else:
+        text = json.dumps(data, indent=2)
+
+    if compress:
+        # mtime=0 keeps the bytes deterministic for the build cache
+        with open(target, "wb") as f:
+            f.write(gzip.compress(text.encode("utf-8"), mtime=0))
+    else:
+        with open(target, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    if os.path.exists(stale):
+        os.remove(stale)
+    return target
@@ -1,12 +1,19 @@
 #!/usr/bin/env python3
 
-import os
 import json
+import os
 from datetime import datetime, timezone
 from collections import Counter
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+
+import export_format
+import property_profile
+import tracing
+from label_resolver import RULES as LABEL_RULES
+from schema_cache import SchemaCache
 
-from neo4j import GraphDatabase
+
+EXPORTER_VERSION = "0.5"
 
 
 def require_env(name: str) -> str:
@@ -16,6 +23,15 @@ def require_env(name: str) -> str:
     return value
 
 
+def config_from_env() -> dict:
+    return {
+        "uri": os.getenv("NEO4J_URI", "neo4j://127.0.0.1:7687"),
+        "user": os.getenv("NEO4J_USER", "neo4j"),
+        "password": require_env("NEO4J_PASSWORD"),
+        "database": os.getenv("NEO4J_DB", "Shark2"),
+    }
+
+
 def now_utc() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
@@ -31,34 +47,14 @@ def fetch_all(tx, query: str):
     return [r.data() for r in tx.run(query)]
 
 
-def rel_type_exists(session, rel_type: str) -> bool:
-    try:
-        rec = session.run(
-            """
-            CALL db.relationshipTypes() YIELD relationshipType
-            WHERE relationshipType = $t
-            RETURN count(*) > 0 AS exists
-            """,
-            t=rel_type,
-        ).single()
-        return bool(rec and rec.get("exists"))
-    except Exception:
-        return False
-
-
-def norm_relationship_rows(rows):
-    out = []
-    for r in rows or []:
-        out.append(
-            {
-                "from_name": r.get("from_name"),
-                "rel_type": r.get("rel_type"),
-                "to_name": r.get("to_name"),
-                "source_labels": sorted(r.get("source_labels") or []),
-                "target_labels": sorted(r.get("target_labels") or []),
-            }
-        )
-    return out
+def norm_relationship_row(r) -> Dict[str, Any]:
+    return {
+        "from_name": r.get("from_name"),
+        "rel_type": r.get("rel_type"),
+        "to_name": r.get("to_name"),
+        "source_labels": sorted(r.get("source_labels") or []),
+        "target_labels": sorted(r.get("target_labels") or []),
+    }
 
 
 # -----------------------------------------------------------------------------
@@ -67,94 +63,31 @@ def norm_relationship_rows(rows):
 
 LEVEL_ORDER = ["Hub", "Category", "Kind", "Family", "Type", "Class", "Instance"]
 
-NOISE_LABELS = {
-    "Object", "People", "Person", "SharkNode", "System",
-    "__MigrationNode__", "__MigrationRelationship__"
-}
-
-# Canonical display names (tune freely)
-CANONICAL_DISPLAY = {
-    # Air specificity (keep exact strings as requested)
-    "AirType": "AirType",
-    "AirSubType": "AirSubType",
-    "AirVariant": "AirVariant",
-    "AirSubVariant": "AirSubVariant",
-    "AirModel": "AirModel",
-    "AirSubModel": "AirSubModel",
-    "AirInstance": "AirInstance",
-
-    # Ship specificity
-    "ShipType": "ShipType",
-    "ShipSubType": "ShipSubType",
-    "ShipClass": "ShipClass",
-    "ShipSubClass": "ShipSubClass",
-    "ShipInstance": "ShipInstance",
-
-    # Other common endpoints
-    "ArmedForces": "ArmedForces",
-    "Company": "Company",
-    "Manufacturer": "Company",  # treat as synonym unless you want distinct
-    "Organization": "Organization",
-    "Place": "Place",
-    "Country": "Country",
-
-    # Broad labels (allowed but de-prioritized)
-    "AirSystem": "AirSystem",
-    "AirVehicle": "AirVehicle",
-    "SeaVessel": "SeaVessel",
-
-    # Family overrides requested
-    "WeaponType": "WeaponType",
-}
+# Label rules (priorities, noise, canonical names, overrides) live in
+# label_rules.json; label_resolver compiles them once per process.
+NOISE_LABELS = LABEL_RULES.noise_labels
+
+# Canonical display names (tune freely in label_rules.json)
+CANONICAL_DISPLAY = LABEL_RULES.canonical_display
 
 # Prefer most-specific Air label if present (most specific first)
-AIR_SPECIFIC_PRIORITY = [
-    "AirInstance",
-    "AirSubModel",
-    "AirModel",
-    "AirSubVariant",
-    "AirVariant",
-    "AirSubType",
-    "AirType",
-]
+AIR_SPECIFIC_PRIORITY = LABEL_RULES.air_specific_priority
 
 # Prefer most-specific Ship label if present (most specific first)
-SHIP_SPECIFIC_PRIORITY = [
-    "ShipInstance",
-    "ShipSubClass",
-    "ShipClass",
-    "ShipSubType",
-    "ShipType",
-]
+SHIP_SPECIFIC_PRIORITY = LABEL_RULES.ship_specific_priority
 
 # General label priority fallback (after domain-specific specificity checks)
-LEVEL_LABEL_PRIORITY = [
-    "Hub", "Category", "Kind", "Family",
-    "WeaponType",
-    "Company", "Manufacturer",
-    "ArmedForces",
-    "Organization",
-    "Country",
-    "Place",
-    # Broad/utility labels last
-    "AirSystem",
-    "AirVehicle",
-    "SeaVessel",
-]
+LEVEL_LABEL_PRIORITY = LABEL_RULES.level_label_priority
 
 # Levels that should render relationships in generalized mode even if nodes are listed.
-GENERALIZE_RELS_LEVELS = {"Family"}
+GENERALIZE_RELS_LEVELS = LABEL_RULES.generalize_rels_levels
 
 # Family-level relationship-specific target overrides
-REL_TARGET_OVERRIDES = {
-    # Requested:
-    "Weapon_Type": "WeaponType",
-    "Derivative": "AirType",
-}
+REL_TARGET_OVERRIDES = LABEL_RULES.rel_target_overrides
 
 # Kind-level collapse: Nation => Country
-KIND_COLLAPSE_REL_TYPES = {"Nation"}
-KIND_COLLAPSE_TARGET = {"Nation": "Country"}
+KIND_COLLAPSE_TARGET = LABEL_RULES.kind_collapse_target
+KIND_COLLAPSE_REL_TYPES = set(KIND_COLLAPSE_TARGET)
 
 
 def _safe_level_index(level_label: str) -> int:
@@ -176,70 +109,170 @@ def pick_level_display(labels: List[str]) -> str:
     - If Ship hierarchy labels exist, choose the MOST SPECIFIC Ship* label.
     - Otherwise choose by LEVEL_LABEL_PRIORITY.
     - Otherwise fallback to any remaining label.
+
+    Resolution is memoized per distinct label set (see label_resolver).
     """
-    s = set(labels or []) - NOISE_LABELS
+    return LABEL_RULES.export.resolve(labels)
 
-    for key in AIR_SPECIFIC_PRIORITY:
-        if key in s:
-            return CANONICAL_DISPLAY.get(key, key)
 
-    for key in SHIP_SPECIFIC_PRIORITY:
-        if key in s:
-            return CANONICAL_DISPLAY.get(key, key)
+def _pattern_sort_key(x: Dict[str, Any]):
+    return (-x["count"], x["from_level"], x["rel_type"], x["to_level"])
 
-    for key in LEVEL_LABEL_PRIORITY:
-        if key in s:
-            return CANONICAL_DISPLAY.get(key, key)
 
-    for lbl in sorted(s):
-        return CANONICAL_DISPLAY.get(lbl, lbl)
+class OutgoingAggregator:
+    """
+    Incremental version of the outgoing-relationship post-processing.
 
-    return "Node"
+    Rows are fed one at a time (e.g. straight off a Bolt result). Generalized
+    pattern counts and Kind-level collapse counts are updated as rows arrive;
+    the rows themselves are only retained when ``keep_rows`` is set, so memory
+    is otherwise bounded by the number of distinct patterns.
+    """
 
+    def __init__(self, level_label: str, *, keep_rows: bool = True):
+        self.level_label = level_label
+        self.keep_rows = keep_rows
+        self.rows: List[Dict[str, Any]] = []
+        self.total = 0
+        self.generalized: Counter[Tuple[str, str, str]] = Counter()
+        self.collapsed: Counter[Tuple[str, str]] = Counter()  # (from_name, rel_type) -> count
 
-def build_outgoing_generalized(
-    outgoing_norm: List[Dict[str, Any]],
-    *,
-    level_label: str,
-) -> List[Dict[str, Any]]:
-    """
-    Build generalized unique outgoing rel patterns with counts.
+    def add(self, raw) -> None:
+        r = norm_relationship_row(raw)
 
-    Supports:
-      - Family-level relationship target overrides (REL_TARGET_OVERRIDES)
-      - Air/Ship specificity via pick_level_display()
-    """
-    counter: Counter[Tuple[str, str, str]] = Counter()
+        # Kind-level: collapse Nation spam to (X)-[Nation]->(Country) with counts
+        if self.level_label == "Kind":
+            rt = (r.get("rel_type") or "").strip()
+            if rt in KIND_COLLAPSE_REL_TYPES:
+                self.collapsed[(r.get("from_name") or "Node", rt)] += 1
+                return
+
+        self.total += 1
+        if self.keep_rows:
+            self.rows.append(r)
 
-    for r in outgoing_norm or []:
         rel_type = r.get("rel_type")
         if rel_type is None:
-            continue
+            return
         rel_type = str(rel_type).strip()
         if rel_type == "":
-            continue
+            return
 
-        src_labels = r.get("source_labels") or []
-        tgt_labels = r.get("target_labels") or []
-
-        from_level = pick_level_display(src_labels)
-        to_level = pick_level_display(tgt_labels)
+        from_level = pick_level_display(r["source_labels"])
+        to_level = pick_level_display(r["target_labels"])
 
         # Family overrides requested
-        if level_label == "Family" and rel_type in REL_TARGET_OVERRIDES:
+        if self.level_label == "Family" and rel_type in REL_TARGET_OVERRIDES:
             to_level = REL_TARGET_OVERRIDES[rel_type]
 
-        counter[(from_level, rel_type, to_level)] += 1
+        self.generalized[(from_level, rel_type, to_level)] += 1
+
+    def add_pattern(self, from_level: str, rel_type: str, to_level: str, count: int) -> None:
+        """Add an already generalized (from_level, rel_type, to_level, count) tuple."""
+        self.total += count
+        self.generalized[(from_level, rel_type, to_level)] += count
+
+    def extend(self, rows) -> "OutgoingAggregator":
+        for r in rows or []:
+            self.add(r)
+        return self
 
-    out = [
-        {"from_level": k[0], "rel_type": k[1], "to_level": k[2], "count": v}
-        for k, v in counter.items()
-    ]
-    out.sort(key=lambda x: (-x["count"], x["from_level"], x["rel_type"], x["to_level"]))
-    return out
+    def outgoing_generalized(self) -> List[Dict[str, Any]]:
+        out = [
+            {"from_level": k[0], "rel_type": k[1], "to_level": k[2], "count": v}
+            for k, v in self.generalized.items()
+        ]
+        out.sort(key=_pattern_sort_key)
+        return out
+
+    def outgoing_generalized_exceptions(self) -> List[Dict[str, Any]]:
+        out = [
+            {
+                "from_level": from_name,  # show the Kind node (e.g., National)
+                "rel_type": rt,
+                "to_level": KIND_COLLAPSE_TARGET.get(rt, "Node"),
+                "count": cnt,
+            }
+            for (from_name, rt), cnt in self.collapsed.items()
+        ]
+        out.sort(key=_pattern_sort_key)
+        return out
+
+    def state(self, *, include_rows: bool = True) -> Dict[str, Any]:
+        """
+        JSON-serializable partial aggregate (see from_state). Chunk checkpoints
+        store the kept rows separately and leave them out.
+        """
+        return {
+            "level_label": self.level_label,
+            "keep_rows": self.keep_rows,
+            "rows": self.rows if include_rows else [],
+            "total": self.total,
+            "generalized": [[*k, v] for k, v in self.generalized.items()],
+            "collapsed": [[*k, v] for k, v in self.collapsed.items()],
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "OutgoingAggregator":
+        aggregator = cls(state["level_label"], keep_rows=state["keep_rows"])
+        aggregator.rows = list(state["rows"])
+        aggregator.total = state["total"]
+        aggregator.generalized.update({tuple(k): v for *k, v in state["generalized"]})
+        aggregator.collapsed.update({tuple(k): v for *k, v in state["collapsed"]})
+        return aggregator
+
+    def relationships(self) -> Dict[str, Any]:
+        rels: Dict[str, Any] = {
+            "outgoing": self.rows,
+            "outgoing_generalized": self.outgoing_generalized(),
+            "outgoing_generalized_exceptions": self.outgoing_generalized_exceptions(),
+        }
+        if not self.keep_rows:
+            # Rows were not retained; keep the actual total for the card.
+            rels["outgoing_total"] = self.total
+        return rels
+
+
+def relationships_mode_for(level_label: str) -> str:
+    return (
+        "generalized"
+        if (is_deep_level(level_label) or level_label in GENERALIZE_RELS_LEVELS)
+        else "detailed"
+    )
 
 
-def export_level(cfg: dict, level_label: str) -> dict:
+def level_plan(level_label: str) -> Dict[str, Any]:
+    """
+    What the level's card renders, and so what the export has to fetch.
+
+    Deep levels show neither node names nor parent groups: their names are
+    only counted (in the query, not collected), and their parent groups are
+    not queried at all.
+    """
+    deep = is_deep_level(level_label)
+    return {
+        "show_node_list": not deep,
+        "parent_groups": not deep,
+        "relationships_mode": relationships_mode_for(level_label),
+    }
+
+
+def planned_query_keys(level_label: str, *, include_outgoing: bool = True) -> List[str]:
+    """
+    Keys of build_level_queries() the level's plan needs (parent_groups only
+    if it applies). Property names and types come from the run's SchemaCache.
+    """
+    plan = level_plan(level_label)
+    keys = ["grouping", "nodes" if plan["show_node_list"] else "node_count"]
+    if include_outgoing:
+        keys.append("outgoing")
+    if plan["parent_groups"]:
+        keys.append("parent_groups")
+    return keys
+
+
+def build_level_queries(level_label: str, *, ordered_outgoing: bool = True) -> Dict[str, str]:
+    """Cypher queries used to export one level."""
     level_label = sanitize_label(level_label)
 
     q_grouping = f"""
@@ -256,15 +289,14 @@ def export_level(cfg: dict, level_label: str) -> dict:
     RETURN collect(DISTINCT n.Shark_Name) AS node_names
     """
 
-    q_props = f"""
+    q_node_count = f"""
     MATCH (n:`{level_label}`)
-    WITH collect(DISTINCT keys(n)) AS key_sets
-    UNWIND key_sets AS ks
-    UNWIND ks AS k
-    RETURN collect(DISTINCT k) AS props
+    WHERE n.Shark_Name IS NOT NULL AND trim(toString(n.Shark_Name)) <> ''
+    RETURN count(DISTINCT n.Shark_Name) AS node_count
     """
 
-    # Outgoing only
+    # Outgoing only (ordering only matters when the card lists rows)
+    order_by = "ORDER BY from_name, rel_type, to_name" if ordered_outgoing else ""
     q_outgoing = f"""
     MATCH (src:`{level_label}`)-[r]->(tgt)
     WHERE src.Shark_Name IS NOT NULL AND tgt.Shark_Name IS NOT NULL
@@ -274,7 +306,7 @@ def export_level(cfg: dict, level_label: str) -> dict:
       tgt.Shark_Name AS to_name,
       labels(src) AS source_labels,
       labels(tgt) AS target_labels
-    ORDER BY from_name, rel_type, to_name
+    {order_by}
     """
 
     q_parent_groups = f"""
@@ -287,16 +319,333 @@ def export_level(cfg: dict, level_label: str) -> dict:
     ORDER BY parent_name
     """
 
-    with GraphDatabase.driver(cfg["uri"], auth=(cfg["user"], cfg["password"])) as driver:
-        with driver.session(database=cfg["database"]) as session:
-            grouping_rows = session.execute_read(lambda tx: fetch_all(tx, q_grouping))
-            nodes_rows = session.execute_read(lambda tx: fetch_all(tx, q_nodes))
-            props_rows = session.execute_read(lambda tx: fetch_all(tx, q_props))
-            outgoing_rows = session.execute_read(lambda tx: fetch_all(tx, q_outgoing))
+    return {
+        "grouping": q_grouping,
+        "nodes": q_nodes,
+        "node_count": q_node_count,
+        "outgoing": q_outgoing,
+        "parent_groups": q_parent_groups,
+    }
+
+
+def fetch_level_rows(
+    session, level_label: str, schema: SchemaCache, *, include_outgoing: bool = True
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Run the queries of the level's plan (see level_plan) in one session and return the raw result rows."""
+    queries = build_level_queries(level_label)
+
+    rows: Dict[str, List[Dict[str, Any]]] = {"parent_groups": []}
+    for key in planned_query_keys(level_label, include_outgoing=include_outgoing):
+        if key == "parent_groups" and not schema.has_rel_type(level_label):
+            continue
+        with tracing.span("query", "cypher", level=level_label, query=key) as span:
+            rows[key] = session.execute_read(lambda tx, q=queries[key]: fetch_all(tx, q))
+            span["rows"] = len(rows[key])
+    return rows
+
+
+def generalized_outgoing_query(level_label: str, *, source_ids: bool = False) -> Tuple[str, Dict[str, Any]]:
+    """
+    Server-side equivalent of OutgoingAggregator for generalized levels.
+
+    pick_level_display() is compiled into parameters: one priority list (Air
+    specificity, Ship specificity, then LEVEL_LABEL_PRIORITY), the noise labels
+    and the canonical display map; the alphabetical fallback is a reduce().
+    Rows are first grouped by distinct label sets, so the label resolution
+    runs once per combination rather than once per relationship.
+
+    With ``source_ids`` only sources whose elementId is in $ids are counted
+    (one chunk of chunked_outgoing()).
+    """
+    level_label = sanitize_label(level_label)
+    only_ids = "AND elementId(src) IN $ids" if source_ids else ""
+
+    params = {
+        "priority": list(LABEL_RULES.export.priority),
+        "noise": sorted(NOISE_LABELS),
+        "canonical": dict(CANONICAL_DISPLAY),
+        "overrides": dict(REL_TARGET_OVERRIDES) if level_label == "Family" else {},
+    }
+
+    query = f"""
+    MATCH (src:`{level_label}`)-[r]->(tgt)
+    WHERE src.Shark_Name IS NOT NULL AND tgt.Shark_Name IS NOT NULL {only_ids}
+    WITH labels(src) AS src_labels, trim(type(r)) AS rel_type, labels(tgt) AS tgt_labels, count(*) AS cnt
+    WHERE rel_type <> ''
+    WITH rel_type, cnt,
+         [l IN src_labels WHERE NOT l IN $noise] AS s,
+         [l IN tgt_labels WHERE NOT l IN $noise] AS t
+    WITH rel_type, cnt,
+         coalesce(
+           head([p IN $priority WHERE p IN s]),
+           reduce(m = null, l IN s | CASE WHEN m IS NULL OR l < m THEN l ELSE m END)
+         ) AS from_raw,
+         coalesce(
+           head([p IN $priority WHERE p IN t]),
+           reduce(m = null, l IN t | CASE WHEN m IS NULL OR l < m THEN l ELSE m END)
+         ) AS to_raw
+    WITH rel_type, cnt,
+         CASE WHEN from_raw IS NULL THEN 'Node' ELSE coalesce($canonical[from_raw], from_raw) END AS from_level,
+         CASE WHEN to_raw IS NULL THEN 'Node' ELSE coalesce($canonical[to_raw], to_raw) END AS to_level
+    RETURN from_level, rel_type, coalesce($overrides[rel_type], to_level) AS to_level, sum(cnt) AS pattern_count
+    """
+    return query, params
+
+
+def aggregate_outgoing_on_server(session, level_label: str) -> OutgoingAggregator:
+    """
+    Fetch only generalized (from_level, rel_type, to_level, count) tuples,
+    into a fresh aggregator per attempt (see stream_outgoing).
+    """
+    query, params = generalized_outgoing_query(level_label)
+
+    def consume(tx):
+        aggregator = OutgoingAggregator(level_label, keep_rows=False)
+        for rec in tx.run(query, **params):
+            aggregator.add_pattern(rec["from_level"], rec["rel_type"], rec["to_level"], rec["pattern_count"])
+        return aggregator
 
-            parent_groups_rows = []
-            if rel_type_exists(session, level_label):
-                parent_groups_rows = session.execute_read(lambda tx: fetch_all(tx, q_parent_groups))
+    with tracing.span("query", "cypher", level=level_label, query="outgoing_patterns") as span:
+        aggregator = session.execute_read(consume)
+        span["rows"] = len(aggregator.generalized)
+    return aggregator
+
+
+def stream_outgoing(session, level_label: str) -> OutgoingAggregator:
+    """
+    Consume the outgoing query record by record into an OutgoingAggregator.
+
+    Rows are only kept (and only ordered server-side) when the card renders
+    them, i.e. in detailed mode. The aggregator is made inside the
+    transaction function: execute_read runs it again on a transient error,
+    and a retry must not count the rows of the failed attempt.
+    """
+    detailed = relationships_mode_for(level_label) == "detailed"
+    query = build_level_queries(level_label, ordered_outgoing=detailed)["outgoing"]
+
+    def consume(tx):
+        aggregator = OutgoingAggregator(level_label, keep_rows=detailed)
+        progress = tracing.progress(f"{level_label} outgoing", tracing.expected_rows(level_label))
+        rows = 0
+        for rec in tx.run(query):
+            aggregator.add(rec)
+            progress.advance()
+            rows += 1
+        progress.close()
+        return aggregator, rows
+
+    with tracing.span("query", "cypher", level=level_label, query="outgoing_stream") as span:
+        aggregator, span["rows"] = session.execute_read(consume)
+    return aggregator
+
+
+# -----------------------------------------------------------------------------
+# Chunked outgoing export (element-id seeks + checkpoints)
+# -----------------------------------------------------------------------------
+
+CHECKPOINT_VERSION = 2
+
+
+def chunk_queries(level_label: str) -> Dict[str, str]:
+    """
+    Queries of a chunked export: the element ids of the level's named source
+    nodes (one streamed label scan), and the outgoing rows of a chunk of them
+    (the same rows as the outgoing query of build_level_queries, restricted
+    to $ids, which Neo4j answers with element-id seeks).
+    """
+    level_label = sanitize_label(level_label)
+    q_ids = f"""
+    MATCH (src:`{level_label}`)
+    WHERE src.Shark_Name IS NOT NULL
+    RETURN elementId(src) AS id
+    """
+    q_rows = """
+    MATCH (src)-[r]->(tgt)
+    WHERE elementId(src) IN $ids AND tgt.Shark_Name IS NOT NULL
+    RETURN
+      src.Shark_Name AS from_name,
+      type(r) AS rel_type,
+      tgt.Shark_Name AS to_name,
+      labels(src) AS source_labels,
+      labels(tgt) AS target_labels
+    """
+    return {"ids": q_ids, "rows": q_rows}
+
+
+def load_checkpoint(path: Optional[str], identity: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Checkpoint at ``path`` if it belongs to the same export (``identity``), else None."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if any(state.get(k) != v for k, v in identity.items()):
+        print(f"Ignoring checkpoint {path}: written for a different export")
+        return None
+    return state
+
+
+def save_checkpoint(path: str, state: Dict[str, Any]) -> None:
+    """Write atomically, so an interrupted write leaves the previous checkpoint intact."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _write_ids(session, level_label: str, query: str, path: str) -> int:
+    """Stream the source element ids to ``path`` (one per line); returns their count."""
+    def consume(tx):
+        tmp = f"{path}.tmp"
+        count = 0
+        with open(tmp, "w", encoding="utf-8") as f:
+            for rec in tx.run(query):
+                f.write(json.dumps(rec["id"]) + "\n")
+                count += 1
+        os.replace(tmp, path)
+        return count
+
+    with tracing.span("query", "cypher", level=level_label, query="outgoing_chunk_ids") as span:
+        count = span["rows"] = session.execute_read(consume)
+    return count
+
+
+def chunked_outgoing(
+    session,
+    level_label: str,
+    chunk_size: int,
+    checkpoint: Optional[str] = None,
+    *,
+    server_aggregate: bool = False,
+) -> OutgoingAggregator:
+    """
+    stream_outgoing() in short transactions.
+
+    The element ids of the level's named source nodes are read once, in one
+    streamed label scan, into ``<checkpoint>.ids``; then every chunk of at
+    most ``chunk_size`` of them gets its outgoing rows in its own transaction,
+    looked up by element id (no re-scan or re-sort of the label per page).
+    Rows a detailed card keeps are appended to ``<checkpoint>.rows`` as each
+    chunk completes, and the checkpoint itself only holds the offsets into
+    both files and the bounded pattern counters, so each chunk writes just
+    its own rows.
+
+    A later call with the same checkpoint continues after the last completed
+    chunk (rows appended after it are cut off); the checkpoint and its files
+    are removed once the level is done. The driver retries a chunk's
+    transaction on transient errors; rows are only aggregated after it has
+    committed. Without a checkpoint the two files live in a temporary
+    directory.
+
+    The result equals stream_outgoing() (or, with ``server_aggregate`` on a
+    generalized level, aggregate_outgoing_on_server()): pattern counts add
+    up across chunks and detailed rows get the single-shot ORDER BY at the end.
+    """
+    import tempfile
+
+    from graph_source import sort_outgoing
+
+    level_label = sanitize_label(level_label)
+    if chunk_size < 1:
+        raise SystemExit("--chunk-size must be at least 1")
+    if not checkpoint:
+        with tempfile.TemporaryDirectory() as tmp:
+            return chunked_outgoing(session, level_label, chunk_size, os.path.join(tmp, "checkpoint"),
+                                    server_aggregate=server_aggregate)
+
+    detailed = relationships_mode_for(level_label) == "detailed"
+    patterns = server_aggregate and not detailed
+    queries = chunk_queries(level_label)
+    rows_query, rows_params = (
+        generalized_outgoing_query(level_label, source_ids=True) if patterns else (queries["rows"], {})
+    )
+    identity = {
+        "version": CHECKPOINT_VERSION,
+        "exporter_version": EXPORTER_VERSION,
+        "level": level_label,
+        "patterns": patterns,
+        "keep_rows": detailed,
+    }
+    ids_path, rows_path = f"{checkpoint}.ids", f"{checkpoint}.rows"
+
+    state = load_checkpoint(checkpoint, identity)
+    if state is not None and os.path.exists(ids_path) and os.path.exists(rows_path):
+        aggregator = OutgoingAggregator.from_state(state["aggregator"])
+        ids_offset, rows_offset, chunks = state["ids_offset"], state["rows_offset"], state["chunks"]
+        print(f"Resuming {level_label} from {checkpoint} after {chunks} chunk(s)")
+    else:
+        aggregator = OutgoingAggregator(level_label, keep_rows=detailed)
+        ids_offset = rows_offset = chunks = 0
+        _write_ids(session, level_label, queries["ids"], ids_path)
+        open(rows_path, "wb").close()
+
+    def read_chunk(tx, ids):
+        return [r.data() for r in tx.run(rows_query, ids=ids, **rows_params)]
+
+    progress = tracing.progress(f"{level_label} outgoing", tracing.expected_rows(level_label))
+    with open(ids_path, "rb") as ids_file, open(rows_path, "r+b") as rows_file:
+        # Rows appended after the last checkpoint belong to an unfinished chunk
+        rows_file.truncate(rows_offset)
+        aggregator.rows = [json.loads(line) for line in rows_file]
+        ids_file.seek(ids_offset)
+        while True:
+            ids = [json.loads(line) for line in (ids_file.readline() for _ in range(chunk_size)) if line]
+            if not ids:
+                break
+            with tracing.span("query", "cypher", level=level_label, query="outgoing_chunk", chunk=chunks) as span:
+                rows = session.execute_read(read_chunk, ids)
+                span["rows"] = len(rows)
+            kept = len(aggregator.rows)
+            for r in rows:
+                if patterns:
+                    aggregator.add_pattern(r["from_level"], r["rel_type"], r["to_level"], r["pattern_count"])
+                else:
+                    aggregator.add(r)
+                    progress.advance()
+
+            chunks += 1
+            rows_file.write("".join(
+                json.dumps(r, ensure_ascii=False) + "\n" for r in aggregator.rows[kept:]
+            ).encode("utf-8"))
+            rows_file.flush()
+            os.fsync(rows_file.fileno())
+            save_checkpoint(checkpoint, {
+                **identity, "ids_offset": ids_file.tell(), "rows_offset": rows_file.tell(), "chunks": chunks,
+                "aggregator": aggregator.state(include_rows=False),
+            })
+            if len(ids) < chunk_size:
+                break
+    progress.close()
+
+    if detailed:
+        sort_outgoing(aggregator.rows)
+    for path in (checkpoint, ids_path, rows_path):
+        if os.path.exists(path):
+            os.remove(path)
+    return aggregator
+
+
+def build_level_doc(
+    cfg: dict,
+    level_label: str,
+    rows: Dict[str, List[Dict[str, Any]]],
+    outgoing: Optional[OutgoingAggregator] = None,
+    *,
+    schema: SchemaCache,
+    profile: Optional[Dict[str, Any]] = None,
+) -> dict:
+    """
+    Turn raw level query rows into the exported card document.
+
+    ``outgoing`` is an already-fed aggregator (streaming path); otherwise
+    ``rows["outgoing"]`` is aggregated here. Properties (with their types)
+    come from the run's ``schema``; a property ``profile`` (see
+    property_profile.py) is added to the card when given.
+    """
+    grouping_rows = rows.get("grouping")
+    nodes_rows = rows.get("nodes")
+    count_rows = rows.get("node_count")
+    outgoing_rows = rows.get("outgoing")
+    parent_groups_rows = rows.get("parent_groups")
 
     grouping_labels = []
     if grouping_rows and "grouping" in grouping_rows[0]:
@@ -306,10 +655,9 @@ def export_level(cfg: dict, level_label: str) -> dict:
     if nodes_rows and "node_names" in nodes_rows[0]:
         node_names = sorted(set(nodes_rows[0]["node_names"] or []))
     total_nodes = len(node_names)
-
-    properties = []
-    if props_rows and "props" in props_rows[0]:
-        properties = sorted(set(props_rows[0]["props"] or []))
+    if count_rows and "node_count" in count_rows[0]:
+        # Count-only plan: the names were never fetched
+        total_nodes = int(count_rows[0]["node_count"] or 0)
 
     def group_heading(parent: str) -> str:
         if level_label == "Kind":
@@ -337,58 +685,19 @@ def export_level(cfg: dict, level_label: str) -> dict:
                     {"parent": parent, "heading": group_heading(parent), "nodes": kids}
                 )
 
-    outgoing_norm = norm_relationship_rows(outgoing_rows)
-
-    # Kind-level: collapse Nation spam to (X)-[Nation]->(Country) with counts
-    outgoing_generalized_exceptions: List[Dict[str, Any]] = []
-    if level_label == "Kind":
-        keep: List[Dict[str, Any]] = []
-        collapsed_counter: Counter[Tuple[str, str]] = Counter()  # (from_name, rel_type) -> count
-
-        for r in outgoing_norm:
-            rt = (r.get("rel_type") or "").strip()
-            if rt in KIND_COLLAPSE_REL_TYPES:
-                fn = r.get("from_name") or "Node"
-                collapsed_counter[(fn, rt)] += 1
-            else:
-                keep.append(r)
-
-        outgoing_norm = keep
-
-        for (from_name, rt), cnt in collapsed_counter.items():
-            outgoing_generalized_exceptions.append(
-                {
-                    "from_level": from_name,  # show the Kind node (e.g., National)
-                    "rel_type": rt,
-                    "to_level": KIND_COLLAPSE_TARGET.get(rt, "Node"),
-                    "count": cnt,
-                }
-            )
-
-        outgoing_generalized_exceptions.sort(
-            key=lambda x: (-x["count"], x["from_level"], x["rel_type"], x["to_level"])
-        )
+    if outgoing is None:
+        outgoing = OutgoingAggregator(level_label).extend(outgoing_rows)
 
-    outgoing_generalized = build_outgoing_generalized(outgoing_norm, level_label=level_label)
-
-    deep = is_deep_level(level_label)
-    show_node_list = (not deep)
+    plan = level_plan(level_label)
+    show_node_list = plan["show_node_list"]
 
     # For deep levels: suppress explicit node listings
-    if deep:
-        node_names_for_card = []
-        parent_groups_for_card = []
-    else:
-        node_names_for_card = node_names
-        parent_groups_for_card = parent_groups
+    node_names_for_card = node_names if show_node_list else []
+    parent_groups_for_card = parent_groups if plan["parent_groups"] else []
 
-    relationships_mode = (
-        "generalized"
-        if (deep or level_label in GENERALIZE_RELS_LEVELS)
-        else "detailed"
-    )
+    relationships_mode = plan["relationships_mode"]
 
-    return {
+    doc = {
         "level": level_label,
         "level_label": level_label,
         "card": {
@@ -399,19 +708,105 @@ def export_level(cfg: dict, level_label: str) -> dict:
             "labels": {"grouping": grouping_labels},
             "node_names": node_names_for_card,
             "total_nodes": total_nodes,
-            "properties": [{"name": p, "type": "unknown", "required": False} for p in properties],
-            "relationships": {
-                "outgoing": outgoing_norm,
-                "outgoing_generalized": outgoing_generalized,
-                "outgoing_generalized_exceptions": outgoing_generalized_exceptions,
-            },
+            "properties": schema.level_properties(level_label),
+            "relationships": outgoing.relationships(),
         },
         "meta": {
             "db": cfg["database"],
             "generated_utc": now_utc(),
-            "exporter_version": "0.4",
+            "exporter_version": EXPORTER_VERSION,
         },
     }
+    if profile is not None:
+        doc["card"]["property_profile"] = profile
+    return doc
+
+
+def export_level(
+    cfg: dict,
+    level_label: str,
+    driver=None,
+    *,
+    stream: bool = False,
+    server_aggregate: bool = False,
+    source=None,
+    schema: Optional[SchemaCache] = None,
+    profile_budget: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    checkpoint: Optional[str] = None,
+) -> dict:
+    """
+    Export one level.
+
+    The graph is read through a ``source`` (see graph_source.py), e.g. an
+    in-memory dump. Without one, Neo4j is used: pass an open ``driver`` to
+    reuse its connection pool across levels; otherwise a driver is opened
+    (and closed) for this call only. A ``schema`` already fetched for the
+    run (SchemaCache) saves the Neo4j source from fetching its own.
+
+    With ``stream`` the outgoing relationships are aggregated as records
+    arrive; generalized levels then carry ``outgoing_total`` instead of the
+    full row list.
+
+    ``server_aggregate`` implies ``stream`` and, for generalized levels, lets
+    Neo4j collapse labels and count patterns so only the tuples are
+    transferred.
+
+    With a ``profile_budget`` the card also gets a property profile read
+    from at most that many of the level's nodes (see property_profile.py).
+
+    ``chunk_size`` implies ``stream`` and reads the outgoing relationships in
+    chunks of that many source nodes, checkpointed to
+    ``checkpoint`` after each one (see chunked_outgoing); the document is the
+    same as a single-shot export.
+    """
+    level_label = sanitize_label(level_label)
+    stream = stream or server_aggregate or bool(chunk_size)
+
+    if source is None:
+        from graph_source import Neo4jGraphSource
+
+        with Neo4jGraphSource(cfg, driver=driver, schema=schema) as neo4j_source:
+            return export_level(
+                cfg, level_label, stream=stream, server_aggregate=server_aggregate, source=neo4j_source,
+                profile_budget=profile_budget, chunk_size=chunk_size, checkpoint=checkpoint,
+            )
+
+    with tracing.span("export_level", "level", level=level_label):
+        outgoing = None
+        with tracing.span("level_rows", level=level_label) as span:
+            rows = source.level_rows(level_label, include_outgoing=not stream)
+            span["rows"] = sum(len(v) for v in rows.values())
+        if chunk_size:
+            with tracing.span("chunked_outgoing", level=level_label) as span:
+                outgoing = source.chunked_outgoing(
+                    level_label, chunk_size, checkpoint, server_aggregate=server_aggregate
+                )
+                span["rows"] = outgoing.total + sum(outgoing.collapsed.values())
+        elif server_aggregate and relationships_mode_for(level_label) == "generalized":
+            with tracing.span("aggregate_outgoing", level=level_label) as span:
+                outgoing = source.aggregate_outgoing(level_label)
+                span["rows"] = len(outgoing.generalized)
+        elif stream:
+            with tracing.span("stream_outgoing", level=level_label) as span:
+                outgoing = source.stream_outgoing(level_label)
+                span["rows"] = outgoing.total + sum(outgoing.collapsed.values())
+        profile = None
+        if profile_budget:
+            with tracing.span("profile_properties", level=level_label) as span:
+                profile = source.profile_properties(level_label, profile_budget)
+                span["rows"] = profile["scanned"]
+
+        with tracing.span("build_doc", level=level_label):
+            return build_level_doc(cfg, level_label, rows, outgoing, schema=source.schema(), profile=profile)
+
+
+def write_export(data: dict, output_path: str, *, compact: bool = False, compress: bool = False) -> str:
+    """Write the level document (see export_format for the compact / gzip variants)."""
+    with tracing.span("write_export", level=data.get("level_label", "")) as span:
+        path = export_format.write_export(data, output_path, compact=compact, compress=compress)
+        span["bytes"] = os.path.getsize(path)
+    return path
 
 
 def main() -> None:
@@ -420,24 +815,63 @@ def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--level-label", required=True)
     parser.add_argument("--out", default=None)
+    parser.add_argument("--stream", action="store_true",
+                        help="Aggregate outgoing relationships as they arrive; generalized levels "
+                             "store outgoing_total instead of every row")
+    parser.add_argument("--server-aggregate", action="store_true",
+                        help="For generalized levels, collapse labels and count patterns in Cypher "
+                             "(implies --stream)")
+    parser.add_argument("--graph-dump", default=None,
+                        help="Export from a JSONL node/relationship dump held in memory instead of Neo4j "
+                             "(see graph_source.py)")
+    parser.add_argument("--snapshot", default=None,
+                        help="Export from a local SQLite snapshot written by snapshot.py instead of Neo4j")
+    parser.add_argument("--compact", action="store_true",
+                        help="Write the dictionary-encoded compact format (see export_format.py)")
+    parser.add_argument("--gzip", action="store_true",
+                        help="Gzip the export (written as <out>.gz)")
+    parser.add_argument("--schema", default=None,
+                        help="Schema cache saved by render_all.py (see schema_cache.py); "
+                             "fetched from Neo4j when omitted")
+    parser.add_argument("--chunk-size", type=int, default=None, metavar="NODES",
+                        help="Read outgoing relationships in short transactions of NODES source nodes each, "
+                             "checkpointing after every chunk so a rerun resumes (implies --stream)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Checkpoint file for --chunk-size (default: <out> with a .checkpoint suffix)")
+    parser.add_argument("--property-profile", type=int, nargs="?", default=None, metavar="NODES",
+                        const=property_profile.DEFAULT_SCAN_BUDGET,
+                        help="Add a property profile (fill rate, distinct values, types, examples) read from "
+                             "at most NODES nodes of the level (default: %(const)s; see property_profile.py)")
+    parser.add_argument("--trace", default=None,
+                        help="Write a Chrome trace of the export here and print a timing summary "
+                             "(see tracing.py)")
     args = parser.parse_args()
-
-    cfg = {
-        "uri": os.getenv("NEO4J_URI", "neo4j://127.0.0.1:7687"),
-        "user": os.getenv("NEO4J_USER", "neo4j"),
-        "password": require_env("NEO4J_PASSWORD"),
-        "database": os.getenv("NEO4J_DB", "Shark2"),
-    }
+    tracing.setup("export_level", args.trace)
 
     output_path = args.out or f"export/json/{args.level_label}.json"
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-    data = export_level(cfg, args.level_label)
-
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    checkpoint = None
+    if args.chunk_size:
+        checkpoint = args.checkpoint or os.path.splitext(output_path)[0] + ".checkpoint"
+
+    if args.graph_dump or args.snapshot:
+        from graph_source import open_graph_source
+
+        with open_graph_source(dump=args.graph_dump, snapshot=args.snapshot) as source:
+            data = export_level(
+                {"database": source.database}, args.level_label,
+                stream=args.stream, server_aggregate=args.server_aggregate, source=source,
+                profile_budget=args.property_profile, chunk_size=args.chunk_size, checkpoint=checkpoint,
+            )
+    else:
+        data = export_level(
+            config_from_env(), args.level_label, stream=args.stream, server_aggregate=args.server_aggregate,
+            schema=SchemaCache.load(args.schema) if args.schema else None,
+            profile_budget=args.property_profile, chunk_size=args.chunk_size, checkpoint=checkpoint,
+        )
+    output_path = write_export(data, output_path, compact=args.compact, compress=args.gzip)
 
     print(f"Wrote {output_path}")
+    tracing.finish("export_level")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Cheap change-detection fingerprints for level exports.
+
+A fingerprint summarizes what a level export depends on using queries that
+are much cheaper than the export itself. Every level gets:
+
+  - its node count, and the relationship counts per type out of the level,
+    the parent-link count and, per hierarchy relationship type
+    (hierarchy.hierarchy_rel_types), the edge counts into and out of the
+    level, all answered from the count store;
+  - a server-side summary of its Shark_Name values (named count, sum of
+    lengths, min, max) from one label scan that transfers a single row;
+  - its label sets and property names, types and required flags, from the
+    schema cache (db.schema.nodeTypeProperties, fetched once per run);
+  - the exporter version, a hash of the exporter source and the export
+    options, so code or option changes also force a re-export.
+
+The counts miss changes that keep them, such as a rename to a name of the
+same length or a node moved to another parent. Cypher has no string hash
+function without APOC, so where the rows are few (at most STREAM_LIMIT)
+they are also streamed and hashed as they arrive, in constant memory:
+
+  - the Shark_Name values of the level;
+  - per hierarchy relationship type, the (parent, child) name pairs with
+    the level on either end, so moving a Family under another Kind changes
+    both levels' fingerprints;
+  - the outgoing (source, type, target, target labels) rows of detailed
+    levels, or the (source labels, type, target labels) pattern counts of
+    generalized levels.
+
+Above the limit only the counts and the name summary are compared. In
+practice those are the deep levels, whose cards show neither names nor
+parents (export_level.level_plan).
+
+Fingerprints are stored as ``<Level>.fingerprint`` next to ``<Level>.json``.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import export_level
+import hierarchy
+import label_resolver
+from export_format import find_export
+from label_resolver import RULES as LABEL_RULES
+from schema_cache import SchemaCache
+
+
+FINGERPRINT_VERSION = 3
+
+HASH_MASK = (1 << 64) - 1
+
+# Name, edge and outgoing row sets up to this size are hashed row by row
+STREAM_LIMIT = 10_000
+
+# Hierarchy relationship types checked when the caller does not pass its levels
+DEFAULT_LEVELS = LABEL_RULES.core_levels + LABEL_RULES.air_chain + LABEL_RULES.ship_chain
+
+
+def _quote_identifier(name: str) -> str:
+    return "`" + name.replace("`", "``") + "`"
+
+
+def _row_hash(values) -> int:
+    text = json.dumps(values, sort_keys=True, default=str)
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def multiset_hash(rows: Iterable[Any]) -> Dict[str, Any]:
+    """Order-independent hash of ``rows`` (sum of per-row hashes mod 2**64) and their count."""
+    total = count = 0
+    for row in rows:
+        total = (total + _row_hash(row)) & HASH_MASK
+        count += 1
+    return {"count": count, "hash": f"{total:016x}"}
+
+
+def _name_summary_query(level_label: str) -> str:
+    return f"""
+    MATCH (n:{_quote_identifier(level_label)})
+    RETURN
+      count(n.Shark_Name) AS named,
+      sum(size(toString(n.Shark_Name))) AS name_chars,
+      min(toString(n.Shark_Name)) AS name_min,
+      max(toString(n.Shark_Name)) AS name_max
+    """
+
+
+def _count_queries(parts: List[str]) -> str:
+    # One count-store lookup per pattern, returned as (index, count).
+    return "\nUNION ALL\n".join(
+        f"MATCH {pattern} RETURN {i} AS i, count(r) AS cnt" for i, pattern in enumerate(parts)
+    )
+
+
+def _counts(session, patterns: Dict[str, str]) -> Dict[str, int]:
+    """Count-store counts of the ``patterns`` (key -> pattern binding ``r``), zeros left out."""
+    if not patterns:
+        return {}
+    keys = list(patterns)
+    return {
+        keys[rec["i"]]: rec["cnt"]
+        for rec in session.run(_count_queries([patterns[k] for k in keys]))
+        if rec["cnt"]
+    }
+
+
+def _hierarchy_pairs_query(level_label: str, rel_types: List[str]) -> str:
+    """(type, parent name, child name) of hierarchy edges with the level on either end."""
+    label = _quote_identifier(level_label)
+    types = "|".join(_quote_identifier(t) for t in rel_types)
+    return f"""
+    MATCH (p)-[r:{types}]->(c:{label})
+    RETURN type(r) AS t, p.Shark_Name AS parent, c.Shark_Name AS child
+    UNION ALL
+    MATCH (p:{label})-[r:{types}]->(c)
+    RETURN type(r) AS t, p.Shark_Name AS parent, c.Shark_Name AS child
+    """
+
+
+def _hierarchy_types(rel_types: List[str], levels: Optional[List[str]]) -> List[str]:
+    existing = set(rel_types)
+    return [
+        t for t in hierarchy.hierarchy_rel_types(hierarchy.hierarchy_levels(levels or DEFAULT_LEVELS))
+        if t in existing
+    ]
+
+
+def count_fingerprint(session, level_label: str, rel_types: List[str],
+                      levels: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    The count-store part of level_fingerprint on its own: node count,
+    outgoing counts per type, parent links and hierarchy edge counts. No
+    scans, so it is cheap enough to poll (card_server.py).
+    """
+    level_label = export_level.sanitize_label(level_label)
+    label = _quote_identifier(level_label)
+    node_count = session.run(f"MATCH (n:{label}) RETURN count(n) AS cnt").single()["cnt"]
+
+    out_rel_counts = _counts(session, {
+        t: f"(:{label})-[r:{_quote_identifier(t)}]->()" for t in rel_types
+    })
+
+    parent_links = 0
+    if level_label in rel_types:
+        parent_links = session.run(
+            f"MATCH ()-[r:{label}]->(:{label}) RETURN count(r) AS cnt"
+        ).single()["cnt"]
+
+    hier_types = _hierarchy_types(rel_types, levels)
+    hierarchy_counts = _counts(session, {
+        **{f"{t}:in": f"()-[r:{_quote_identifier(t)}]->(:{label})" for t in hier_types},
+        **{f"{t}:out": f"(:{label})-[r:{_quote_identifier(t)}]->()" for t in hier_types},
+    })
+    return {
+        "nodes": node_count,
+        "out_rel_counts": out_rel_counts,
+        "parent_links": parent_links,
+        "hierarchy_counts": hierarchy_counts,
+    }
+
+
+def level_fingerprint(
+    session,
+    level_label: str,
+    *,
+    rel_types: Optional[List[str]] = None,
+    export_options: Optional[Dict[str, Any]] = None,
+    schema: Optional[SchemaCache] = None,
+    levels: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Fingerprint of one level. Pass the ``schema`` (and ``rel_types``)
+    fetched once for all levels; ``levels`` selects the hierarchy
+    relationship types (default: the core, air and ship levels).
+    """
+    level_label = export_level.sanitize_label(level_label)
+    label = _quote_identifier(level_label)
+    if schema is None:
+        schema = SchemaCache.fetch(session)
+    if rel_types is None:
+        rel_types = schema.rel_types
+
+    counts = count_fingerprint(session, level_label, rel_types, levels)
+    nodes = {"nodes": counts["nodes"], **session.run(_name_summary_query(level_label)).single().data()}
+    if counts["nodes"] <= STREAM_LIMIT:
+        nodes["names"] = multiset_hash(
+            rec["name"] for rec in session.run(f"MATCH (n:{label}) RETURN n.Shark_Name AS name")
+        )["hash"]
+    out_rel_counts = counts["out_rel_counts"]
+
+    hier_types = _hierarchy_types(rel_types, levels)
+    hier: Dict[str, Any] = {"counts": counts["hierarchy_counts"]}
+    if hier_types and sum(hier["counts"].values()) <= STREAM_LIMIT:
+        # Per-type running sums, so the pairs are not held in memory either
+        pair_sums: Dict[str, List[int]] = {}
+        for rec in session.run(_hierarchy_pairs_query(level_label, hier_types)):
+            sums = pair_sums.setdefault(rec["t"], [0, 0])
+            sums[0] = (sums[0] + _row_hash((rec["parent"], rec["child"]))) & HASH_MASK
+            sums[1] += 1
+        hier["pairs"] = {
+            t: {"count": count, "hash": f"{total:016x}"} for t, (total, count) in sorted(pair_sums.items())
+        }
+
+    label_sets = {
+        tuple(sorted(row.get("labels") or [])) for row in schema.node_properties
+        if level_label in (row.get("labels") or [])
+    }
+
+    fp: Dict[str, Any] = {
+        "version": FINGERPRINT_VERSION,
+        "level": level_label,
+        "exporter_version": export_level.EXPORTER_VERSION,
+        "exporter_source": hashlib.sha256(Path(export_level.__file__).read_bytes()).hexdigest(),
+        "label_rules": hashlib.sha256(label_resolver.RULES_PATH.read_bytes()).hexdigest(),
+        "export_options": dict(sorted((export_options or {}).items())),
+        "nodes": nodes,
+        "label_sets": sorted(list(ls) for ls in label_sets),
+        "properties": schema.level_properties(level_label),
+        "out_rel_counts": out_rel_counts,
+        "parent_links": counts["parent_links"],
+        "hierarchy": hier,
+    }
+
+    if sum(out_rel_counts.values()) <= STREAM_LIMIT:
+        if export_level.relationships_mode_for(level_label) == "detailed":
+            fp["targets"] = multiset_hash(
+                (rec["s"], rec["t"], rec["o"], sorted(rec["labels"]))
+                for rec in session.run(
+                    f"MATCH (n:{label})-[r]->(t) "
+                    "RETURN n.Shark_Name AS s, type(r) AS t, t.Shark_Name AS o, labels(t) AS labels"
+                )
+            )
+        else:
+            fp["patterns"] = sorted(
+                (sorted(rec["s"]), rec["t"], sorted(rec["o"]), rec["cnt"])
+                for rec in session.run(
+                    f"MATCH (n:{label})-[r]->(t) "
+                    "RETURN labels(n) AS s, type(r) AS t, labels(t) AS o, count(*) AS cnt"
+                )
+            )
+
+    return fp
+
+
+def fingerprint_path(json_path: Path) -> Path:
+    name = Path(json_path).name
+    stem = name[: -len(".json.gz")] if name.endswith(".json.gz") else Path(name).stem
+    return Path(json_path).with_name(stem + ".fingerprint")
+
+
+def read_fingerprint(json_path: Path) -> Optional[Dict[str, Any]]:
+    path = fingerprint_path(json_path)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def write_fingerprint(json_path: Path, fp: Dict[str, Any]) -> None:
+    path = fingerprint_path(json_path)
+    path.write_text(json.dumps(fp, indent=2, sort_keys=True, default=str) + "\n", encoding="utf-8")
+
+
+def _normalized(fp: Dict[str, Any]) -> str:
+    return json.dumps(fp, sort_keys=True, default=str)
+
+
+def changed_levels(
+    driver,
+    database: str,
+    levels: List[str],
+    json_dir: Path,
+    out_dir: Path,
+    *,
+    export_options: Optional[Dict[str, Any]] = None,
+):
+    """
+    Compare current fingerprints with the stored ones.
+
+    Returns (changed, fingerprints): the levels that need export + render
+    (fingerprint differs, or the JSON / Markdown output is missing) and the
+    freshly computed fingerprints to store once those levels are rebuilt.
+    """
+    changed: List[str] = []
+    fingerprints: Dict[str, Dict[str, Any]] = {}
+    with driver.session(database=database) as session:
+        schema = SchemaCache.fetch(session)
+        for lvl in levels:
+            json_path = find_export(Path(json_dir) / f"{lvl}.json")
+            md_path = Path(out_dir) / f"{lvl}.md"
+            fp = level_fingerprint(session, lvl, export_options=export_options, schema=schema, levels=levels)
+            fingerprints[lvl] = fp
+
+            stored = read_fingerprint(json_path)
+            if (
+                stored is None
+                or not json_path.exists()
+                or not md_path.exists()
+                or _normalized(stored) != _normalized(fp)
+            ):
+                changed.append(lvl)
+    return changed, fingerprints
@@ -1,14 +1,38 @@
 #!/usr/bin/env python3
-"""Generate Graphviz diagrams from ontology JSON exports."""
-
-import json
+"""
+Generate Graphviz diagrams from ontology JSON exports.
+
+Every diagram is laid out once by a single dot call that writes all output
+formats (PDF for the document, SVG and PNG for the web), and the Graphviz
+jobs of all diagrams run concurrently on a thread pool. A diagram whose
+DOT content is unchanged is not laid out again.
+
+Besides the overview and domain diagrams, drill-down diagrams are written
+to diagrams/drilldown/: one per Kind (or Category, --drilldown Category)
+showing its Families and their type-level nodes with instance counts.
+Large partitions are split into pages of at most --page-size nodes, with
+each Family in its own cluster, so every Graphviz layout stays small.
+"""
+
+import argparse
+import os
+import re
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import hierarchy
+import tracing
+from build_cache import BuildCache, card_digest, digest, open_cache
+import diagram_model
+from diagram_model import LevelModel
+from export_format import find_export, load_export
 
 
 def load_json(path: Path) -> dict:
-    """Load JSON file."""
-    return json.loads(path.read_text(encoding="utf-8"))
+    """Load a level export (plain or compact JSON, optionally gzipped)."""
+    return load_export(path)
 
 
 def sanitize_id(name: str) -> str:
@@ -16,13 +40,23 @@ def sanitize_id(name: str) -> str:
     return name.replace(" ", "_").replace("-", "_").replace("/", "_")
 
 
-def generate_overview_dot(json_dir: Path) -> str:
-    """Generate DOT for high-level overview (Hub → Category → Kind → Family)."""
+def instances_suffix(count: int) -> str:
+    return f"\\n{count:,} instances" if count else ""
+
+
+def generate_overview_dot(json_dir: Path, index: Optional[hierarchy.HierarchyIndex] = None) -> str:
+    """
+    Generate DOT for high-level overview (Hub → Category → Kind → Family).
+
+    When the hierarchy rollup ``index`` (hierarchy.py; loaded from
+    ``json_dir`` if not given) is present, Kind and collapsed Family nodes
+    also show how many instances lie below them.
+    """
 
-    hub = load_json(json_dir / "Hub.json")
-    category = load_json(json_dir / "Category.json")
-    kind = load_json(json_dir / "Kind.json")
-    family = load_json(json_dir / "Family.json")
+    model = LevelModel.from_exports(json_dir, index)
+    hub = {"card": model.cards["Hub"]}
+    category = {"card": model.cards["Category"]}
+    kind = {"card": model.cards["Kind"]}
 
     lines = [
         'digraph overview {',
@@ -86,7 +120,8 @@ def generate_overview_dot(json_dir: Path) -> str:
             for node in group["nodes"]:
                 node_id = sanitize_id(node)
                 kind_ids.append(node_id)
-                lines.append(f'    {node_id} [label="{node}", fillcolor="#f0ad4e", fontcolor=white];')
+                suffix = instances_suffix(model.instances("Kind", node))
+                lines.append(f'    {node_id} [label="{node}{suffix}", fillcolor="#f0ad4e", fontcolor=white];')
 
     # Add collapsed group nodes
     for parent, (label, count) in collapse_groups.items():
@@ -98,6 +133,7 @@ def generate_overview_dot(json_dir: Path) -> str:
     lines.append('')
 
     # Category → Kind edges with label
+    collapsed_edges = set()
     for rel in category["card"]["relationships"]["outgoing"]:
         from_id = sanitize_id(rel["from_name"])
         to_name = rel["to_name"]
@@ -106,9 +142,9 @@ def generate_overview_dot(json_dir: Path) -> str:
         if rel["from_name"] in collapse_groups:
             to_id = sanitize_id(collapse_groups[rel["from_name"]][0])
             # Only add edge once for collapsed groups
-            edge = f'    {from_id} -> {to_id} [label="Kind"];'
-            if edge not in lines:
-                lines.append(edge)
+            if (from_id, to_id) not in collapsed_edges:
+                collapsed_edges.add((from_id, to_id))
+                lines.append(f'    {from_id} -> {to_id} [label="Kind"];')
         else:
             to_id = sanitize_id(to_name)
             lines.append(f'    {from_id} -> {to_id} [label="Kind"];')
@@ -124,15 +160,11 @@ def generate_overview_dot(json_dir: Path) -> str:
     for cat in categories:
         family_by_category[cat] = 0
 
-    for group in family["card"]["parent_groups"]:
-        parent = group["parent"]
-        count = len(group["nodes"])
+    for parent, nodes in model.groups("Family").items():
         # Map parent Kind to its Category
-        for kg in kind["card"]["parent_groups"]:
-            if parent in kg["nodes"]:
-                cat = kg["parent"]
-                family_by_category[cat] += count
-                break
+        cat = model.parent("Kind", parent)
+        if cat is not None:
+            family_by_category[cat] = family_by_category.get(cat, 0) + len(nodes)
 
     # Add collapsed family nodes per category
     family_ids = []
@@ -140,7 +172,8 @@ def generate_overview_dot(json_dir: Path) -> str:
         node_id = f"Family_{sanitize_id(cat)}"
         family_ids.append(node_id)
         if count > 0:
-            lines.append(f'    {node_id} [label="{cat} Families\\n({count})", fillcolor="#d9534f", fontcolor=white];')
+            suffix = instances_suffix(model.instances("Category", cat))
+            lines.append(f'    {node_id} [label="{cat} Families\\n({count}){suffix}", fillcolor="#d9534f", fontcolor=white];')
         else:
             lines.append(f'    {node_id} [label="{cat} Families\\n(N/A)", fillcolor="#d9534f", fontcolor=white];')
 
@@ -167,8 +200,8 @@ def generate_overview_dot(json_dir: Path) -> str:
     return '\n'.join(lines)
 
 
-def generate_air_domain_dot(json_dir: Path) -> str:
-    """Generate DOT for Air domain hierarchy."""
+def generate_air_domain_dot(json_dir: Path, index: Optional[hierarchy.HierarchyIndex] = None) -> str:
+    """Generate DOT for Air domain hierarchy (no rollups: ``index`` is not used)."""
 
     # Define the air hierarchy levels (excluding AirInstance which has special connections)
     air_chain = ["AirType", "AirSubType", "AirVariant", "AirSubVariant", "AirModel", "AirSubModel"]
@@ -199,7 +232,7 @@ def generate_air_domain_dot(json_dir: Path) -> str:
 
     # Add nodes for the chain
     for level in air_chain:
-        json_path = json_dir / f"{level}.json"
+        json_path = find_export(json_dir / f"{level}.json")
         if json_path.exists():
             data = load_json(json_path)
             count = data["card"]["total_nodes"]
@@ -207,7 +240,7 @@ def generate_air_domain_dot(json_dir: Path) -> str:
             lines.append(f'    {level} [label="{label}", fillcolor="{colors[level]}"];')
 
     # Add AirInstance node
-    json_path = json_dir / "AirInstance.json"
+    json_path = find_export(json_dir / "AirInstance.json")
     if json_path.exists():
         data = load_json(json_path)
         count = data["card"]["total_nodes"]
@@ -238,8 +271,8 @@ def generate_air_domain_dot(json_dir: Path) -> str:
     return '\n'.join(lines)
 
 
-def generate_ship_domain_dot(json_dir: Path) -> str:
-    """Generate DOT for Ship domain hierarchy."""
+def generate_ship_domain_dot(json_dir: Path, index: Optional[hierarchy.HierarchyIndex] = None) -> str:
+    """Generate DOT for Ship domain hierarchy (no rollups: ``index`` is not used)."""
 
     ship_levels = ["ShipType", "ShipSubType", "ShipClass", "ShipSubClass", "ShipInstance"]
 
@@ -267,7 +300,7 @@ def generate_ship_domain_dot(json_dir: Path) -> str:
 
     # Add nodes for each level with counts
     for level in ship_levels:
-        json_path = json_dir / f"{level}.json"
+        json_path = find_export(json_dir / f"{level}.json")
         if json_path.exists():
             data = load_json(json_path)
             count = data["card"]["total_nodes"]
@@ -299,42 +332,298 @@ def generate_ship_domain_dot(json_dir: Path) -> str:
     return '\n'.join(lines)
 
 
+# Drill-down layouts hold at most this many nodes (Families plus type-level nodes) per page.
+DRILLDOWN_PAGE_SIZE = 60
+
+# Type-level nodes drawn per Family; the rest are summarized in one "+N more" node.
+DRILLDOWN_TYPES_PER_FAMILY = 12
+
+DRILLDOWN_COLORS = {
+    "Category": "#5cb85c",
+    "Kind": "#f0ad4e",
+    "Family": "#d9534f",
+    "AirType": "#4a90d9",
+    "ShipType": "#2c3e50",
+    "WeaponType": "#8e44ad",
+}
+DRILLDOWN_DEFAULT_COLOR = "#7f8c8d"
+
+
+def quote_id(value) -> str:
+    """Quoted Graphviz ID or label (drill-down names contain dots, spaces, ...); \\n escapes are kept."""
+    text = str(value).replace('"', '\\"')
+    return f'"{text}"'
+
+
+def slug(value) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", str(value)).strip("_") or "unnamed"
+
+
+def drilldown_partitions(model: LevelModel, partition_by: str) -> List[Tuple[Any, List[Tuple[Any, Any]]]]:
+    """(Kind or Category name, [(kind, family), ...]) for every partition that has Families."""
+    if partition_by == "Category":
+        roots = [(cat, model.children("Kind", cat)) for cat in model.names("Category")]
+    else:
+        roots = [(kind, [kind]) for kind in model.names("Kind")]
+    partitions = []
+    for root, kinds in roots:
+        families = [(kind, family) for kind in kinds for family in model.children("Family", kind)]
+        if families:
+            partitions.append((root, families))
+    return partitions
+
+
+def paginate_families(model: LevelModel, families: List[Tuple[Any, Any]], page_size: int) -> List[List[Tuple[Any, Any]]]:
+    """Split a partition's Families into pages of at most ``page_size`` nodes (a Family is never split)."""
+    pages, page, size = [], [], 0
+    for kind, family in families:
+        types = len(model.type_children(family))
+        weight = 1 + min(types, DRILLDOWN_TYPES_PER_FAMILY) + (types > DRILLDOWN_TYPES_PER_FAMILY)
+        if page and size + weight > page_size:
+            pages.append(page)
+            page, size = [], 0
+        page.append((kind, family))
+        size += weight
+    if page:
+        pages.append(page)
+    return pages
+
+
+def generate_drilldown_page_dot(model: LevelModel, partition_by: str, root, page: List[Tuple[Any, Any]],
+                                page_no: int, pages: int) -> str:
+    """DOT for one page of a partition: root -> (Kinds ->) Family clusters with their type-level nodes."""
+    title = f"{root} {partition_by}" + (f" (page {page_no} of {pages})" if pages > 1 else "")
+    lines = [
+        f'digraph {quote_id(title)} {{',
+        '    rankdir=LR;',
+        '    node [shape=box, style="rounded,filled", fontname="Helvetica", fontcolor=white, fontsize=11];',
+        '    edge [fontname="Helvetica", fontsize=9, color="#888888"];',
+        f'    label={quote_id(title)};',
+        '    labelloc=t;',
+        '    fontsize=16;',
+        '    fontname="Helvetica Bold";',
+        '',
+    ]
+
+    def node(node_id: str, label: str, level: str) -> None:
+        color = DRILLDOWN_COLORS.get(level, DRILLDOWN_DEFAULT_COLOR)
+        lines.append(f'    {quote_id(node_id)} [label={quote_id(label)}, fillcolor="{color}"];')
+
+    def edge(from_id: str, to_id: str, indent: str = "    ") -> None:
+        lines.append(f'{indent}{quote_id(from_id)} -> {quote_id(to_id)};')
+
+    root_id = f"{partition_by}:{root}"
+    node(root_id, f"{root}{instances_suffix(model.instances(partition_by, root))}", partition_by)
+
+    kind_ids = set()
+    for cluster, (kind, family) in enumerate(page):
+        parent_id = root_id
+        if partition_by == "Category":
+            parent_id = f"Kind:{kind}"
+            if parent_id not in kind_ids:
+                kind_ids.add(parent_id)
+                node(parent_id, f"{kind}{instances_suffix(model.instances('Kind', kind))}", "Kind")
+                edge(root_id, parent_id)
+
+        family_id = f"Family:{family}"
+        types = model.type_children(family)
+        lines.append('')
+        lines.append(f'    subgraph cluster_{cluster} {{')
+        lines.append('        style="rounded,dashed"; color="#cccccc"; label="";')
+        color = DRILLDOWN_COLORS["Family"]
+        label = f"{family}{instances_suffix(model.instances('Family', family))}"
+        lines.append(f'        {quote_id(family_id)} [label={quote_id(label)}, fillcolor="{color}"];')
+        for level, name in types[:DRILLDOWN_TYPES_PER_FAMILY]:
+            color = DRILLDOWN_COLORS.get(level, DRILLDOWN_DEFAULT_COLOR)
+            label = f"{name}\\n{level}{instances_suffix(model.instances(level, name))}"
+            lines.append(f'        {quote_id(f"{level}:{name}")} [label={quote_id(label)}, fillcolor="{color}"];')
+            edge(family_id, f"{level}:{name}", "        ")
+        hidden = len(types) - DRILLDOWN_TYPES_PER_FAMILY
+        if hidden > 0:
+            more_id = f"more:{family}"
+            lines.append(f'        {quote_id(more_id)} [label="+{hidden:,} more", fillcolor="{DRILLDOWN_DEFAULT_COLOR}"];')
+            edge(family_id, more_id, "        ")
+        lines.append('    }')
+        edge(parent_id, family_id)
+
+    lines.append('}')
+    return '\n'.join(lines)
+
+
+def generate_drilldown_dots(json_dir: Path, partition_by: str = "Kind",
+                            page_size: int = DRILLDOWN_PAGE_SIZE,
+                            index: Optional[hierarchy.HierarchyIndex] = None) -> Dict[str, str]:
+    """{diagram name: DOT} for every page of every drill-down partition."""
+    model = LevelModel.from_exports(json_dir, index)
+    dots: Dict[str, str] = {}
+    bases = set()
+    for root, families in drilldown_partitions(model, partition_by):
+        pages = paginate_families(model, families, page_size)
+        base = f"{partition_by.lower()}_{slug(root)}"
+        while base in bases:
+            base += "_"  # two names with the same slug
+        bases.add(base)
+        for page_no, page in enumerate(pages, 1):
+            name = base if len(pages) == 1 else f"{base}_p{page_no}"
+            dots[name] = generate_drilldown_page_dot(model, partition_by, root, page, page_no, len(pages))
+    return dots
+
+
+# Output formats written by default; pdf is the one the assembled document includes.
+FORMATS = ("pdf", "svg", "png")
+
+
+def render_dot(dot_path: Path, outputs: Dict[str, Path]):
+    """Lay out a DOT file once and write it in every format of ``outputs`` ({format: path})."""
+    cmd = ["dot", str(dot_path)]
+    for fmt, path in outputs.items():
+        cmd += [f"-T{fmt}", "-o", str(path)]
+    subprocess.check_call(cmd)
+
+
 def render_dot_to_pdf(dot_path: Path, pdf_path: Path):
     """Render DOT file to PDF using Graphviz."""
-    subprocess.check_call(["dot", "-Tpdf", str(dot_path), "-o", str(pdf_path)])
+    render_dot(dot_path, {"pdf": pdf_path})
+
+
+# (name, generator(json_dir, index), levels whose JSON the generator reads)
+DIAGRAMS = [
+    ("overview", generate_overview_dot, ["Hub", "Category", "Kind", "Family"]),
+    ("air_domain", generate_air_domain_dot,
+     ["AirType", "AirSubType", "AirVariant", "AirSubVariant", "AirModel", "AirSubModel", "AirInstance"]),
+    ("ship_domain", generate_ship_domain_dot, ["ShipType", "ShipSubType", "ShipClass", "ShipSubClass", "ShipInstance"]),
+]
+
+
+def diagram_input_key(json_dir: Path, levels, index: Optional[hierarchy.HierarchyIndex]) -> str:
+    """Cache key for a DOT file: this script's source, the cards it reads and the rollup index."""
+    parts = [
+        Path(__file__).read_bytes(),
+        Path(diagram_model.__file__).read_bytes(),
+        index.digest if index is not None else "",
+    ]
+    for level in levels:
+        json_path = find_export(json_dir / f"{level}.json")
+        parts.append(level)
+        parts.append(card_digest(load_json(json_path)) if json_path.exists() else "")
+    return digest(*parts)
+
+
+def render_job(name: str, dot_path: Path, outputs: Dict[str, Path]):
+    with tracing.span("graphviz", "diagram", level=name) as span:
+        render_dot(dot_path, outputs)
+        span["bytes"] = sum(p.stat().st_size for p in outputs.values())
+
+
+def write_drilldowns(json_dir: Path, out_dir: Path, cache: BuildCache, partition_by: str,
+                     page_size: int, index: Optional[hierarchy.HierarchyIndex] = None) -> List[Tuple[str, Path]]:
+    """Write the drill-down DOT files (keyed by their content) and drop pages that no longer exist."""
+    out_dir.mkdir(exist_ok=True)
+    with tracing.span("dot_generate", "diagram", level=f"drilldown_{partition_by}") as span:
+        dots = generate_drilldown_dots(json_dir, partition_by, page_size, index)
+        span["bytes"] = sum(len(text.encode("utf-8")) for text in dots.values())
+
+    written = []
+    for name, text in dots.items():
+        dot_path = out_dir / f"{name}.dot"
+        dot_key = digest(text)
+        if not cache.is_fresh(dot_path, dot_key):
+            dot_path.write_text(text, encoding="utf-8")
+            cache.record(dot_path, dot_key)
+        written.append((name, dot_path))
+
+    for path in out_dir.iterdir():
+        if path.is_file() and path.stem not in dots:
+            path.unlink()
+    return written
+
+
+def render_dots(dot_paths: List[Tuple[str, Path]], cache: BuildCache, formats: Sequence[str],
+               jobs: Optional[int] = None):
+    """Lay out every DOT file whose outputs are stale, concurrently on a thread pool."""
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+        pending = {}
+        for name, dot_path in dot_paths:
+            # Outputs are keyed by the DOT content: same DOT, same layout.
+            layout_key = digest(dot_path.read_bytes())
+            outputs = {fmt: dot_path.with_suffix(f".{fmt}") for fmt in formats}
+            if all(cache.is_fresh(path, layout_key) for path in outputs.values()):
+                continue
+            pending[pool.submit(render_job, name, dot_path, outputs)] = (outputs, layout_key)
+
+        # The cache is only touched from this thread.
+        for future in as_completed(pending):
+            future.result()
+            outputs, layout_key = pending[future]
+            for path in outputs.values():
+                cache.record(path, layout_key)
+                print(f"  Wrote {path}")
+
+
+def generate_all(json_dir: Path, diagrams_dir: Path, cache: BuildCache, formats: Sequence[str] = FORMATS,
+                 jobs: Optional[int] = None, drilldown: Optional[str] = "Kind",
+                 page_size: int = DRILLDOWN_PAGE_SIZE):
+    """
+    Write every DOT file and its rendered outputs, skipping artifacts whose inputs are unchanged.
+
+    ``drilldown`` is the level the drill-down diagrams are partitioned by
+    ("Kind" or "Category"), None for none. The rollup index is loaded
+    (memory-mapped) once and shared by every diagram.
+    """
+    diagrams_dir.mkdir(exist_ok=True)
+    index = hierarchy.load_for(json_dir)
+
+    dot_paths = []
+    for name, generator, levels in DIAGRAMS:
+        print(f"Generating {name.replace('_', ' ')} diagram...")
+        dot_path = diagrams_dir / f"{name}.dot"
+
+        dot_key = diagram_input_key(json_dir, levels, index)
+        if not cache.is_fresh(dot_path, dot_key):
+            with tracing.span("dot_generate", "diagram", level=name) as span:
+                text = generator(json_dir, index)
+                dot_path.write_text(text, encoding="utf-8")
+                span["bytes"] = len(text.encode("utf-8"))
+            cache.record(dot_path, dot_key)
+        dot_paths.append((name, dot_path))
+
+    if drilldown:
+        print(f"Generating {drilldown} drill-down diagrams...")
+        dot_paths += write_drilldowns(json_dir, diagrams_dir / "drilldown", cache, drilldown, page_size, index)
 
+    render_dots(dot_paths, cache, formats, jobs)
+    cache.save()
+    print(cache.summary())
 
-def main():
+
+def main(argv=None):
     root = Path(__file__).parent.resolve()
+
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--cache-dir", default=str(root / ".build_cache"),
+                    help="Build cache directory (default: .build_cache)")
+    ap.add_argument("--no-cache", action="store_true", help="Always regenerate every diagram")
+    ap.add_argument("--formats", nargs="+", default=list(FORMATS),
+                    help="Graphviz output formats, all written from one layout (default: pdf svg png)")
+    ap.add_argument("--jobs", type=int, default=None,
+                    help="Concurrent Graphviz jobs (default: CPU count)")
+    ap.add_argument("--drilldown", choices=["Kind", "Category", "none"], default="Kind",
+                    help="Partition the drill-down diagrams per Kind or per Category (default: Kind)")
+    ap.add_argument("--page-size", type=int, default=DRILLDOWN_PAGE_SIZE,
+                    help=f"Maximum nodes per drill-down page (default: {DRILLDOWN_PAGE_SIZE})")
+    ap.add_argument("--trace", default=None, help="Write a Chrome trace here (see tracing.py)")
+    args = ap.parse_args(argv)
+    tracing.setup("generate_diagrams", args.trace)
+
     json_dir = root / "export" / "json"
     diagrams_dir = root / "diagrams"
-    diagrams_dir.mkdir(exist_ok=True)
+    cache = open_cache(None if args.no_cache else Path(args.cache_dir), "diagrams")
 
-    # Generate overview diagram
-    print("Generating overview diagram...")
-    overview_dot = generate_overview_dot(json_dir)
-    overview_dot_path = diagrams_dir / "overview.dot"
-    overview_dot_path.write_text(overview_dot, encoding="utf-8")
-    render_dot_to_pdf(overview_dot_path, diagrams_dir / "overview.pdf")
-    print(f"  Wrote {diagrams_dir / 'overview.pdf'}")
-
-    # Generate air domain diagram
-    print("Generating air domain diagram...")
-    air_dot = generate_air_domain_dot(json_dir)
-    air_dot_path = diagrams_dir / "air_domain.dot"
-    air_dot_path.write_text(air_dot, encoding="utf-8")
-    render_dot_to_pdf(air_dot_path, diagrams_dir / "air_domain.pdf")
-    print(f"  Wrote {diagrams_dir / 'air_domain.pdf'}")
-
-    # Generate ship domain diagram
-    print("Generating ship domain diagram...")
-    ship_dot = generate_ship_domain_dot(json_dir)
-    ship_dot_path = diagrams_dir / "ship_domain.dot"
-    ship_dot_path.write_text(ship_dot, encoding="utf-8")
-    render_dot_to_pdf(ship_dot_path, diagrams_dir / "ship_domain.pdf")
-    print(f"  Wrote {diagrams_dir / 'ship_domain.pdf'}")
+    drilldown = None if args.drilldown == "none" else args.drilldown
+    generate_all(json_dir, diagrams_dir, cache, args.formats, args.jobs, drilldown, args.page_size)
 
     print("Done!")
+    tracing.finish("generate_diagrams")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,738 @@
+#!/usr/bin/env python3
+"""
+Graph sources for the exporters.
+
+The exporters only need a handful of requests from the graph: the per-level
+rows of the level's plan (grouping labels, node names or just their count,
+outgoing relationships, parent groups where the card shows them; see
+export_level.level_plan), the run's schema (labels, relationship types and
+typed properties; see schema_cache.py), bounded property profiles
+(property_profile.py), the outgoing relationships as a stream or as
+generalized pattern counts, a label schema summary (family_export /
+kind_export), the level nodes and parent -> child edges for hierarchy.py,
+database statistics and cheap count-store fingerprints of a level and of
+the hierarchy (card_server.py keys its cache on them). GraphSource is that
+interface, with three implementations:
+
+  Neo4jGraphSource     the existing Cypher queries over a neo4j driver
+  InMemoryGraphSource  a node/relationship dump loaded into memory with
+                       label and relationship-type indexes, answering the
+                       same requests natively (no database needed)
+  SqliteGraphSource    SQL equivalents of the queries over an indexed local
+                       snapshot written by snapshot.py
+
+Only Neo4jGraphSource needs the neo4j driver; it is imported when one is
+opened.
+
+The in-memory source reads APOC-style JSONL (``apoc.export.json.all`` or
+synthetic_ontology.py --out):
+
+    {"type": "node", "id": "0", "labels": [...], "properties": {...}}
+    {"type": "relationship", "label": "Kind", "start": {"id": "0"}, "end": {"id": "1"}, ...}
+"""
+
+import hashlib
+import json
+import sqlite3
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import export_level
+import hierarchy
+import property_profile
+import snapshot
+import tracing
+from bulk_export import _is_listed_name, cypher_sort_key
+from db_stats import collect_db_statistics
+from schema_cache import SchemaCache
+
+
+def label_schema_query(label: str) -> str:
+    """Properties plus distinct outgoing/incoming (type, other-end labels) of one label."""
+    label = export_level.sanitize_label(label)
+    return (
+        f"MATCH (n:`{label}`) "
+        "WITH collect(DISTINCT keys(n)) AS key_lists "
+        "UNWIND key_lists AS kl "
+        "UNWIND kl AS key "
+        "WITH collect(DISTINCT key) AS all_props "
+        "CALL { "
+        f"  MATCH (n:`{label}`)-[r]->(t) "
+        "  RETURN collect(DISTINCT { "
+        "    type: type(r), "
+        "    direction: 'OUT', "
+        "    target_labels: labels(t) "
+        "  }) AS out_rels "
+        "} "
+        "CALL { "
+        f"  MATCH (s)-[r]->(n:`{label}`) "
+        "  RETURN collect(DISTINCT { "
+        "    type: type(r), "
+        "    direction: 'IN', "
+        "    source_labels: labels(s) "
+        "  }) AS in_rels "
+        "} "
+        "RETURN all_props AS properties, out_rels AS outgoing_relationships, in_rels AS incoming_relationships"
+    )
+
+
+def sort_outgoing(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """ORDER BY from_name, rel_type, to_name with Cypher's ordering of mixed types."""
+    rows.sort(key=lambda r: (
+        cypher_sort_key(r["from_name"]), cypher_sort_key(r["rel_type"]), cypher_sort_key(r["to_name"])
+    ))
+    return rows
+
+
+def parent_group_rows(pairs: Iterable[Tuple[Any, Any]]) -> List[Dict[str, Any]]:
+    """Rows of the parent_groups query from (parent name, child name) pairs."""
+    groups: Dict[Any, set] = {}
+    for parent, child in pairs:
+        if _is_listed_name(parent) and _is_listed_name(child):
+            groups.setdefault(parent, set()).add(child)
+    return [
+        {"parent_name": parent, "child_names": list(children)}
+        for parent, children in sorted(groups.items(), key=lambda kv: cypher_sort_key(kv[0]))
+    ]
+
+
+def aggregate_label_combos(level_label: str, combos) -> export_level.OutgoingAggregator:
+    """
+    Generalized patterns from (source labels, rel type, target labels, count)
+    combinations, resolving each distinct label set once (same result as
+    export_level.aggregate_outgoing_on_server).
+    """
+    overrides = export_level.REL_TARGET_OVERRIDES if level_label == "Family" else {}
+    aggregator = export_level.OutgoingAggregator(level_label, keep_rows=False)
+    for src_labels, rel_type, tgt_labels, cnt in combos:
+        rel_type = rel_type.strip()
+        if not rel_type:
+            continue
+        to_level = overrides.get(rel_type) or export_level.pick_level_display(tgt_labels)
+        aggregator.add_pattern(export_level.pick_level_display(src_labels), rel_type, to_level, cnt)
+    return aggregator
+
+
+def ordered_counts(counts: Dict[str, int]) -> Dict[str, int]:
+    return dict(sorted(counts.items(), key=lambda kv: (-kv[1], kv[0])))
+
+
+class GraphSource:
+    """Requests the exporters make; see the module docstring."""
+
+    def level_rows(self, level_label: str, *, include_outgoing: bool = True) -> Dict[str, List[Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def stream_outgoing(self, level_label: str) -> export_level.OutgoingAggregator:
+        raise NotImplementedError
+
+    def aggregate_outgoing(self, level_label: str) -> export_level.OutgoingAggregator:
+        raise NotImplementedError
+
+    def label_schema(self, label: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def schema(self) -> SchemaCache:
+        """The run-wide schema cache, fetched on first use."""
+        raise NotImplementedError
+
+    def chunked_outgoing(self, level_label: str, chunk_size: int, checkpoint: Optional[str] = None, *,
+                         server_aggregate: bool = False) -> export_level.OutgoingAggregator:
+        """
+        Outgoing relationships read in checkpointed chunks (see
+        export_level.chunked_outgoing). Offline sources have no transaction
+        to keep short and read them in one pass, with the same result.
+        """
+        if server_aggregate and export_level.relationships_mode_for(level_label) == "generalized":
+            return self.aggregate_outgoing(level_label)
+        return self.stream_outgoing(level_label)
+
+    def profile_properties(self, level_label: str, scan_budget: int) -> Dict[str, Any]:
+        """Property profile of a level from at most ``scan_budget`` nodes (see property_profile.py)."""
+        raise NotImplementedError
+
+    def hierarchy(self, levels: List[str], rel_types: List[str]) -> Tuple[Iterable[tuple], Iterable[tuple]]:
+        """
+        (key, labels, Shark_Name) of nodes with a level label, (parent key,
+        child key) of ``rel_types`` edges; either may be a one-pass iterator,
+        the nodes consumed before the edges.
+        """
+        raise NotImplementedError
+
+    def statistics(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def fingerprint(self, level_label: str) -> str:
+        """
+        Cheap digest that changes when the level's export would. Offline
+        sources are loaded once and never change while open.
+        """
+        return "static:" + self.database
+
+    def hierarchy_fingerprint(self, levels: List[str]) -> str:
+        """Count-store digest of the hierarchy index inputs (hierarchy.counts_digest)."""
+        return hierarchy.counts_digest(self.statistics(), levels)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Neo4jGraphSource(GraphSource):
+    """
+    The Cypher queries of export_level.py over a neo4j driver.
+
+    Pass an open ``driver`` to share its connection pool (it is then not
+    closed here); otherwise one is opened from ``cfg``. A ``schema`` fetched
+    earlier in the run is used instead of querying it again.
+    """
+
+    def __init__(self, cfg: dict, driver=None, schema: Optional[SchemaCache] = None):
+        self.database = cfg["database"]
+        self._owns_driver = driver is None
+        if driver is None:
+            from neo4j import GraphDatabase
+
+            driver = GraphDatabase.driver(cfg["uri"], auth=(cfg["user"], cfg["password"]))
+        self.driver = driver
+        self._schema = schema
+
+    def _session(self):
+        return self.driver.session(database=self.database)
+
+    def level_rows(self, level_label, *, include_outgoing=True):
+        with self._session() as session:
+            return export_level.fetch_level_rows(
+                session, level_label, self.schema(), include_outgoing=include_outgoing
+            )
+
+    def stream_outgoing(self, level_label):
+        with self._session() as session:
+            return export_level.stream_outgoing(session, level_label)
+
+    def aggregate_outgoing(self, level_label):
+        with self._session() as session:
+            return export_level.aggregate_outgoing_on_server(session, level_label)
+
+    def chunked_outgoing(self, level_label, chunk_size, checkpoint=None, *, server_aggregate=False):
+        with self._session() as session:
+            return export_level.chunked_outgoing(
+                session, level_label, chunk_size, checkpoint, server_aggregate=server_aggregate
+            )
+
+    def label_schema(self, label):
+        with self._session() as session:
+            rec = session.run(label_schema_query(label)).single()
+        return rec.data() if rec is not None else None
+
+    def schema(self):
+        if self._schema is None:
+            with self._session() as session, tracing.span("query", "cypher", query="schema"):
+                self._schema = SchemaCache.fetch(session)
+        return self._schema
+
+    def profile_properties(self, level_label, scan_budget):
+        with self._session() as session:
+            return property_profile.profile_from_session(
+                session, export_level.sanitize_label(level_label), scan_budget
+            )
+
+    def hierarchy(self, levels, rel_types):
+        """
+        One label scan per level (a node with several level labels comes from
+        the first one only) and one relationship-type scan, streamed: the
+        records go straight into hierarchy.build_index, which reads the nodes
+        to the end before it starts the edges. The two scans are separate
+        auto-commit reads; edges whose ends were not scanned are ignored.
+        """
+        levels = [export_level.sanitize_label(lvl) for lvl in levels]
+        types = "|".join(f"`{export_level.sanitize_label(t)}`" for t in rel_types)
+        q_nodes = "\nUNION ALL\n".join(
+            f"MATCH (n:`{lvl}`)"
+            + (f" WHERE none(l IN labels(n) WHERE l IN $levels[0..{i}])" if i else "")
+            + " RETURN elementId(n) AS id, labels(n) AS labels, n.Shark_Name AS name"
+            for i, lvl in enumerate(levels)
+        )
+        q_edges = f"MATCH (p)-[:{types}]->(c) RETURN elementId(p) AS parent, elementId(c) AS child"
+
+        def nodes():
+            with self._session() as session:
+                for r in session.run(q_nodes, levels=levels):
+                    yield r["id"], r["labels"], r["name"]
+
+        def edges():
+            with self._session() as session:
+                for r in session.run(q_edges):
+                    yield r["parent"], r["child"]
+
+        return nodes(), edges()
+
+    def statistics(self):
+        with self._session() as session:
+            return collect_db_statistics(session, self.schema())
+
+    def fingerprint(self, level_label):
+        """
+        Digest of fingerprint.count_fingerprint: count-store lookups only,
+        over the relationship types of the schema fetched once per source.
+        """
+        import fingerprint
+
+        rel_types = self.schema().rel_types
+        with self._session() as session:
+            fp = fingerprint.count_fingerprint(session, level_label, rel_types)
+        return hashlib.sha256(json.dumps(fp, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def close(self):
+        if self._owns_driver:
+            self.driver.close()
+
+
+class InMemoryGraphSource(GraphSource):
+    """Node/relationship dump held in memory with label and relationship-type indexes."""
+
+    def __init__(self, database: str = "in-memory"):
+        self.database = database
+        self.node_labels: List[Tuple[str, ...]] = []
+        self.node_props: List[Dict[str, Any]] = []
+        self.rel_start: List[int] = []
+        self.rel_type: List[str] = []
+        self.rel_end: List[int] = []
+        self.by_label: Dict[str, List[int]] = {}
+        self.by_type: Dict[str, List[int]] = {}
+        self.out_rels: List[List[int]] = []
+        self.in_rels: List[List[int]] = []
+        self._label_sets: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        self._schema: Optional[SchemaCache] = None  # built on first use, once loaded
+
+    # -- loading ---------------------------------------------------------
+
+    def add_node(self, labels: Iterable[str], properties: Optional[Dict[str, Any]] = None) -> int:
+        key = tuple(labels)
+        labels_t = self._label_sets.setdefault(key, key)
+        node = len(self.node_labels)
+        self.node_labels.append(labels_t)
+        self.node_props.append(dict(properties or {}))
+        self.out_rels.append([])
+        self.in_rels.append([])
+        for lbl in labels_t:
+            self.by_label.setdefault(lbl, []).append(node)
+        return node
+
+    def add_relationship(self, start: int, rel_type: str, end: int) -> int:
+        rel = len(self.rel_type)
+        self.rel_start.append(start)
+        self.rel_type.append(rel_type)
+        self.rel_end.append(end)
+        self.by_type.setdefault(rel_type, []).append(rel)
+        self.out_rels[start].append(rel)
+        self.in_rels[end].append(rel)
+        return rel
+
+    @classmethod
+    def from_jsonl(cls, path: str, database: Optional[str] = None) -> "InMemoryGraphSource":
+        source = cls(database or str(path))
+        ids: Dict[str, int] = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                obj = json.loads(line)
+                if obj.get("type") == "node":
+                    ids[str(obj["id"])] = source.add_node(obj.get("labels") or [], obj.get("properties"))
+                elif obj.get("type") == "relationship":
+                    source.add_relationship(
+                        ids[str(obj["start"]["id"])], obj["label"], ids[str(obj["end"]["id"])]
+                    )
+        return source
+
+    # -- helpers ---------------------------------------------------------
+
+    def _name(self, node: int) -> Any:
+        return self.node_props[node].get("Shark_Name")
+
+    def _outgoing(self, level_label: str, *, ordered: bool):
+        """Rows of export_level's outgoing query: named source of the level, named target."""
+        rows = []
+        for src in self.by_label.get(level_label, []):
+            from_name = self._name(src)
+            if from_name is None:
+                continue
+            for rel in self.out_rels[src]:
+                tgt = self.rel_end[rel]
+                to_name = self._name(tgt)
+                if to_name is None:
+                    continue
+                rows.append({
+                    "from_name": from_name,
+                    "rel_type": self.rel_type[rel],
+                    "to_name": to_name,
+                    "source_labels": list(self.node_labels[src]),
+                    "target_labels": list(self.node_labels[tgt]),
+                })
+        return sort_outgoing(rows) if ordered else rows
+
+    # -- GraphSource -----------------------------------------------------
+
+    def level_rows(self, level_label, *, include_outgoing=True):
+        level_label = export_level.sanitize_label(level_label)
+        plan = export_level.level_plan(level_label)
+        nodes = self.by_label.get(level_label, [])
+
+        grouping = {lbl for n in nodes for lbl in self.node_labels[n]}
+        names = {self._name(n) for n in nodes if _is_listed_name(self._name(n))}
+
+        rows: Dict[str, List[Dict[str, Any]]] = {
+            "grouping": [{"grouping": list(grouping)}],
+            "parent_groups": [],
+        }
+        if plan["show_node_list"]:
+            rows["nodes"] = [{"node_names": list(names)}]
+        else:
+            rows["node_count"] = [{"node_count": len(names)}]
+        if include_outgoing:
+            rows["outgoing"] = self._outgoing(level_label, ordered=True)
+
+        if plan["parent_groups"]:
+            rows["parent_groups"] = parent_group_rows(
+                (self._name(self.rel_start[rel]), self._name(self.rel_end[rel]))
+                for rel in self.by_type.get(level_label, [])
+                if level_label in self.node_labels[self.rel_end[rel]]
+            )
+        return rows
+
+    def stream_outgoing(self, level_label):
+        level_label = export_level.sanitize_label(level_label)
+        detailed = export_level.relationships_mode_for(level_label) == "detailed"
+        aggregator = export_level.OutgoingAggregator(level_label, keep_rows=detailed)
+        return aggregator.extend(self._outgoing(level_label, ordered=detailed))
+
+    def aggregate_outgoing(self, level_label):
+        """Same result as the server-side aggregation: count per label-set combination, then resolve."""
+        level_label = export_level.sanitize_label(level_label)
+        combos: Counter = Counter()
+        for src in self.by_label.get(level_label, []):
+            if self._name(src) is None:
+                continue
+            for rel in self.out_rels[src]:
+                tgt = self.rel_end[rel]
+                if self._name(tgt) is None:
+                    continue
+                combos[(self.node_labels[src], self.rel_type[rel], self.node_labels[tgt])] += 1
+        return aggregate_label_combos(level_label, (key + (cnt,) for key, cnt in combos.items()))
+
+    def label_schema(self, label):
+        nodes = self.by_label.get(label, [])
+        props = {k for n in nodes for k in self.node_props[n]}
+        out_rels, in_rels = {}, {}
+        for n in nodes:
+            for rel in self.out_rels[n]:
+                labels = self.node_labels[self.rel_end[rel]]
+                out_rels[(self.rel_type[rel], labels)] = {
+                    "type": self.rel_type[rel], "direction": "OUT", "target_labels": list(labels)
+                }
+            for rel in self.in_rels[n]:
+                labels = self.node_labels[self.rel_start[rel]]
+                in_rels[(self.rel_type[rel], labels)] = {
+                    "type": self.rel_type[rel], "direction": "IN", "source_labels": list(labels)
+                }
+        return {
+            "properties": list(props),
+            "outgoing_relationships": list(out_rels.values()),
+            "incoming_relationships": list(in_rels.values()),
+        }
+
+    def schema(self):
+        if self._schema is None:
+            self._schema = SchemaCache.from_nodes(zip(self.node_labels, self.node_props), self.by_type)
+        return self._schema
+
+    def profile_properties(self, level_label, scan_budget):
+        return property_profile.profile_nodes(
+            level_label, self.by_label.get(level_label, []),
+            lambda nodes: (self.node_props[n] for n in nodes), scan_budget,
+        )
+
+    def hierarchy(self, levels, rel_types):
+        level_nodes = sorted({n for lvl in levels for n in self.by_label.get(lvl, [])})
+        nodes = [(n, self.node_labels[n], self._name(n)) for n in level_nodes]
+        edges = [
+            (self.rel_start[rel], self.rel_end[rel])
+            for t in dict.fromkeys(rel_types)
+            for rel in self.by_type.get(t, [])
+        ]
+        return nodes, edges
+
+    def statistics(self):
+        outgoing_by_label: Counter = Counter()
+        for node, rels in enumerate(self.out_rels):
+            if rels:
+                for lbl in self.node_labels[node]:
+                    outgoing_by_label[lbl] += len(rels)
+        prop_keys = {k for props in self.node_props for k in props}
+
+        return {
+            "nodes": len(self.node_labels),
+            "relationships": len(self.rel_type),
+            "labels": len(self.by_label),
+            "relationship_types": len(self.by_type),
+            "properties": len(prop_keys),
+            "nodes_by_label": ordered_counts({lbl: len(ns) for lbl, ns in self.by_label.items()}),
+            "relationships_by_type": ordered_counts({t: len(rs) for t, rs in self.by_type.items()}),
+            "outgoing_by_label": ordered_counts(dict(outgoing_by_label)),
+        }
+
+
+class SqliteGraphSource(GraphSource):
+    """SQL equivalents of the export queries over a snapshot written by snapshot.py."""
+
+    Q_GROUPING = """
+    SELECT DISTINCT l2.label
+    FROM node_labels l JOIN node_labels l2 ON l2.node_id = l.node_id
+    WHERE l.label = ?
+    """
+
+    Q_NODE_NAMES = """
+    SELECT DISTINCT n.shark_name
+    FROM node_labels l JOIN nodes n ON n.id = l.node_id
+    WHERE l.label = ? AND n.shark_name IS NOT NULL
+    """
+
+    Q_NODE_COUNT = """
+    SELECT count(DISTINCT n.shark_name)
+    FROM node_labels l JOIN nodes n ON n.id = l.node_id
+    WHERE l.label = ? AND n.shark_name IS NOT NULL AND trim(CAST(n.shark_name AS TEXT)) <> ''
+    """
+
+    Q_PROPS = """
+    SELECT DISTINCT p.key
+    FROM node_labels l JOIN nodes n ON n.id = l.node_id, json_each(n.properties) p
+    WHERE l.label = ?
+    """
+
+    Q_OUTGOING = """
+    SELECT s.shark_name, r.type, t.shark_name, s.labels, t.labels
+    FROM node_labels l
+    JOIN nodes s ON s.id = l.node_id
+    JOIN rels r ON r.start_id = l.node_id
+    JOIN nodes t ON t.id = r.end_id
+    WHERE l.label = ? AND s.shark_name IS NOT NULL AND t.shark_name IS NOT NULL
+    """
+
+    Q_PATTERNS = """
+    SELECT s.labels, r.type, t.labels, count(*)
+    FROM node_labels l
+    JOIN nodes s ON s.id = l.node_id
+    JOIN rels r ON r.start_id = l.node_id
+    JOIN nodes t ON t.id = r.end_id
+    WHERE l.label = ? AND s.shark_name IS NOT NULL AND t.shark_name IS NOT NULL
+    GROUP BY s.labels, r.type, t.labels
+    """
+
+    Q_PARENT_GROUPS = """
+    SELECT p.shark_name, c.shark_name
+    FROM rels r
+    JOIN node_labels l ON l.node_id = r.end_id AND l.label = ?
+    JOIN nodes p ON p.id = r.start_id
+    JOIN nodes c ON c.id = r.end_id
+    WHERE r.type = ?
+    """
+
+    Q_SCHEMA_OUT = """
+    SELECT DISTINCT r.type, t.labels
+    FROM node_labels l JOIN rels r ON r.start_id = l.node_id JOIN nodes t ON t.id = r.end_id
+    WHERE l.label = ?
+    """
+
+    Q_SCHEMA_IN = """
+    SELECT DISTINCT r.type, s.labels
+    FROM node_labels l JOIN rels r ON r.end_id = l.node_id JOIN nodes s ON s.id = r.start_id
+    WHERE l.label = ?
+    """
+
+    Q_LEVEL_NODE_IDS = "SELECT node_id FROM node_labels WHERE label = ? ORDER BY node_id"
+
+    Q_NODE_PROPERTIES = """
+    SELECT n.properties FROM nodes n
+    WHERE n.id IN (SELECT value FROM json_each(?))
+    ORDER BY n.id
+    """
+
+    Q_HIERARCHY_NODES = """
+    SELECT DISTINCT n.id, n.labels, n.shark_name
+    FROM node_labels l JOIN nodes n ON n.id = l.node_id
+    WHERE l.label IN (SELECT value FROM json_each(?))
+    """
+
+    Q_HIERARCHY_EDGES = """
+    SELECT r.start_id, r.end_id FROM rels r
+    WHERE r.type IN (SELECT value FROM json_each(?))
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Read-only; may be used from other threads as long as calls are serialized (card_server.py)
+        self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+        if int(meta.get("schema_version", 0)) != snapshot.SCHEMA_VERSION:
+            raise SystemExit(f"{path}: snapshot schema {meta.get('schema_version')!r}, "
+                             f"expected {snapshot.SCHEMA_VERSION}; re-run snapshot.py")
+        self.meta = meta
+        self.database = meta.get("database", path)
+        self._labels_cache: Dict[str, List[str]] = {}
+        self._schema: Optional[SchemaCache] = None
+
+    def _labels(self, encoded: str) -> List[str]:
+        labels = self._labels_cache.get(encoded)
+        if labels is None:
+            labels = self._labels_cache[encoded] = json.loads(encoded)
+        return list(labels)
+
+    def _count(self, sql: str) -> int:
+        return self.conn.execute(sql).fetchone()[0]
+
+    def _outgoing(self, level_label: str, *, ordered: bool):
+        rows = [
+            {
+                "from_name": from_name,
+                "rel_type": rel_type,
+                "to_name": to_name,
+                "source_labels": self._labels(src_labels),
+                "target_labels": self._labels(tgt_labels),
+            }
+            for from_name, rel_type, to_name, src_labels, tgt_labels
+            in self.conn.execute(self.Q_OUTGOING, (level_label,))
+        ]
+        return sort_outgoing(rows) if ordered else rows
+
+    def level_rows(self, level_label, *, include_outgoing=True):
+        level_label = export_level.sanitize_label(level_label)
+        plan = export_level.level_plan(level_label)
+        q = (level_label,)
+        rows: Dict[str, List[Dict[str, Any]]] = {
+            "grouping": [{"grouping": [r[0] for r in self.conn.execute(self.Q_GROUPING, q)]}],
+            "parent_groups": [],
+        }
+        if plan["show_node_list"]:
+            rows["nodes"] = [{"node_names": [
+                r[0] for r in self.conn.execute(self.Q_NODE_NAMES, q) if _is_listed_name(r[0])
+            ]}]
+        else:
+            rows["node_count"] = [{"node_count": self.conn.execute(self.Q_NODE_COUNT, q).fetchone()[0]}]
+        if include_outgoing:
+            rows["outgoing"] = self._outgoing(level_label, ordered=True)
+        if plan["parent_groups"]:
+            rows["parent_groups"] = parent_group_rows(
+                self.conn.execute(self.Q_PARENT_GROUPS, (level_label, level_label))
+            )
+        return rows
+
+    def stream_outgoing(self, level_label):
+        level_label = export_level.sanitize_label(level_label)
+        detailed = export_level.relationships_mode_for(level_label) == "detailed"
+        aggregator = export_level.OutgoingAggregator(level_label, keep_rows=detailed)
+        if detailed:
+            return aggregator.extend(self._outgoing(level_label, ordered=True))
+        for from_name, rel_type, to_name, src_labels, tgt_labels in self.conn.execute(
+            self.Q_OUTGOING, (level_label,)
+        ):
+            aggregator.add({
+                "from_name": from_name,
+                "rel_type": rel_type,
+                "to_name": to_name,
+                "source_labels": self._labels(src_labels),
+                "target_labels": self._labels(tgt_labels),
+            })
+        return aggregator
+
+    def aggregate_outgoing(self, level_label):
+        level_label = export_level.sanitize_label(level_label)
+        combos = (
+            (self._labels(src_labels), rel_type, self._labels(tgt_labels), cnt)
+            for src_labels, rel_type, tgt_labels, cnt in self.conn.execute(self.Q_PATTERNS, (level_label,))
+        )
+        return aggregate_label_combos(level_label, combos)
+
+    def label_schema(self, label):
+        q = (export_level.sanitize_label(label),)
+        return {
+            "properties": [r[0] for r in self.conn.execute(self.Q_PROPS, q)],
+            "outgoing_relationships": [
+                {"type": t, "direction": "OUT", "target_labels": self._labels(labels)}
+                for t, labels in self.conn.execute(self.Q_SCHEMA_OUT, q)
+            ],
+            "incoming_relationships": [
+                {"type": t, "direction": "IN", "source_labels": self._labels(labels)}
+                for t, labels in self.conn.execute(self.Q_SCHEMA_IN, q)
+            ],
+        }
+
+    def schema(self):
+        if self._schema is None:
+            self._schema = SchemaCache.from_nodes(
+                ((self._labels(labels), json.loads(props))
+                 for labels, props in self.conn.execute("SELECT labels, properties FROM nodes")),
+                [r[0] for r in self.conn.execute("SELECT DISTINCT type FROM rels")],
+            )
+        return self._schema
+
+    def profile_properties(self, level_label, scan_budget):
+        nodes = [r[0] for r in self.conn.execute(self.Q_LEVEL_NODE_IDS, (level_label,))]
+
+        def props_of(ids):
+            for (props,) in self.conn.execute(self.Q_NODE_PROPERTIES, (json.dumps(ids),)):
+                yield json.loads(props)
+
+        return property_profile.profile_nodes(level_label, nodes, props_of, scan_budget)
+
+    def hierarchy(self, levels, rel_types):
+        nodes = (
+            (node, self._labels(labels), name)
+            for node, labels, name in self.conn.execute(self.Q_HIERARCHY_NODES, (json.dumps(list(levels)),))
+        )
+        edges = self.conn.execute(self.Q_HIERARCHY_EDGES, (json.dumps(list(rel_types)),))
+        return nodes, edges
+
+    def statistics(self):
+        nodes_by_label = dict(self.conn.execute("SELECT label, count(*) FROM node_labels GROUP BY label"))
+        rels_by_type = dict(self.conn.execute("SELECT type, count(*) FROM rels GROUP BY type"))
+        outgoing_by_label = dict(self.conn.execute(
+            "SELECT l.label, count(*) FROM rels r JOIN node_labels l ON l.node_id = r.start_id GROUP BY l.label"
+        ))
+        return {
+            "nodes": self._count("SELECT count(*) FROM nodes"),
+            "relationships": self._count("SELECT count(*) FROM rels"),
+            "labels": len(nodes_by_label),
+            "relationship_types": len(rels_by_type),
+            "properties": self._count("SELECT count(DISTINCT p.key) FROM nodes n, json_each(n.properties) p"),
+            "nodes_by_label": ordered_counts(nodes_by_label),
+            "relationships_by_type": ordered_counts(rels_by_type),
+            "outgoing_by_label": ordered_counts(outgoing_by_label),
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+def open_graph_source(
+    cfg: Optional[dict] = None,
+    *,
+    dump: Optional[str] = None,
+    snapshot: Optional[str] = None,
+    driver=None,
+) -> GraphSource:
+    """
+    In-memory source for a JSONL ``dump``, SQLite source for a ``snapshot``,
+    otherwise Neo4j (sharing ``driver`` when given).
+    """
+    if dump:
+        return InMemoryGraphSource.from_jsonl(dump)
+    if snapshot:
+        return SqliteGraphSource(snapshot)
+    return Neo4jGraphSource(cfg, driver=driver)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Hierarchy rollup counts over a CSR index of the level relationships.
+
+Every node carrying a level label (levels.txt, plus the targets of
+label_rules.json ``rel_target_overrides`` such as WeaponType, placed below
+Family) is numbered in level order (Hub first, ShipInstance last; by
+Shark_Name within a level). The parent -> child edges of the hierarchy
+relationship types (the level labels themselves, label_rules.json
+``hierarchy_rel_types``: SubType, Class, Instance, ..., and the overridden
+Family types Weapon_Type and Derivative) that go *down* the level order are
+stored as compressed sparse rows:
+
+  offsets   int64[N + 1]   children of node i are children[offsets[i]:offsets[i + 1]]
+  children  int32[E]
+  parent    int32[N]       primary parent (the most specific one), -1 for roots
+  level     int16[N]       index into ``levels``
+  rollup    int32[N * L]   descendants of node i per level, row-major
+
+Because edges only go down the level order, node numbering is already a
+topological order, so the rollup is a single reverse pass adding each
+node's row into its primary parent's. A node with several parents (e.g. a
+ShipInstance under both its ShipClass and ShipSubClass) is counted once,
+under the most specific parent.
+
+The arrays are written as raw files next to the level exports
+(``export/json/hierarchy/``) and memory-mapped when loaded, so
+render_one.py and generate_diagrams.py read the index without rebuilding
+it:
+
+    python3 hierarchy.py                          # from Neo4j
+    python3 hierarchy.py --snapshot shark2.sqlite
+"""
+
+import argparse
+import json
+import mmap
+import os
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from build_cache import digest
+from label_resolver import RULES as LABEL_RULES
+
+
+INDEX_VERSION = 1
+
+# file name -> array typecode
+ARRAYS = {
+    "offsets": "q",
+    "children": "i",
+    "parent": "i",
+    "level": "h",
+    "rollup": "i",
+}
+
+
+def hierarchy_rel_types(levels: Sequence[str]) -> List[str]:
+    """
+    Relationship types linking a parent level to a child level, including the
+    Family relationships whose targets label_rules.json overrides
+    (Weapon_Type -> WeaponType, Derivative -> AirType).
+    """
+    return list(dict.fromkeys(
+        list(levels) + LABEL_RULES.hierarchy_rel_types + list(LABEL_RULES.rel_target_overrides)
+    ))
+
+
+def hierarchy_levels(levels: Sequence[str]) -> List[str]:
+    """
+    ``levels`` plus the override target levels missing from it (WeaponType
+    is not exported as a level), placed right below Family so their edges
+    go down the level order.
+    """
+    out = list(levels)
+    at = out.index("Family") + 1 if "Family" in out else len(out)
+    for target in LABEL_RULES.rel_target_overrides.values():
+        if target not in out:
+            out.insert(at, target)
+            at += 1
+    return out
+
+
+def _map_array(path: Path, typecode: str):
+    """Read-only memory-mapped view of a raw array file."""
+    if path.stat().st_size == 0:
+        return array(typecode)
+    with path.open("rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mm).cast(typecode)
+
+
+class HierarchyIndex:
+    def __init__(self, levels: Sequence[str], names: List[Any], level_starts: List[int], arrays: Dict[str, Any],
+                 content_digest: str = "", counts: str = ""):
+        self.levels = list(levels)
+        self.names = names
+        self.level_starts = list(level_starts)
+        self.offsets = arrays["offsets"]
+        self.children_ids = arrays["children"]
+        self.parent = arrays["parent"]
+        self.level = arrays["level"]
+        self.rollup_counts = arrays["rollup"]
+        self.digest = content_digest
+        self.counts = counts  # counts_digest of the graph it was built from, if known
+        self._ids: Optional[Dict[Tuple[str, Any], int]] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # -- lookups ---------------------------------------------------------
+
+    def level_range(self, level_label: str) -> range:
+        """Node ids of one level (contiguous, since nodes are numbered in level order)."""
+        if level_label not in self.levels:
+            return range(0)
+        i = self.levels.index(level_label)
+        return range(self.level_starts[i], self.level_starts[i + 1])
+
+    def find(self, level_label: str, name: Any) -> Optional[int]:
+        if self._ids is None:
+            ids = {}
+            for i, lvl in enumerate(self.levels):
+                for node in range(self.level_starts[i], self.level_starts[i + 1]):
+                    ids.setdefault((lvl, self.names[node]), node)
+            self._ids = ids
+        return self._ids.get((level_label, name))
+
+    def children(self, node: int):
+        return self.children_ids[self.offsets[node]:self.offsets[node + 1]]
+
+    def rollup(self, node: int) -> Dict[str, int]:
+        """Descendant counts of one node per level (non-zero only, own level excluded)."""
+        width = len(self.levels)
+        base = node * width
+        own = self.level[node]
+        return {
+            self.levels[j]: self.rollup_counts[base + j]
+            for j in range(own + 1, width)
+            if self.rollup_counts[base + j]
+        }
+
+    def level_totals(self, level_label: str) -> Dict[str, int]:
+        """Descendants of all nodes of one level, per level."""
+        width = len(self.levels)
+        totals = [0] * width
+        for node in self.level_range(level_label):
+            base = node * width
+            for j in range(width):
+                totals[j] += self.rollup_counts[base + j]
+        own = self.levels.index(level_label) if level_label in self.levels else -1
+        return {self.levels[j]: c for j, c in enumerate(totals) if c and j > own}
+
+    def card_rollup(self, level_label: str, node_names: Optional[Iterable[Any]]) -> Optional[Dict[str, Any]]:
+        """Template data for a card: level totals plus a row per named node that has descendants."""
+        totals = self.level_totals(level_label)
+        if not totals:
+            return None
+        rows = []
+        for name in node_names or []:
+            node = self.find(level_label, name)
+            counts = self.rollup(node) if node is not None else {}
+            if counts:
+                rows.append({"name": name, "counts": [{"level": k, "count": v} for k, v in counts.items()]})
+        return {
+            "totals": [{"level": k, "count": v} for k, v in totals.items()],
+            "rows": rows,
+        }
+
+    # -- storage ---------------------------------------------------------
+
+    def save(self, index_dir: Path) -> None:
+        """Write the arrays and metadata (meta.json last, so readers never see a partial index)."""
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        (index_dir / "meta.json").unlink(missing_ok=True)
+        arrays = {
+            "offsets": self.offsets, "children": self.children_ids, "parent": self.parent,
+            "level": self.level, "rollup": self.rollup_counts,
+        }
+        for name, typecode in ARRAYS.items():
+            data = arrays[name]
+            if not isinstance(data, array):
+                data = array(typecode, data)
+            tmp = index_dir / f"{name}.bin.tmp"
+            with tmp.open("wb") as f:
+                data.tofile(f)
+            os.replace(tmp, index_dir / f"{name}.bin")
+
+        names_text = json.dumps(self.names, default=str)
+        (index_dir / "names.json").write_text(names_text, encoding="utf-8")
+        meta = {
+            "index_version": INDEX_VERSION,
+            "byteorder": sys.byteorder,
+            "itemsizes": {name: array(tc).itemsize for name, tc in ARRAYS.items()},
+            "levels": self.levels,
+            "level_starts": self.level_starts,
+            "nodes": len(self.names),
+            "edges": len(self.children_ids),
+            "digest": self.digest,
+            "counts": self.counts,
+        }
+        tmp = index_dir / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        os.replace(tmp, index_dir / "meta.json")
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["HierarchyIndex"]:
+        """Memory-map a saved index; None if there is none (or it was written by another layout)."""
+        index_dir = Path(index_dir)
+        meta_path = index_dir / "meta.json"
+        if not meta_path.exists():
+            return None
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        itemsizes = {name: array(tc).itemsize for name, tc in ARRAYS.items()}
+        if (meta.get("index_version") != INDEX_VERSION or meta.get("byteorder") != sys.byteorder
+                or meta.get("itemsizes") != itemsizes):
+            return None
+        arrays = {name: _map_array(index_dir / f"{name}.bin", tc) for name, tc in ARRAYS.items()}
+        names = json.loads((index_dir / "names.json").read_text(encoding="utf-8"))
+        return cls(meta["levels"], names, meta["level_starts"], arrays, meta.get("digest", ""), meta.get("counts", ""))
+
+
+def build_index(nodes: Iterable[Tuple[Any, Iterable[str], Any]], edges: Iterable[Tuple[Any, Any]],
+                levels: Sequence[str]) -> HierarchyIndex:
+    """
+    Build the index from (key, labels, Shark_Name) nodes and (parent key, child key) edges.
+
+    Nodes without a level label and edges that do not go down the level
+    order are ignored.
+    """
+    levels = list(levels)
+    rank = {lbl: i for i, lbl in enumerate(levels)}
+    entries = []
+    for key, labels, name in nodes:
+        r = min((rank[lbl] for lbl in labels if lbl in rank), default=None)
+        if r is not None:
+            entries.append((r, name is None, str(name), str(key), key, name))
+    entries.sort(key=lambda e: e[:4])
+
+    n = len(entries)
+    ids = {e[4]: i for i, e in enumerate(entries)}
+    level = array("h", (e[0] for e in entries))
+    names = [e[5] for e in entries]
+    level_starts = [0] * (len(levels) + 1)
+    for r in level:
+        level_starts[r + 1] += 1
+    for i in range(len(levels)):
+        level_starts[i + 1] += level_starts[i]
+
+    pairs = set()
+    for p_key, c_key in edges:
+        p, c = ids.get(p_key), ids.get(c_key)
+        if p is not None and c is not None and level[p] < level[c]:
+            pairs.add((p, c))
+    pairs = sorted(pairs)
+
+    # CSR: pairs are sorted by parent, so the child column is already in row order.
+    offsets = array("q", [0]) * (n + 1)
+    for p, _ in pairs:
+        offsets[p + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+    children = array("i", (c for _, c in pairs))
+
+    # Primary parent: the highest-numbered (most specific level) parent.
+    parent = array("i", [-1]) * n
+    for p, c in pairs:
+        if p > parent[c]:
+            parent[c] = p
+
+    # Node ids are a topological order: one reverse pass rolls every row into its parent.
+    width = len(levels)
+    rollup = array("i", [0]) * (n * width)
+    for node in range(n):
+        rollup[node * width + level[node]] = 1
+    for node in range(n - 1, -1, -1):
+        p = parent[node]
+        if p < 0:
+            continue
+        base, pbase = node * width, p * width
+        for j in range(level[node], width):
+            cnt = rollup[base + j]
+            if cnt:
+                rollup[pbase + j] += cnt
+
+    content = digest(
+        json.dumps([levels, names], default=str),
+        offsets.tobytes(), children.tobytes(), parent.tobytes(), rollup.tobytes(),
+    )
+    arrays = {"offsets": offsets, "children": children, "parent": parent, "level": level, "rollup": rollup}
+    return HierarchyIndex(levels, names, level_starts, arrays, content)
+
+
+def counts_digest(stats: Dict[str, Any], levels: Sequence[str]) -> str:
+    """
+    Digest of the count-store numbers the index depends on: node counts of
+    the hierarchy levels and edge counts of the hierarchy relationship types
+    (from GraphSource.statistics). A move that keeps every count is missed.
+    """
+    levels = hierarchy_levels(levels)
+    nodes = stats.get("nodes_by_label") or {}
+    rels = stats.get("relationships_by_type") or {}
+    return digest(json.dumps([
+        [[lvl, nodes.get(lvl, 0)] for lvl in levels],
+        [[t, rels.get(t, 0)] for t in hierarchy_rel_types(levels)],
+    ]))
+
+
+def build_from_source(source, levels: Sequence[str]) -> HierarchyIndex:
+    """Stream the level nodes and hierarchy edges of a graph_source.GraphSource into build_index."""
+    levels = hierarchy_levels(levels)
+    nodes, edges = source.hierarchy(levels, hierarchy_rel_types(levels))
+    return build_index(nodes, edges, levels)
+
+
+def index_dir_for(json_dir: Path) -> Path:
+    return Path(json_dir) / "hierarchy"
+
+
+def load_for(json_dir: Path) -> Optional[HierarchyIndex]:
+    """The index saved next to the level exports in ``json_dir``, if any."""
+    return HierarchyIndex.load(index_dir_for(json_dir))
+
+
+def main() -> None:
+    from export_level import config_from_env
+    from graph_source import open_graph_source
+    from render_all import read_levels_file
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--levels-file", default="levels.txt")
+    ap.add_argument("--json-dir", default="export/json",
+                    help="Level export directory; the index is written to <json-dir>/hierarchy")
+    ap.add_argument("--graph-dump", default=None, help="Read a JSONL node/relationship dump instead of Neo4j")
+    ap.add_argument("--snapshot", default=None, help="Read a SQLite snapshot instead of Neo4j")
+    args = ap.parse_args()
+
+    levels = read_levels_file(Path(args.levels_file))
+    offline = args.graph_dump or args.snapshot
+    cfg = {"database": offline} if offline else config_from_env()
+    with open_graph_source(cfg, dump=args.graph_dump, snapshot=args.snapshot) as source:
+        index = build_from_source(source, levels)
+    out = index_dir_for(Path(args.json_dir))
+    index.save(out)
+    print(f"Wrote {out} ({len(index):,} nodes, {len(index.children_ids):,} edges)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,24 @@
+import argparse
 import json
-from neo4j import GraphDatabase
+
+from graph_source import open_graph_source
 
 URI = "neo4j://127.0.0.1:7687"
 AUTH = ("neo4j", "#ESX%TFV3esx5tfv")
 DB = "Shark2"
 OUTFILE = "export/json/Kind.json"
 
-QUERY = (
-    "MATCH (k:Kind) "
-    "WITH collect(DISTINCT keys(k)) AS key_lists "
-    "UNWIND key_lists AS kl "
-    "UNWIND kl AS key "
-    "WITH collect(DISTINCT key) AS all_props "
-    "CALL { "
-    "  MATCH (k:Kind)-[r]->(t) "
-    "  RETURN collect(DISTINCT { "
-    "    type: type(r), "
-    "    direction: 'OUT', "
-    "    target_labels: labels(t) "
-    "  }) AS out_rels "
-    "} "
-    "CALL { "
-    "  MATCH (s)-[r]->(k:Kind) "
-    "  RETURN collect(DISTINCT { "
-    "    type: type(r), "
-    "    direction: 'IN', "
-    "    source_labels: labels(s) "
-    "  }) AS in_rels "
-    "} "
-    "RETURN all_props AS properties, out_rels AS outgoing_relationships, in_rels AS incoming_relationships"
-)
+ap = argparse.ArgumentParser()
+ap.add_argument("--graph-dump", default=None,
+                help="Read a JSONL node/relationship dump instead of Neo4j (see graph_source.py)")
+ap.add_argument("--snapshot", default=None,
+                help="Read a local SQLite snapshot written by snapshot.py instead of Neo4j")
+args = ap.parse_args()
 
-driver = GraphDatabase.driver(URI, auth=AUTH)
-with driver.session(database=DB) as session:
-    rec = session.run(QUERY).single()
-driver.close()
+cfg = {"uri": URI, "user": AUTH[0], "password": AUTH[1], "database": DB}
+with open_graph_source(cfg, dump=args.graph_dump, snapshot=args.snapshot) as source:
+    rec = source.label_schema("Kind")
+    database = source.database
 
 if rec is None:
     raise SystemExit("No :Kind nodes found. Cannot export schema.")
@@ -59,8 +43,8 @@ incoming = sorted(incoming, key=sort_key_in)
 
 doc = {
     "label": "Kind",
-    "database": DB,
-    "connection_uri": URI,
+    "database": database,
+    "connection_uri": None if args.graph_dump or args.snapshot else URI,
     "properties": [{"name": p, "type": "string"} for p in properties],
     "relationships": {"outgoing": outgoing, "incoming": incoming},
 }
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Compiled label resolver shared by export_level.py and render_one.py.
+
+All priority tables, noise/never-collapse sets, canonical display names and
+the collapse/override rules live in label_rules.json. They are compiled into
+two resolution profiles:
+
+  export  most-specific Air label, most-specific Ship label, then
+          level_label_priority; fallback is the alphabetically first
+          non-noise label (canonicalized), else "Node".
+  render  core levels, then the Air and Ship chains (least specific first),
+          then render_secondary_priority; fallback is the alphabetically
+          first label not in never_collapse_to, else "Unknown".
+
+Every priority label gets one bit (bit order == priority order), so the
+winning priority label of a label set is the lowest set bit of its mask.
+Results are memoized per distinct label tuple and per bitmask, so resolving
+a row is one dictionary lookup after the first occurrence of its label set.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+RULES_PATH = Path(__file__).with_name("label_rules.json")
+
+
+def load_rules(path: Optional[Path] = None) -> dict:
+    return json.loads(Path(path or RULES_PATH).read_text(encoding="utf-8"))
+
+
+def _dedupe(labels: Iterable[str]) -> List[str]:
+    out: List[str] = []
+    for lbl in labels:
+        if lbl not in out:
+            out.append(lbl)
+    return out
+
+
+class LabelResolver:
+    def __init__(
+        self,
+        priority: List[str],
+        *,
+        exclude: Iterable[str] = (),
+        canonical: Optional[Dict[str, str]] = None,
+        fallback: str,
+    ):
+        self.priority = _dedupe(priority)
+        self.exclude = frozenset(exclude)
+        self.canonical = dict(canonical or {})
+        self.fallback = fallback
+
+        clash = self.exclude.intersection(self.priority)
+        if clash:
+            raise SystemExit(f"Labels cannot be both prioritized and excluded: {sorted(clash)}")
+
+        self._bits: Dict[str, int] = {lbl: 1 << i for i, lbl in enumerate(self.priority)}
+        self._by_mask: Dict[int, str] = {}
+        self._by_labels: Dict[Tuple[str, ...], str] = {}
+
+    def mask(self, labels: Iterable[str]) -> int:
+        m = 0
+        for lbl in labels:
+            m |= self._bits.get(lbl, 0)
+        return m
+
+    def _display(self, label: str) -> str:
+        return self.canonical.get(label, label)
+
+    def _compute(self, labels: Tuple[str, ...]) -> str:
+        m = self.mask(labels)
+        if m:
+            hit = self._by_mask.get(m)
+            if hit is None:
+                lowest = (m & -m).bit_length() - 1
+                hit = self._by_mask[m] = self._display(self.priority[lowest])
+            return hit
+
+        candidates = [lbl for lbl in labels if lbl not in self.exclude]
+        if candidates:
+            return self._display(min(candidates))
+        return self.fallback
+
+    def resolve(self, labels) -> str:
+        key = labels if isinstance(labels, tuple) else tuple(labels or ())
+        try:
+            return self._by_labels[key]
+        except KeyError:
+            result = self._by_labels[key] = self._compute(key)
+            return result
+
+
+class LabelRules:
+    """Typed view over label_rules.json plus the two compiled resolvers."""
+
+    def __init__(self, rules: dict):
+        self.core_levels: List[str] = list(rules["core_levels"])
+        self.air_chain: List[str] = list(rules["air_chain"])
+        self.ship_chain: List[str] = list(rules["ship_chain"])
+        self.level_label_priority: List[str] = list(rules["level_label_priority"])
+        self.render_secondary_priority: List[str] = list(rules["render_secondary_priority"])
+        self.noise_labels = set(rules["noise_labels"])
+        self.never_collapse_to = set(rules["never_collapse_to"])
+        self.canonical_display: Dict[str, str] = dict(rules["canonical_display"])
+        self.generalize_rels_levels = set(rules["generalize_rels_levels"])
+        self.rel_target_overrides: Dict[str, str] = dict(rules["rel_target_overrides"])
+        self.kind_collapse_target: Dict[str, str] = dict(rules["kind_collapse_target"])
+        self.hierarchy_rel_types: List[str] = list(rules["hierarchy_rel_types"])
+
+        # Most specific first for generalized endpoints.
+        self.air_specific_priority = list(reversed(self.air_chain))
+        self.ship_specific_priority = list(reversed(self.ship_chain))
+
+        self.export = LabelResolver(
+            self.air_specific_priority + self.ship_specific_priority + self.level_label_priority,
+            exclude=self.noise_labels,
+            canonical=self.canonical_display,
+            fallback="Node",
+        )
+        self.render = LabelResolver(
+            self.core_levels + self.air_chain + self.ship_chain + self.render_secondary_priority,
+            exclude=self.never_collapse_to,
+            fallback="Unknown",
+        )
+
+
+RULES = LabelRules(load_rules())
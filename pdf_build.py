@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Incremental PDF build from cached per-section LaTeX fragments.
+
+The assembled document is a sequence of sections (title page, diagrams
+section, one card per level). Instead of running pandoc over the whole
+document, each section's Markdown is converted to a LaTeX fragment on its
+own and cached by content hash, so only edited sections go through pandoc
+again. The fragments are \\input into one main document built from pandoc's
+standard LaTeX template, and that document is compiled with xelatex as a
+single unit, so the table of contents and page numbering stay correct.
+
+The .aux/.toc files are kept in the work directory between builds: when the
+section structure did not change, one xelatex pass is enough; a second pass
+only runs when the table of contents moved. If neither the fragments nor
+the included diagram PDFs changed, xelatex is not run at all.
+"""
+
+import shutil
+import subprocess
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from build_cache import digest, file_digest, open_cache
+
+
+PLACEHOLDER = "PANDOCFRAGMENTSPLACEHOLDER"
+
+# Same options as the one-shot pandoc build in render_all.py. graphics/tables
+# are forced on because the wrapper is generated from a placeholder document.
+PANDOC_TEMPLATE_ARGS = [
+    "-V", "header-includes=\\usepackage{graphicx}",
+    "-V", "graphics=true",
+    "-V", "tables=true",
+]
+
+MAX_LATEX_PASSES = 3
+
+
+@lru_cache(maxsize=None)
+def pandoc_version() -> str:
+    out = subprocess.run(["pandoc", "--version"], check=True, capture_output=True, text=True).stdout
+    return out.splitlines()[0] if out else ""
+
+
+def _pandoc(args: List[str], text: str) -> str:
+    return subprocess.run(
+        ["pandoc"] + args, input=text, check=True, capture_output=True, text=True
+    ).stdout
+
+
+def _tex_path(path: Path) -> str:
+    return path.resolve().as_posix()
+
+
+def build_wrapper(work_dir: Path, cache) -> Path:
+    """Standalone pandoc LaTeX document with a placeholder where the fragments go."""
+    wrapper = work_dir / "wrapper.tex"
+    args = ["-s", "-f", "markdown", "-t", "latex", "--pdf-engine=xelatex"] + PANDOC_TEMPLATE_ARGS
+    key = digest(pandoc_version(), *args)
+    if not cache.is_fresh(wrapper, key):
+        wrapper.write_text(_pandoc(args, PLACEHOLDER + "\n"), encoding="utf-8")
+        cache.record(wrapper, key)
+    return wrapper
+
+
+def build_fragments(sections: List[Tuple[str, str]], work_dir: Path, cache) -> List[Path]:
+    """Convert each section to LaTeX, reusing cached fragments whose Markdown is unchanged."""
+    frag_dir = work_dir / "fragments"
+    frag_dir.mkdir(parents=True, exist_ok=True)
+    version = pandoc_version()
+
+    paths = []
+    for name, markdown in sections:
+        # Section-local header ids, so "Properties" in every card does not collide.
+        args = ["-f", "markdown", "-t", "latex", f"--id-prefix={name}-"]
+        path = frag_dir / f"{name}.tex"
+        key = digest(version, *args, markdown)
+        if not cache.is_fresh(path, key):
+            path.write_text(_pandoc(args, markdown), encoding="utf-8")
+            cache.record(path, key)
+        paths.append(path)
+    return paths
+
+
+def write_main(wrapper: Path, fragments: List[Path], main_tex: Path) -> None:
+    inputs = "\n".join(f"\\input{{{_tex_path(p)}}}" for p in fragments)
+    lines = []
+    for line in wrapper.read_text(encoding="utf-8").splitlines():
+        lines.append(inputs if line.strip() == PLACEHOLDER else line)
+    text = "\n".join(lines) + "\n"
+    if not main_tex.exists() or main_tex.read_text(encoding="utf-8") != text:
+        main_tex.write_text(text, encoding="utf-8")
+
+
+def run_xelatex(main_tex: Path, root: Path) -> None:
+    """Compile ``main_tex`` until the table of contents is stable."""
+    work_dir = main_tex.parent
+    toc = work_dir / (main_tex.stem + ".toc")
+    for _ in range(MAX_LATEX_PASSES):
+        before = toc.read_bytes() if toc.exists() else None
+        # cwd is the repo root so relative \\includegraphics{diagrams/...} paths resolve.
+        subprocess.check_call(
+            [
+                "xelatex",
+                "-interaction=nonstopmode",
+                "-halt-on-error",
+                f"-output-directory={work_dir}",
+                str(main_tex),
+            ],
+            cwd=str(root),
+            stdout=subprocess.DEVNULL,
+        )
+        after = toc.read_bytes() if toc.exists() else None
+        if after == before:
+            return
+
+
+def build_pdf_incremental(
+    sections: List[Tuple[str, str]],
+    pdf_out: Path,
+    *,
+    root: Path,
+    work_dir: Path,
+    extra_inputs: Iterable[Path] = (),
+) -> None:
+    """
+    Build ``pdf_out`` from (name, markdown) ``sections``.
+
+    ``extra_inputs`` are files the document includes (e.g. diagram PDFs);
+    a change in any of them also triggers a LaTeX run.
+    """
+    work_dir.mkdir(parents=True, exist_ok=True)
+    cache = open_cache(work_dir, "pdf")
+
+    wrapper = build_wrapper(work_dir, cache)
+    fragments = build_fragments(sections, work_dir, cache)
+    main_tex = work_dir / "main.tex"
+    write_main(wrapper, fragments, main_tex)
+
+    built_pdf = work_dir / "main.pdf"
+    pdf_key = digest(
+        main_tex.read_bytes(),
+        *(file_digest(p) for p in fragments),
+        *(file_digest(p) for p in sorted(extra_inputs) if p.exists()),
+    )
+    if not cache.is_fresh(built_pdf, pdf_key):
+        run_xelatex(main_tex, root)
+        cache.record(built_pdf, pdf_key)
+    cache.save()
+    print(cache.summary())
+
+    shutil.copyfile(built_pdf, pdf_out)
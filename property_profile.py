@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Bounded-cost property profiles: fill rate, distinct values, type mix and
+example values per property of a level.
+
+At most ``scan_budget`` nodes of the level are read, whatever its size; on
+larger labels they are a uniform sample. Per property the profiler keeps
+
+  - a present counter (fill rate; exact when every node was read, otherwise
+    reported with a 95% Wilson interval, finite-population corrected);
+  - a HyperLogLog sketch of the values (distinct count with a fixed relative
+    error of about 1.04 / sqrt(2 ** precision); sketches merge by taking
+    register maxima, so partial profiles can be combined);
+  - a reservoir sample of ``RESERVOIR_SIZE`` values (Algorithm R) for the
+    type mix and the most common example values.
+
+Memory is fixed per property and the Neo4j query transfers at most
+``scan_budget`` property maps, so the cost per level is predictable:
+
+    python3 export_level.py --level-label AirInstance --property-profile 20000
+"""
+
+import hashlib
+import json
+import math
+import random
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import tracing
+from schema_cache import type_name, value_type
+
+
+DEFAULT_SCAN_BUDGET = 20_000
+RESERVOIR_SIZE = 512
+EXAMPLES_PER_PROPERTY = 3
+EXAMPLE_MAX_CHARS = 40
+HLL_PRECISION = 12
+
+# z for the 95% intervals reported on the card
+Z_95 = 1.96
+
+
+def value_key(value: Any) -> str:
+    """Stable encoding of a property value (type-tagged, so 1 and "1" differ)."""
+    return value_type(value) + ":" + json.dumps(value, sort_keys=True, default=str)
+
+
+class Reservoir:
+    """Uniform sample of at most ``size`` items from a stream (Algorithm R)."""
+
+    def __init__(self, size: int, rng: random.Random):
+        self.size = size
+        self.rng = rng
+        self.seen = 0
+        self.items: List[Any] = []
+
+    def add(self, item: Any) -> None:
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        slot = self.rng.randrange(self.seen)
+        if slot < self.size:
+            self.items[slot] = item
+
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch with 2 ** precision one-byte registers."""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+
+    def add(self, key: str) -> None:
+        h = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("cannot merge HyperLogLog sketches of different precision")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def estimate(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Small range: linear counting is (nearly) exact for few distinct values
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+    @property
+    def relative_error(self) -> float:
+        return hll_relative_error(self.precision)
+
+
+def hll_relative_error(precision: int) -> float:
+    """Standard error of HyperLogLog.estimate() relative to the true count."""
+    return 1.04 / math.sqrt(1 << precision)
+
+
+class PropertyStats:
+    def __init__(self, rng: random.Random, precision: int):
+        self.present = 0
+        self.sketch = HyperLogLog(precision)
+        self.values = Reservoir(RESERVOIR_SIZE, rng)
+
+    def add(self, value: Any) -> None:
+        self.present += 1
+        self.sketch.add(value_key(value))
+        self.values.add(value)
+
+
+class PropertyProfiler:
+    """
+    Profile of the property maps of one level's nodes.
+
+    ``total`` is the level's node count and ``scan_budget`` the most nodes
+    that will be fed to add(); both only affect the reported error bounds.
+    """
+
+    def __init__(self, level_label: str, total: int, scan_budget: int, *, precision: int = HLL_PRECISION):
+        self.level_label = level_label
+        self.total = total
+        self.scan_budget = scan_budget
+        self.precision = precision
+        self.scanned = 0
+        self.properties: Dict[str, PropertyStats] = {}
+        # Seeded per level: offline sources give the same profile on every run
+        self.rng = random.Random(level_label)
+
+    def add(self, props: Optional[Dict[str, Any]]) -> None:
+        self.scanned += 1
+        for name, value in (props or {}).items():
+            if value is None:
+                continue
+            stats = self.properties.get(name)
+            if stats is None:
+                stats = self.properties[name] = PropertyStats(self.rng, self.precision)
+            stats.add(value)
+
+    def extend(self, rows: Iterable[Optional[Dict[str, Any]]]) -> "PropertyProfiler":
+        for props in rows:
+            self.add(props)
+        return self
+
+    def fill_interval(self, fill_rate: float) -> Tuple[float, float]:
+        """
+        95% Wilson interval of a fill rate measured on the scanned nodes
+        (exact when all were scanned); unlike a normal-approximation margin
+        it stays informative for rates of 0% or 100% on a sample.
+        """
+        n, total = self.scanned, max(self.total, self.scanned)
+        if n == 0 or n >= total:
+            return fill_rate, fill_rate
+        z2 = Z_95 * Z_95 * (total - n) / (total - 1)
+        center = (fill_rate + z2 / (2 * n)) / (1 + z2 / n)
+        half = math.sqrt(z2 * (fill_rate * (1 - fill_rate) / n + z2 / (4 * n * n))) / (1 + z2 / n)
+        return max(0.0, center - half), min(1.0, center + half)
+
+    def profile(self) -> Dict[str, Any]:
+        sampled = self.scanned < self.total
+        rows = []
+        for name in sorted(self.properties):
+            stats = self.properties[name]
+            fill_rate = stats.present / self.scanned if self.scanned else 0.0
+            low, high = self.fill_interval(fill_rate)
+
+            kept = stats.values.items
+            types = Counter(type_name(value_type(v)) for v in kept)
+            values = Counter(value_key(v) for v in kept)
+            first = {}
+            for v in kept:
+                first.setdefault(value_key(v), v)
+            examples = [
+                _example(first[key])
+                for key, _ in sorted(values.items(), key=lambda kv: (-kv[1], kv[0]))[:EXAMPLES_PER_PROPERTY]
+            ]
+
+            rows.append({
+                "name": name,
+                "present": stats.present,
+                "fill_rate": round(fill_rate, 4),
+                "fill_rate_low": round(low, 4),
+                "fill_rate_high": round(high, 4),
+                "distinct": stats.sketch.estimate(),
+                "types": [
+                    {"type": t, "share": round(c / len(kept), 4)}
+                    for t, c in sorted(types.items(), key=lambda kv: (-kv[1], kv[0]))
+                ],
+                "type_sample": len(kept),
+                "examples": examples,
+            })
+
+        return {
+            "scanned": self.scanned,
+            "total": self.total,
+            "sampled": sampled,
+            "scan_budget": self.scan_budget,
+            "reservoir_size": RESERVOIR_SIZE,
+            # ~95% relative error of every distinct count (two standard errors)
+            "distinct_error": round(2 * hll_relative_error(self.precision), 4),
+            "properties": rows,
+        }
+
+
+def _example(value: Any) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    if len(text) > EXAMPLE_MAX_CHARS:
+        text = text[:EXAMPLE_MAX_CHARS - 1] + "…"
+    return text
+
+
+def count_query(level_label: str) -> str:
+    return f"MATCH (n:`{level_label}`) RETURN count(n) AS total"
+
+
+def sample_fraction(total: int, scan_budget: int) -> float:
+    """Probability of keeping a node so that about ``scan_budget`` of ``total`` are read."""
+    return 1.0 if total <= scan_budget else scan_budget / total
+
+
+def sample_query(level_label: str) -> str:
+    """
+    At most $limit property maps of the level. With $fraction < 1 every node
+    is kept with that probability (a uniform sample), so the LIMIT cuts off
+    only the rare overshoot rather than the tail of the label scan.
+    """
+    return f"""
+    MATCH (n:`{level_label}`)
+    WHERE $fraction >= 1.0 OR rand() < $fraction
+    RETURN properties(n) AS props
+    LIMIT $limit
+    """
+
+
+def profile_from_session(session, level_label: str, scan_budget: int) -> Dict[str, Any]:
+    """
+    Profile one level from Neo4j: a count-store lookup, then one bounded
+    streaming query. ``level_label`` must already be sanitized. The profiler
+    is made inside the transaction function, so a retry of it (execute_read
+    retries transient errors) does not feed the sample twice.
+    """
+    total = session.run(count_query(level_label)).single()["total"]
+    fraction = sample_fraction(total, scan_budget)
+
+    def consume(tx):
+        profiler = PropertyProfiler(level_label, total, scan_budget)
+        for rec in tx.run(sample_query(level_label), fraction=fraction, limit=scan_budget):
+            profiler.add(rec["props"])
+        return profiler
+
+    with tracing.span("query", "cypher", level=level_label, query="property_profile") as span:
+        profiler = session.execute_read(consume)
+        span["rows"] = profiler.scanned
+    return profiler.profile()
+
+
+def profile_nodes(level_label: str, nodes: List[Any], props_of, scan_budget: int) -> Dict[str, Any]:
+    """
+    Profile from an offline source: ``nodes`` are the level's node keys and
+    ``props_of`` maps a batch of keys to their property maps. Larger levels
+    are sampled without replacement, seeded by the level label.
+    """
+    profiler = PropertyProfiler(level_label, len(nodes), scan_budget)
+    if len(nodes) > scan_budget:
+        nodes = sorted(random.Random(level_label).sample(nodes, scan_budget))
+    return profiler.extend(props_of(nodes)).profile()
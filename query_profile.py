@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+PROFILE every export query and flag queries whose db hits outgrow the data.
+
+Each query the exporters send (export_level's per-level queries, the
+server-side pattern aggregation for generalized levels, and the label
+schema query of family_export.py / kind_export.py) is run under PROFILE.
+The report stores, per level and query: db hits, rows, page cache hits and
+misses, and the operator tree flattened to (operator, db hits, rows,
+details), together with the count-store statistics of the database it ran
+on.
+
+    python3 query_profile.py --out profile/base.json
+    python3 query_profile.py --out profile/now.json --baseline profile/base.json
+
+Against a baseline, a query is flagged when its db hits grew by more than
+``--threshold`` beyond the growth of the data it reads: the level's nodes
+plus their outgoing relationships (whole graph for queries without a
+level). A query that was linear and went quadratic shows up even when the
+whole database grew.
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from neo4j import GraphDatabase
+
+import export_level
+from db_stats import collect_db_statistics
+from graph_source import label_schema_query
+
+
+PROFILE_VERSION = 1
+
+# Labels whose schema family_export.py / kind_export.py query
+SCHEMA_LABELS = ["Family", "Kind"]
+
+
+def profile_queries(levels: List[str], rel_types: set) -> Iterator[Tuple[str, str, str, Dict[str, Any]]]:
+    """(level, query name, cypher, params) for every export query."""
+    for level in levels:
+        level = export_level.sanitize_label(level)
+        queries = export_level.build_level_queries(level)
+        for name in export_level.planned_query_keys(level):
+            if name == "parent_groups" and level not in rel_types:
+                continue  # export_level skips it too
+            yield level, name, queries[name], {}
+        if export_level.relationships_mode_for(level) == "generalized":
+            cypher, params = export_level.generalized_outgoing_query(level)
+            yield level, "outgoing_patterns", cypher, params
+    for label in SCHEMA_LABELS:
+        yield label, "label_schema", label_schema_query(label), {}
+
+
+def flatten_plan(plan: Optional[Dict[str, Any]], depth: int = 0) -> List[Dict[str, Any]]:
+    """Operator tree of a PROFILE summary -> pre-order list of operators."""
+    if not plan:
+        return []
+    args = plan.get("args") or {}
+    out = [{
+        "depth": depth,
+        "operator": str(plan.get("operatorType", "")).split("@")[0],
+        "db_hits": int(plan.get("dbHits", 0) or 0),
+        "rows": int(plan.get("rows", 0) or 0),
+        "page_cache_hits": int(plan.get("pageCacheHits", 0) or 0),
+        "page_cache_misses": int(plan.get("pageCacheMisses", 0) or 0),
+        "details": args.get("Details", ""),
+    }]
+    for child in plan.get("children") or []:
+        out.extend(flatten_plan(child, depth + 1))
+    return out
+
+
+def profile_one(session, cypher: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    summary = session.run("PROFILE " + cypher, **params).consume()
+    plan = summary.profile or {}
+    operators = flatten_plan(plan)
+    return {
+        "db_hits": sum(op["db_hits"] for op in operators),
+        "rows": int(plan.get("rows", 0) or 0),
+        "page_cache_hits": sum(op["page_cache_hits"] for op in operators),
+        "page_cache_misses": sum(op["page_cache_misses"] for op in operators),
+        "elapsed_ms": (summary.result_available_after or 0) + (summary.result_consumed_after or 0),
+        "operators": operators,
+    }
+
+
+def profile_database(session, levels: List[str], database: str) -> Dict[str, Any]:
+    """Run every export query under PROFILE; returns the report."""
+    stats = collect_db_statistics(session)
+    rel_types = {
+        r["relationshipType"] for r in session.run("CALL db.relationshipTypes() YIELD relationshipType")
+    }
+    queries = []
+    for level, name, cypher, params in profile_queries(levels, rel_types):
+        print(f"+ PROFILE {level} {name}")
+        entry = {"level": level, "query": name, "cypher": " ".join(cypher.split())}
+        entry.update(profile_one(session, cypher, params))
+        queries.append(entry)
+
+    return {
+        "profile_version": PROFILE_VERSION,
+        "generated_utc": export_level.now_utc(),
+        "database": database,
+        "statistics": stats,
+        "queries": queries,
+    }
+
+
+def data_size(stats: Dict[str, Any], level: str) -> int:
+    """Nodes of ``level`` plus their outgoing relationships; the whole graph when unknown."""
+    size = (stats.get("nodes_by_label") or {}).get(level, 0) + (stats.get("outgoing_by_label") or {}).get(level, 0)
+    return size or (stats.get("nodes", 0) + stats.get("relationships", 0))
+
+
+def hottest_operator(entry: Dict[str, Any]) -> str:
+    ops = entry.get("operators") or []
+    if not ops:
+        return ""
+    op = max(ops, key=lambda o: o["db_hits"])
+    return f"{op['operator']} ({op['db_hits']:,} hits)"
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    """Print db-hit growth against data growth per query; returns the number of flagged queries."""
+    base_queries = {(q["level"], q["query"]): q for q in baseline.get("queries", [])}
+    base_stats, now_stats = baseline.get("statistics") or {}, current.get("statistics") or {}
+
+    print(f"\nComparison with {baseline.get('generated_utc', 'baseline')} "
+          f"(flagged: db hits grew more than {threshold:.0%} beyond data growth):")
+    print(f"  {'level':<14} {'query':<18} {'base hits':>12} {'now hits':>12} {'hits x':>7} {'data x':>7}")
+    flagged = 0
+    for q in current["queries"]:
+        base = base_queries.get((q["level"], q["query"]))
+        if base is None:
+            print(f"  {q['level']:<14} {q['query']:<18} {'-':>12} {q['db_hits']:>12,}   (new)")
+            continue
+        if not base["db_hits"]:
+            continue
+        hits_ratio = q["db_hits"] / base["db_hits"]
+        base_size = data_size(base_stats, q["level"])
+        data_ratio = data_size(now_stats, q["level"]) / base_size if base_size else 1.0
+        flag = ""
+        if hits_ratio > data_ratio * (1 + threshold):
+            flagged += 1
+            flag = f"  GREW FASTER THAN DATA; hottest: {hottest_operator(q)}"
+        print(f"  {q['level']:<14} {q['query']:<18} {base['db_hits']:>12,} {q['db_hits']:>12,} "
+              f"{hits_ratio:>6.2f}x {data_ratio:>6.2f}x{flag}")
+    return flagged
+
+
+def print_report(report: Dict[str, Any], limit: int = 15) -> None:
+    print(f"\nMost expensive queries ({report['database']}):")
+    print(f"  {'level':<14} {'query':<18} {'db hits':>12} {'rows':>10} {'pc hits':>10} {'pc miss':>9}  hottest operator")
+    for q in sorted(report["queries"], key=lambda q: -q["db_hits"])[:limit]:
+        print(f"  {q['level']:<14} {q['query']:<18} {q['db_hits']:>12,} {q['rows']:>10,} "
+              f"{q['page_cache_hits']:>10,} {q['page_cache_misses']:>9,}  {hottest_operator(q)}")
+
+
+def write_report(report: Dict[str, Any], out: Path) -> None:
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"Wrote {out}")
+
+
+def run_profile(driver, cfg: dict, levels: List[str], out: Path, baseline: Optional[Path] = None,
+                threshold: float = 0.10) -> int:
+    """Profile, write the report, compare with ``baseline``; returns the number of flagged queries."""
+    with driver.session(database=cfg["database"]) as session:
+        report = profile_database(session, levels, cfg["database"])
+    write_report(report, out)
+    print_report(report)
+    if baseline is None:
+        return 0
+    return compare(json.loads(baseline.read_text(encoding="utf-8")), report, threshold)
+
+
+def main() -> None:
+    from render_all import read_levels_file
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--levels-file", default="levels.txt")
+    ap.add_argument("--levels", nargs="*", default=None)
+    ap.add_argument("--out", default="export/profile.json", help="Report to write (default: export/profile.json)")
+    ap.add_argument("--baseline", default=None, help="Earlier report to compare against")
+    ap.add_argument("--threshold", type=float, default=0.10,
+                    help="Tolerated db-hit growth beyond data growth (default: 0.10)")
+    ap.add_argument("--fail-on-regression", action="store_true",
+                    help="Exit with status 1 when a query is flagged")
+    args = ap.parse_args()
+
+    levels = args.levels or read_levels_file(Path(args.levels_file))
+    cfg = export_level.config_from_env()
+    with GraphDatabase.driver(cfg["uri"], auth=(cfg["user"], cfg["password"])) as driver:
+        flagged = run_profile(driver, cfg, levels, Path(args.out),
+                              Path(args.baseline) if args.baseline else None, args.threshold)
+    if flagged and args.fail_on_regression:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
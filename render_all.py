@@ -3,10 +3,17 @@
 import argparse
 import os
 import subprocess
+from contextlib import nullcontext
 from pathlib import Path
 
 from jinja2 import Template
-from neo4j import GraphDatabase
+
+import hierarchy
+import property_profile
+import tracing
+from build_cache import VERBOSE_ENV, BuildCache, card_digest, digest, file_digest, files_digest, open_cache
+from export_format import find_export, load_export
+from graph_source import Neo4jGraphSource, open_graph_source
 
 
 def get_neo4j_config():
@@ -20,36 +27,63 @@ def get_neo4j_config():
     return {"uri": uri, "user": user, "password": password, "database": database}
 
 
-def query_db_statistics(driver, database: str):
-    """Query Neo4j for database statistics."""
-    stats = {}
-    with driver.session(database=database) as session:
-        # Total nodes
-        result = session.run("MATCH (n) RETURN count(n) AS cnt")
-        stats["nodes"] = result.single()["cnt"]
-
-        # Total relationships
-        result = session.run("MATCH ()-[r]->() RETURN count(r) AS cnt")
-        stats["relationships"] = result.single()["cnt"]
-
-        # Total labels
-        result = session.run("CALL db.labels() YIELD label RETURN count(label) AS cnt")
-        stats["labels"] = result.single()["cnt"]
+def query_db_statistics(source):
+    """Database statistics for the title page (Neo4j: one count-store round trip, see db_stats.py)."""
+    return source.statistics()
 
-        # Total property keys
-        result = session.run("CALL db.propertyKeys() YIELD propertyKey RETURN count(propertyKey) AS cnt")
-        stats["properties"] = result.single()["cnt"]
 
-    return stats
+def format_stats(stats: dict) -> dict:
+    """Format numbers with thousands separators, including the per-label/per-type breakdowns."""
+    out = {}
+    for k, v in stats.items():
+        if isinstance(v, dict):
+            out[k] = {name: f"{n:,}" for name, n in v.items()}
+        else:
+            out[k] = f"{v:,}"
+    return out
 
 
 def render_title_template(template_path: Path, stats: dict) -> str:
     """Render the title page Jinja2 template with database stats."""
     template_content = template_path.read_text(encoding="utf-8")
     template = Template(template_content)
-    # Format numbers with thousands separator
-    formatted_stats = {k: f"{v:,}" for k, v in stats.items()}
-    return template.render(stats=formatted_stats)
+    return template.render(stats=format_stats(stats))
+
+
+def assemble_sections(templates_dir: Path, levels, rendered_files, db_stats: dict):
+    """(name, markdown) sections of the assembled document: title page, diagrams, one card per level."""
+    title_template_path = templates_dir / "title.md.j2"
+    diagrams_path = templates_dir / "diagrams.md"
+    sections = []
+    # Prepend title page (rendered from Jinja2 template)
+    if title_template_path.exists():
+        rendered_title = render_title_template(title_template_path, db_stats)
+        sections.append(("title", rendered_title.rstrip() + "\n\n"))
+    # Include diagrams section if it exists
+    if diagrams_path.exists():
+        sections.append(("diagrams", diagrams_path.read_text(encoding="utf-8").rstrip() + "\n\n"))
+    for lvl, p in zip(levels, rendered_files):
+        sections.append((lvl, p.read_text(encoding="utf-8").rstrip() + "\n\n"))
+    return sections
+
+
+def assemble_document(templates_dir: Path, levels, rendered_files, db_stats: dict, assembled_path: Path,
+                      cache_dir=None):
+    """Write the assembled markdown (skipped when no section changed); returns its sections."""
+    with tracing.span("assemble") as span:
+        sections = assemble_sections(templates_dir, levels, rendered_files, db_stats)
+        parts = [text for _, text in sections]
+
+        assembly_cache = open_cache(cache_dir, "assembly")
+        assembly_key = digest(*parts)
+        if not assembly_cache.is_fresh(assembled_path, assembly_key):
+            with assembled_path.open("w", encoding="utf-8") as out:
+                out.writelines(parts)
+            assembly_cache.record(assembled_path, assembly_key)
+            assembly_cache.save()
+            print(f"Wrote {assembled_path}")
+        span["bytes"] = assembled_path.stat().st_size
+    return sections
 
 
 def read_levels_file(path: Path):
@@ -64,7 +98,166 @@ def read_levels_file(path: Path):
 
 def run(cmd, cwd=None):
     print("+ " + " ".join(cmd))
-    subprocess.check_call(cmd, cwd=cwd)
+    name = Path(cmd[1]).name if cmd[0].startswith("python") else cmd[0]
+    with tracing.span(name, "process"):
+        subprocess.check_call(cmd, cwd=cwd)
+
+
+def export_progress(levels):
+    """Progress over the levels to export, weighted by their expected outgoing rows when known."""
+    weights = {lvl: tracing.expected_rows(lvl) or 1 for lvl in levels}
+    return tracing.progress("export", sum(weights.values()), unit="rows"), weights
+
+
+def export_levels_in_process(source, cfg, levels, json_dir: Path, stream=False, server_aggregate=False,
+                             compact=False, compress=False, profile_budget=None, chunk_size=None):
+    """Export every level inside this process from one graph source (e.g. one Neo4j connection pool)."""
+    import export_level
+
+    progress, weights = export_progress(levels)
+    for lvl in levels:
+        print(f"+ export {lvl}")
+        data = export_level.export_level(
+            cfg, lvl, stream=stream, server_aggregate=server_aggregate, source=source,
+            profile_budget=profile_budget, chunk_size=chunk_size,
+            checkpoint=str(json_dir / f"{lvl}.checkpoint") if chunk_size else None,
+        )
+        json_path = export_level.write_export(data, str(json_dir / f"{lvl}.json"),
+                                              compact=compact, compress=compress)
+        print(f"Wrote {json_path}")
+        progress.advance(weights[lvl])
+    progress.close()
+
+
+def bulk_export_in_process(driver, cfg, levels, json_dir: Path, stream=False, compact=False, compress=False,
+                           schema=None, profile_budget=None):
+    """Export every level from a single node scan and a single relationship scan."""
+    import bulk_export
+    import export_level
+
+    print("+ bulk export " + " ".join(levels))
+    docs = bulk_export.bulk_export(cfg, levels, driver=driver, stream=stream, schema=schema,
+                                   profile_budget=profile_budget)
+    for lvl in levels:
+        json_path = export_level.write_export(docs[lvl], str(json_dir / f"{lvl}.json"),
+                                              compact=compact, compress=compress)
+        print(f"Wrote {json_path}")
+
+
+def select_levels_to_build(driver, cfg, levels, json_dir: Path, out_dir: Path, incremental, export_options):
+    """
+    Levels to export and render, plus fingerprints to store afterwards.
+
+    Without --incremental every level is rebuilt and no fingerprints are kept.
+    """
+    if not incremental:
+        return list(levels), {}
+
+    import fingerprint
+
+    to_build, fingerprints = fingerprint.changed_levels(
+        driver, cfg["database"], levels, json_dir, out_dir, export_options=export_options
+    )
+    skipped = [lvl for lvl in levels if lvl not in to_build]
+    print(f"Incremental: {len(skipped)} unchanged level(s) skipped"
+          + (f" ({', '.join(skipped)})" if skipped else ""))
+    return to_build, fingerprints
+
+
+def store_fingerprints(fingerprints, levels, json_dir: Path):
+    if not fingerprints:
+        return
+
+    import fingerprint
+
+    for lvl in levels:
+        fingerprint.write_fingerprint(json_dir / f"{lvl}.json", fingerprints[lvl])
+
+
+def profile_queries(args, root: Path, driver, cfg, levels):
+    """--profile-queries report, on the run's open driver (see query_profile.py)."""
+    import query_profile
+
+    with tracing.span("profile_queries"):
+        query_profile.run_profile(
+            driver, cfg, levels, root / args.profile_queries,
+            root / args.profile_baseline if args.profile_baseline else None,
+        )
+
+
+def update_hierarchy_index(source, levels, json_dir: Path, stats: dict, *, rebuild: bool = False):
+    """
+    Rollup index saved next to the exports (see hierarchy.py).
+
+    Rebuilt from ``source`` (one node scan, one edge scan) when ``rebuild``
+    is set, when there is no saved index, or when the count-store digest of
+    the hierarchy (hierarchy.counts_digest of the ``stats``) differs from
+    the one saved with it. A move that keeps every count needs a rebuild:
+    --rebuild-hierarchy, or an --incremental run that re-exports a level.
+    """
+    counts = hierarchy.counts_digest(stats, levels)
+    index = None if rebuild else hierarchy.load_for(json_dir)
+    if index is None or index.counts != counts:
+        print("+ hierarchy index")
+        with tracing.span("hierarchy_index") as span:
+            index = hierarchy.build_from_source(source, levels)
+            index.counts = counts
+            index.save(hierarchy.index_dir_for(json_dir))
+            span["rows"] = len(index.children_ids)
+    return index
+
+
+def card_cache_key(root: Path, data: dict, hierarchy_digest: str = "") -> str:
+    """
+    Cache key for a rendered card: renderer source, label rules, card
+    templates, the card itself and the hierarchy rollup index.
+    """
+    return digest(
+        file_digest(root / "render_one.py"),
+        file_digest(root / "hierarchy.py"),
+        file_digest(root / "label_rules.json"),
+        files_digest((root / "templates").glob("*.j2")),
+        card_digest(data),
+        hierarchy_digest,
+    )
+
+
+def render_levels_in_process(levels, json_dir: Path, out_dir: Path, templates_dir: Path, cache: BuildCache,
+                             hierarchy_index=None, docs=None):
+    """
+    Render every level card inside this process with a single Jinja environment.
+
+    Output files match the render_one.py subprocess path. With a ``docs``
+    dict, exports already in it are rendered from memory and the ones loaded
+    here are added to it (--watch keeps it across rebuilds).
+    """
+    import render_one
+
+    env = render_one.make_env(templates_dir)
+    root = Path(render_one.__file__).parent
+    hierarchy_digest = hierarchy_index.digest if hierarchy_index is not None else ""
+    rendered_files = []
+    for lvl in levels:
+        json_path = json_dir / f"{lvl}.json"
+        md_path = out_dir / f"{lvl}.md"
+
+        data = docs.get(lvl) if docs is not None else None
+        if data is None:
+            with tracing.span("load_export", level=lvl) as span:
+                data = load_export(json_path)
+                span["bytes"] = find_export(json_path).stat().st_size
+            if docs is not None:
+                docs[lvl] = data
+        key = card_cache_key(root, data, hierarchy_digest)
+        if not cache.is_fresh(md_path, key):
+            # prepare_card() adds render-only keys to the card: render a copy
+            data = {**data, "card": dict(data["card"])}
+            md_path.write_text(render_one.render_card(data, env, hierarchy_index=hierarchy_index), encoding="utf-8")
+            cache.record(md_path, key)
+            print(f"Wrote {md_path}")
+
+        rendered_files.append(md_path)
+    return rendered_files
 
 
 def main():
@@ -80,12 +273,92 @@ def main():
     ap.add_argument("--assembled-md", default="ontology_cards.md",
                     help="Assembled markdown output file (default: ontology_cards.md)")
 
+    ap.add_argument("--in-process", action="store_true",
+                    help="Export and render all levels in this process over one shared Neo4j driver "
+                         "instead of spawning export_level.py / render_one.py per level")
+    export_mode = ap.add_mutually_exclusive_group()
+    export_mode.add_argument("--concurrent-export", action="store_true",
+                             help="Export all levels concurrently on the async driver, most expensive first "
+                                  "(implies --in-process)")
+    export_mode.add_argument("--bulk-export", action="store_true",
+                             help="Export all levels from one node scan and one relationship scan "
+                                  "(implies --in-process)")
+    ap.add_argument("--stream", action="store_true",
+                    help="In-process exports aggregate outgoing relationships as they arrive; "
+                         "generalized levels store outgoing_total instead of every row")
+    ap.add_argument("--server-aggregate", action="store_true",
+                    help="In-process exports of generalized levels let Neo4j collapse labels and count "
+                         "patterns, transferring only the tuples (implies --stream; not with --bulk-export)")
+    ap.add_argument("--chunk-size", type=int, default=None, metavar="NODES",
+                    help="Per-level exports read outgoing relationships in short transactions of NODES source "
+                         "nodes, checkpointed to <json-dir>/<Level>.checkpoint so a rerun resumes "
+                         "(implies --stream; not with --concurrent-export or --bulk-export)")
+    ap.add_argument("--concurrency", type=int, default=4,
+                    help="Maximum export queries in flight with --concurrent-export (default: 4)")
+    ap.add_argument("--graph-dump", default=None,
+                    help="Export from a JSONL node/relationship dump held in memory instead of Neo4j "
+                         "(see graph_source.py; implies --in-process)")
+    ap.add_argument("--snapshot", default=None,
+                    help="Export from a local SQLite snapshot written by snapshot.py instead of Neo4j "
+                         "(implies --in-process)")
+    ap.add_argument("--property-profile", type=int, nargs="?", default=None, metavar="NODES",
+                    const=property_profile.DEFAULT_SCAN_BUDGET,
+                    help="Add a Property Profile section to every card: fill rate, distinct values, type mix "
+                         "and examples from at most NODES nodes per level (default: %(const)s; "
+                         "see property_profile.py)")
+    ap.add_argument("--compact", action="store_true",
+                    help="Write level exports in the dictionary-encoded compact format (see export_format.py)")
+    ap.add_argument("--gzip", action="store_true",
+                    help="Gzip level exports (<Level>.json.gz)")
+
+    ap.add_argument("--incremental", action="store_true",
+                    help="Compare cheap per-level fingerprints with the ones stored next to the JSON "
+                         "and skip export and rendering of unchanged levels")
+    ap.add_argument("--rebuild-hierarchy", action="store_true",
+                    help="Rebuild the hierarchy rollup index even if the node and edge counts it was "
+                         "built from are unchanged (see hierarchy.py)")
+
+    ap.add_argument("--cache-dir", default=".build_cache",
+                    help="Content-addressed build cache for cards, diagrams and assembly (default: .build_cache)")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="Rebuild every card, diagram and the assembled markdown")
+    ap.add_argument("--cache-verbose", action="store_true",
+                    help="Print a cache hit or miss line for every artifact, not only the summaries")
+
+    ap.add_argument("--trace", default=None,
+                    help="Record per-stage/per-query timings, rows, bytes and peak memory (including the "
+                         "export_level.py / render_one.py / generate_diagrams.py subprocesses) into this "
+                         "Chrome trace JSON file, print a summary table and show progress/ETA lines "
+                         "for long levels (see tracing.py)")
+
+    ap.add_argument("--profile-queries", default=None, metavar="REPORT",
+                    help="After exporting, run every export query under PROFILE and write db hits, rows, "
+                         "operators and page cache stats to this JSON report (see query_profile.py)")
+    ap.add_argument("--profile-baseline", default=None,
+                    help="With --profile-queries: earlier report; flag queries whose db hits grew faster "
+                         "than the data")
+
+    ap.add_argument("--watch", action="store_true",
+                    help="After building, keep the graph source and exports in memory and rebuild only the "
+                         "cards, diagrams and assembly affected by changes to templates, levels.txt, "
+                         "label_rules.json or the JSON exports (implies --in-process; see watch.py)")
+    ap.add_argument("--watch-interval", type=float, default=0.5,
+                    help="Seconds between checks for changes with --watch (default: 0.5)")
+
     ap.add_argument("--build-pdf", action="store_true",
                     help="If set, run pandoc to build a PDF after assembly")
     ap.add_argument("--pdf-out", default="Shark2_Data_Model.pdf",
                     help="PDF output filename (default: Shark2_Data_Model.pdf)")
+    ap.add_argument("--pdf-incremental", action="store_true",
+                    help="With --build-pdf: convert title, diagrams and each card to cached LaTeX fragments "
+                         "and only re-convert the ones that changed")
+    ap.add_argument("--pdf-work-dir", default=".build_cache/pdf",
+                    help="Fragment and LaTeX work directory for --pdf-incremental (default: .build_cache/pdf)")
 
     args = ap.parse_args()
+    tracing.setup("render_all", args.trace)
+    if args.cache_verbose:
+        os.environ[VERBOSE_ENV] = "1"  # inherited by generate_diagrams.py
 
     root = Path(".").resolve()
     out_dir = root / args.out_dir
@@ -107,51 +380,183 @@ def main():
     if not levels:
         raise SystemExit("No levels provided. Add labels to levels.txt or pass --levels ...")
 
+    if args.server_aggregate and args.bulk_export:
+        raise SystemExit("--server-aggregate cannot be combined with --bulk-export")
+    if args.watch and args.build_pdf:
+        raise SystemExit("--watch rebuilds the markdown only; build the PDF in a separate run")
+    if args.chunk_size and (args.concurrent_export or args.bulk_export):
+        raise SystemExit("--chunk-size cannot be combined with --concurrent-export or --bulk-export")
+    if args.chunk_size:
+        # Chunked exports aggregate as they go; record that in the fingerprints' export options
+        args.stream = True
+
+    offline = args.graph_dump or args.snapshot
+    if args.graph_dump and args.snapshot:
+        raise SystemExit("--graph-dump and --snapshot are mutually exclusive")
+    if offline and (args.concurrent_export or args.bulk_export or args.incremental or args.profile_queries):
+        raise SystemExit("--graph-dump / --snapshot cannot be combined with --concurrent-export, "
+                         "--bulk-export, --incremental or --profile-queries")
+
     assembled_path = root / args.assembled_md
 
+    cfg = {"database": offline} if offline else get_neo4j_config()
+    rendered_files = [out_dir / f"{lvl}.md" for lvl in levels]
+    docs = {} if args.watch else None  # exports kept in memory for --watch
+
+    cache_dir = None if args.no_cache else root / args.cache_dir
+    card_cache = open_cache(cache_dir, "cards")
+    diagram_args = ["--no-cache"] if args.no_cache else ["--cache-dir", str(root / args.cache_dir)]
+    export_options = {
+        "stream": args.stream,
+        "server_aggregate": args.server_aggregate,
+        "compact": args.compact,
+        "gzip": args.gzip,
+    }
+    if args.property_profile:
+        export_options["property_profile"] = args.property_profile
+
     # Generate each level
-    rendered_files = []
-    for lvl in levels:
-        json_path = json_dir / f"{lvl}.json"
-        md_path = out_dir / f"{lvl}.md"
+    if args.in_process or args.concurrent_export or args.bulk_export or offline or args.watch:
+        opened = open_graph_source(cfg, dump=args.graph_dump, snapshot=args.snapshot)
+        # --watch keeps the source (and its driver) open for the rebuild loop
+        with (nullcontext(opened) if args.watch else opened) as source:
+            cfg = {**cfg, "database": source.database}
+            driver = getattr(source, "driver", None)
+            to_build, fingerprints = select_levels_to_build(
+                driver, cfg, levels, json_dir, out_dir, args.incremental, export_options
+            )
 
-        # 1) Export JSON
-        run(["python3", "export_level.py", "--level-label", lvl, "--out", str(json_path)], cwd=str(root))
+            # Database statistics for the title page, queried first: with --trace the
+            # outgoing counts per label are the totals of the export progress lines.
+            with tracing.span("statistics"):
+                db_stats = query_db_statistics(source)
+            tracing.set_expected_rows(db_stats.get("outgoing_by_label", {}))
+
+            # 1) Export JSON
+            with tracing.span("export"):
+                if to_build:
+                    if args.concurrent_export:
+                        import export_async
+                        export_async.export_levels_concurrently(
+                            cfg, to_build, str(json_dir), args.concurrency, args.stream, args.server_aggregate,
+                            compact=args.compact, compress=args.gzip, schema=source.schema(),
+                            profile_budget=args.property_profile,
+                        )
+                    elif args.bulk_export:
+                        bulk_export_in_process(
+                            driver, cfg, to_build, json_dir, args.stream, args.compact, args.gzip,
+                            schema=source.schema(), profile_budget=args.property_profile,
+                        )
+                    else:
+                        export_levels_in_process(
+                            source, cfg, to_build, json_dir, args.stream, args.server_aggregate,
+                            args.compact, args.gzip, args.property_profile, args.chunk_size,
+                        )
+            hierarchy_index = update_hierarchy_index(
+                source, levels, json_dir, db_stats,
+                rebuild=args.rebuild_hierarchy or (args.incremental and bool(to_build)),
+            )
 
-        # 2) Render Markdown card
-        run(["python3", "render_one.py", "--in", str(json_path), "--out", str(md_path)], cwd=str(root))
+            # 2) Render Markdown cards. Rollups span levels: every card is checked against
+            # the cache, since a re-exported level can change the rollups shown on an unchanged one.
+            with tracing.span("render_cards"):
+                render_levels_in_process(levels, json_dir, out_dir, root / "templates", card_cache,
+                                         hierarchy_index, docs)
+            store_fingerprints(fingerprints, to_build, json_dir)
+
+            # 3) Generate diagrams (requires JSON exports)
+            if (root / "generate_diagrams.py").exists():
+                import generate_diagrams
+                with tracing.span("diagrams"):
+                    generate_diagrams.main(diagram_args)
+
+            if args.profile_queries:
+                profile_queries(args, root, driver, cfg, levels)
+    else:
+        # One source (and driver) for the run's own queries; the export_level.py
+        # subprocesses open their own.
+        with Neo4jGraphSource(cfg) as source:
+            to_build, fingerprints = select_levels_to_build(
+                source.driver, cfg, levels, json_dir, out_dir, args.incremental, export_options
+            )
 
-        rendered_files.append(md_path)
+            # One schema fetch for the run, shared with the export_level.py subprocesses
+            # and the title statistics.
+            schema_path = json_dir.parent / "schema.json"
+            source.schema().save(schema_path)
+
+            with tracing.span("statistics"):
+                db_stats = query_db_statistics(source)
+
+            export_flags = ["--schema", str(schema_path)]
+            if args.stream:
+                export_flags.append("--stream")
+            if args.server_aggregate:
+                export_flags.append("--server-aggregate")
+            if args.compact:
+                export_flags.append("--compact")
+            if args.gzip:
+                export_flags.append("--gzip")
+            if args.property_profile:
+                export_flags += ["--property-profile", str(args.property_profile)]
+            if args.chunk_size:
+                export_flags += ["--chunk-size", str(args.chunk_size)]
+
+            # 1) Export JSON
+            progress, weights = export_progress(to_build)
+            for lvl in to_build:
+                json_path = json_dir / f"{lvl}.json"
+                run(["python3", "export_level.py", "--level-label", lvl, "--out", str(json_path)] + export_flags,
+                    cwd=str(root))
+                progress.advance(weights[lvl])
+            progress.close()
+
+            hierarchy_index = update_hierarchy_index(
+                source, levels, json_dir, db_stats,
+                rebuild=args.rebuild_hierarchy or (args.incremental and bool(to_build)),
+            )
+
+            # 2) Render Markdown cards (render_one.py maps the saved hierarchy index)
+            for lvl in levels:
+                json_path = json_dir / f"{lvl}.json"
+                md_path = out_dir / f"{lvl}.md"
+                key = card_cache_key(root, load_export(json_path), hierarchy_index.digest)
+                if not card_cache.is_fresh(md_path, key):
+                    run(["python3", "render_one.py", "--in", str(json_path), "--out", str(md_path)], cwd=str(root))
+                    card_cache.record(md_path, key)
+
+            store_fingerprints(fingerprints, to_build, json_dir)
 
-    # 3) Generate diagrams (requires JSON exports)
-    diagrams_script = root / "generate_diagrams.py"
-    if diagrams_script.exists():
-        run(["python3", "generate_diagrams.py"], cwd=str(root))
+            # 3) Generate diagrams (requires JSON exports)
+            diagrams_script = root / "generate_diagrams.py"
+            if diagrams_script.exists():
+                run(["python3", "generate_diagrams.py"] + diagram_args, cwd=str(root))
 
-    # 4) Query database statistics for title page
-    cfg = get_neo4j_config()
-    with GraphDatabase.driver(cfg["uri"], auth=(cfg["user"], cfg["password"])) as driver:
-        db_stats = query_db_statistics(driver, cfg["database"])
-    print(f"Database stats ({cfg['database']}): {db_stats}")
+            if args.profile_queries:
+                profile_queries(args, root, source.driver, cfg, levels)
+    totals = {k: v for k, v in db_stats.items() if not isinstance(v, dict)}
+    print(f"Database stats ({cfg['database']}): {totals}")
+
+    card_cache.save()
+    print(card_cache.summary())
 
     # 5) Assemble
-    title_template_path = root / "templates" / "title.md.j2"
-    diagrams_path = root / "templates" / "diagrams.md"
-    with assembled_path.open("w", encoding="utf-8") as out:
-        # Prepend title page (rendered from Jinja2 template)
-        if title_template_path.exists():
-            rendered_title = render_title_template(title_template_path, db_stats)
-            out.write(rendered_title.rstrip() + "\n\n")
-        # Include diagrams section if it exists
-        if diagrams_path.exists():
-            out.write(diagrams_path.read_text(encoding="utf-8").rstrip() + "\n\n")
-        for p in rendered_files:
-            out.write(p.read_text(encoding="utf-8").rstrip() + "\n\n")
-
-    print(f"Wrote {assembled_path}")
+    sections = assemble_document(root / "templates", levels, rendered_files, db_stats, assembled_path, cache_dir)
 
     # 6) Optional PDF build
-    if args.build_pdf:
+    if args.build_pdf and args.pdf_incremental:
+        import pdf_build
+        print("+ incremental pdf build")
+        with tracing.span("pdf"):
+            pdf_build.build_pdf_incremental(
+                sections,
+                root / args.pdf_out,
+                root=root,
+                work_dir=root / args.pdf_work_dir,
+                extra_inputs=sorted((root / "diagrams").glob("*.pdf")),
+            )
+        print(f"Wrote {root / args.pdf_out}")
+    elif args.build_pdf:
         run([
             "pandoc",
             str(assembled_path),
@@ -162,6 +567,13 @@ def main():
         ], cwd=str(root))
         print(f"Wrote {root / args.pdf_out}")
 
+    tracing.finish("render_all")
+
+    if args.watch:
+        import watch
+        watch.Watcher(args, root, source, cfg, levels, docs, hierarchy_index, db_stats, card_cache,
+                      diagram_args).run()
+
 
 if __name__ == "__main__":
     main()
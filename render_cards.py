@@ -1,16 +1,16 @@
-import json
 import os
 from pathlib import Path
 from jinja2 import Environment, FileSystemLoader
 
+from export_format import load_export
+
 EXPORT_DIR = Path("export/json")
 CARDS_DIR = Path("cards")
 TEMPLATE_DIR = Path("templates")
 TEMPLATE_NAME = "semantic_card.md.j2"
 
 def load_json(path: Path) -> dict:
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
+    return load_export(path)
 
 def normalize_card(card: dict) -> dict:
     # Make output deterministic even if inputs vary slightly.
@@ -22,8 +22,9 @@ def normalize_card(card: dict) -> dict:
     card["properties"] = props
 
     rel = card.get("relationships") or {}
-    incoming = rel.get("incoming") or []
-    outgoing = rel.get("outgoing") or []
+    # list(): compact exports give a lazy row view (see export_format.py)
+    incoming = list(rel.get("incoming") or [])
+    outgoing = list(rel.get("outgoing") or [])
 
     # Normalize label arrays and sort deterministically
     for r in incoming:
@@ -46,7 +47,7 @@ def main():
     env = Environment(loader=FileSystemLoader(str(TEMPLATE_DIR)), autoescape=False)
     template = env.get_template(TEMPLATE_NAME)
 
-    json_files = sorted(EXPORT_DIR.glob("*.json"))
+    json_files = sorted(EXPORT_DIR.glob("*.json")) + sorted(EXPORT_DIR.glob("*.json.gz"))
     if not json_files:
         raise SystemExit(f"No JSON files found in {EXPORT_DIR}.")
 
@@ -1,19 +1,23 @@
 #!/usr/bin/env python3
 
-import json
 import argparse
 from pathlib import Path
 from collections import defaultdict
 
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
+import hierarchy
+import tracing
+from export_format import find_export, load_export
+from label_resolver import RULES as LABEL_RULES
+
 
 # Only these levels keep Shark_Name as the displayed node identity.
-NAMED_LEVELS = {"Hub", "Category", "Kind", "Family"}
+NAMED_LEVELS = set(LABEL_RULES.core_levels)
 
 # Labels we never want to use as the collapsed display label.
 # (We do NOT validate labels; we just avoid using these for display.)
-NEVER_COLLAPSE_TO = {"SharkNode", "AirSystem", "_Bloom_Perspective_"}
+NEVER_COLLAPSE_TO = LABEL_RULES.never_collapse_to
 
 
 def sort_labels(labels):
@@ -35,54 +39,14 @@ def pick_level_label(labels):
 
     Rules:
       1) If any core level label present, return it (Hub/Category/Kind/Family).
-      2) Otherwise return first match in SECONDARY_PRIORITY.
+      2) Otherwise return first match in the Air chain, the Ship chain,
+         then render_secondary_priority (label_rules.json).
       3) Otherwise return first non-NEVER_COLLAPSE_TO label alphabetically.
       4) Fallback: 'Unknown'
-    """
-    label_set = set(labels or [])
 
-    # 1) Core levels
-    for core in ["Hub", "Category", "Kind", "Family"]:
-        if core in label_set:
-            return core
-
-    # 2) Secondary priority list (NO underscore labels, NO AirSystem)
-    SECONDARY_PRIORITY = [
-        # Air chain (preferred collapsed labels)
-        "AirType",
-        "AirSubType",
-        "AirVariant",
-        "AirSubVariant",
-        "AirModel",
-        "AirSubModel",
-        "AirInstance",
-
-        # Maritime chain (preferred collapsed labels)
-        "ShipType",
-        "ShipSubType",
-        "ShipVariant",
-        "ShipClass",
-        "ShipSubClass",
-        "ShipInstance",
-
-        # Other chains
-        "Place",
-        "Organization",
-        "Weapon",
-
-        # Common geo levels (if used in your ontology)
-        "Continent",
-        "Country",
-        "Region",
-        "City",
-    ]
-    for lab in SECONDARY_PRIORITY:
-        if lab in label_set:
-            return lab
-
-    # 3) Fallback: first label alphabetically excluding banned labels
-    candidates = sorted([l for l in label_set if l not in NEVER_COLLAPSE_TO])
-    return candidates[0] if candidates else "Unknown"
+    Resolution is memoized per distinct label set (see label_resolver).
+    """
+    return LABEL_RULES.render.resolve(labels)
 
 
 def display_node(shark_name, labels):
@@ -145,26 +109,32 @@ def aggregate_relationships(raw_rels):
     return out
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--in", dest="infile", required=True, help="Input JSON (e.g., export/json/Category.json)")
-    ap.add_argument("--out", dest="outfile", required=True, help="Output MD (e.g., cards/Category.md)")
-    ap.add_argument("--template", default="semantic_card.md.j2", help="Template filename in templates/")
-    args = ap.parse_args()
+def make_env(templates_dir="templates"):
+    """Jinja environment used for card rendering (safe to share across cards)."""
+    return Environment(
+        loader=FileSystemLoader(str(templates_dir)),
+        autoescape=select_autoescape(enabled_extensions=()),
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
 
-    in_path = Path(args.infile)
-    out_path = Path(args.outfile)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    data = json.loads(in_path.read_text(encoding="utf-8"))
-    card = data["card"]
+def prepare_card(card, level_label=None, hierarchy_index=None):
+    """
+    Apply documentation rules and relationship aggregation to a card in place.
 
-    # Documentation requirement: Shark_Name is required
-    for p in card.get("properties", []):
+    With a hierarchy.HierarchyIndex, ``card.rollup`` gets the descendant
+    counts of the level (and of every listed node).
+    """
+    # Documentation requirement: Shark_Name is required (on copies; the export document is left as loaded)
+    properties = [dict(p) for p in card.get("properties", [])]
+    for p in properties:
         if p.get("name") == "Shark_Name":
             p["required"] = True
             if p.get("type") in (None, "", "unknown"):
                 p["type"] = "string"
+    if "properties" in card:
+        card["properties"] = properties
 
     # Aggregate relationships for rendering
     rels = card.get("relationships", {})
@@ -173,20 +143,46 @@ def main():
         "outgoing": aggregate_relationships(rels.get("outgoing", [])),
     }
 
-    env = Environment(
-        loader=FileSystemLoader("templates"),
-        autoescape=select_autoescape(enabled_extensions=()),
-        trim_blocks=True,
-        lstrip_blocks=True,
-    )
-    template = env.get_template(args.template)
-    rendered = template.render(card=card)
+    if hierarchy_index is not None and level_label:
+        names = card.get("node_names") if card.get("show_node_list") else None
+        card["rollup"] = hierarchy_index.card_rollup(level_label, names)
+    return card
+
+
+def render_card(data, env, template_name="semantic_card.md.j2", hierarchy_index=None):
+    """Render an exported level document to Markdown."""
+    level_label = data.get("level_label")
+    with tracing.span("prepare_card", level=level_label or ""):
+        card = prepare_card(data["card"], level_label, hierarchy_index)
+    with tracing.span("jinja", level=level_label or "") as span:
+        template = env.get_template(template_name)
+        text = template.render(card=card)
+        span["bytes"] = len(text.encode("utf-8"))
+    return text
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="infile", required=True, help="Input JSON, plain or compact, optionally .gz (e.g., export/json/Category.json)")
+    ap.add_argument("--out", dest="outfile", required=True, help="Output MD (e.g., cards/Category.md)")
+    ap.add_argument("--template", default="semantic_card.md.j2", help="Template filename in templates/")
+    ap.add_argument("--trace", default=None, help="Write a Chrome trace here (see tracing.py)")
+    args = ap.parse_args()
+    tracing.setup("render_one", args.trace)
+
+    in_path = Path(args.infile)
+    out_path = Path(args.outfile)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with tracing.span("load_export", level=in_path.name.split(".")[0]) as span:
+        span["bytes"] = find_export(in_path).stat().st_size
+        data = load_export(in_path)
+    rendered = render_card(data, make_env("templates"), args.template, hierarchy.load_for(in_path.parent))
 
     out_path.write_text(rendered, encoding="utf-8")
     print(f"Wrote {out_path}")
+    tracing.finish("render_one")
 
 
 if __name__ == "__main__":
     main()
-
-
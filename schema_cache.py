@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Run-wide schema metadata: labels, relationship types and typed node properties.
+
+``db.labels()``, ``db.relationshipTypes()``, ``db.propertyKeys()`` and
+``db.schema.nodeTypeProperties()`` are called once per run, in one round
+trip. Every level then takes its property names, types and required flags
+from the cached node-type rows instead of scanning ``keys(n)`` over all of
+its nodes; relationship-type checks are set lookups and the title-page
+statistics reuse the token counts.
+
+render_all.py shares one cache with every level it exports (in process) or
+saves it next to the exports for the export_level.py subprocesses:
+
+    python3 export_level.py --level-label Kind --schema export/schema.json
+
+The offline graph sources build the same rows from their data
+(SchemaCache.from_nodes), typing values the way Neo4j reports them.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+SCHEMA_QUERY = """
+CALL { CALL db.labels() YIELD label RETURN collect(label) AS labels }
+CALL { CALL db.relationshipTypes() YIELD relationshipType RETURN collect(relationshipType) AS types }
+CALL { CALL db.propertyKeys() YIELD propertyKey RETURN count(propertyKey) AS property_keys }
+CALL {
+  CALL db.schema.nodeTypeProperties() YIELD nodeLabels, propertyName, propertyTypes, mandatory
+  RETURN collect({labels: nodeLabels, property: propertyName, types: propertyTypes, mandatory: mandatory})
+    AS node_properties
+}
+RETURN labels, types, property_keys, node_properties
+"""
+
+# Neo4j property type names -> names shown on the cards ("StringArray" -> "list<string>")
+TYPE_NAMES = {
+    "String": "string",
+    "Long": "integer",
+    "Double": "float",
+    "Boolean": "boolean",
+}
+
+
+def type_name(neo4j_type: str) -> str:
+    if neo4j_type.endswith("Array"):
+        return f"list<{type_name(neo4j_type[:-len('Array')])}>"
+    return TYPE_NAMES.get(neo4j_type, neo4j_type.lower())
+
+
+def value_type(value: Any) -> str:
+    """Neo4j type name of a property value read from a dump or snapshot."""
+    if isinstance(value, bool):
+        return "Boolean"
+    if isinstance(value, int):
+        return "Long"
+    if isinstance(value, float):
+        return "Double"
+    if isinstance(value, str):
+        return "String"
+    if isinstance(value, list):
+        return (value_type(value[0]) if value else "String") + "Array"
+    if isinstance(value, dict):
+        return "Map"
+    return type(value).__name__
+
+
+class SchemaCache:
+    def __init__(self, labels: Iterable[str], rel_types: Iterable[str], node_properties: List[Dict[str, Any]],
+                 property_keys: int = 0):
+        self.labels = sorted(labels)
+        self.rel_types = sorted(rel_types)
+        self.node_properties = list(node_properties)
+        self.property_keys = property_keys
+        self._rel_types = set(self.rel_types)
+        self._levels: Dict[str, List[Dict[str, Any]]] = {}
+
+    @classmethod
+    def fetch(cls, session) -> "SchemaCache":
+        rec = session.run(SCHEMA_QUERY).single()
+        return cls(rec["labels"] or [], rec["types"] or [], rec["node_properties"] or [], rec["property_keys"] or 0)
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[Tuple[Iterable[str], Dict[str, Any]]], rel_types: Iterable[str]) -> "SchemaCache":
+        """Same rows as db.schema.nodeTypeProperties() from (labels, properties) of every node."""
+        node_types: Dict[Tuple[str, ...], Tuple[int, Dict[str, Tuple[set, int]]]] = {}
+        for labels, props in nodes:
+            key = tuple(sorted(labels))
+            count, seen = node_types.get(key, (0, {}))
+            for name, value in (props or {}).items():
+                types, present = seen.get(name, (set(), 0))
+                types.add(value_type(value))
+                seen[name] = (types, present + 1)
+            node_types[key] = (count + 1, seen)
+
+        rows = []
+        for key, (count, seen) in node_types.items():
+            if not seen:
+                rows.append({"labels": list(key), "property": None, "types": None, "mandatory": False})
+            for name, (types, present) in seen.items():
+                rows.append({"labels": list(key), "property": name, "types": sorted(types),
+                             "mandatory": present == count})
+        labels = {lbl for key in node_types for lbl in key}
+        property_keys = len({row["property"] for row in rows if row["property"] is not None})
+        return cls(labels, rel_types, rows, property_keys)
+
+    # -- lookups ---------------------------------------------------------
+
+    def has_rel_type(self, rel_type: str) -> bool:
+        return rel_type in self._rel_types
+
+    def level_properties(self, label: str) -> List[Dict[str, Any]]:
+        """
+        Card properties of one label: name, type and whether every node with
+        the label has it (mandatory in every node type carrying the label).
+        """
+        cached = self._levels.get(label)
+        if cached is not None:
+            return [dict(p) for p in cached]
+
+        node_types: Dict[Tuple[str, ...], Dict[str, Dict[str, Any]]] = {}
+        for row in self.node_properties:
+            key = tuple(sorted(row.get("labels") or []))
+            if label not in key:
+                continue
+            props = node_types.setdefault(key, {})
+            if row.get("property") is not None:
+                props[row["property"]] = row
+
+        names = sorted({name for props in node_types.values() for name in props})
+        out = []
+        for name in names:
+            types = sorted({t for props in node_types.values() if name in props for t in props[name].get("types") or []})
+            out.append({
+                "name": name,
+                "type": " | ".join(type_name(t) for t in types) or "unknown",
+                "required": all(name in props and props[name].get("mandatory") for props in node_types.values()),
+            })
+        self._levels[label] = out
+        return [dict(p) for p in out]
+
+    def token_counts(self) -> Dict[str, int]:
+        """Totals of the title-page statistics that come from the token lists."""
+        return {
+            "labels": len(self.labels),
+            "relationship_types": len(self.rel_types),
+            "properties": self.property_keys,
+        }
+
+    # -- storage ---------------------------------------------------------
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "labels": self.labels,
+            "relationship_types": self.rel_types,
+            "property_keys": self.property_keys,
+            "node_properties": self.node_properties,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SchemaCache":
+        return cls(data["labels"], data["relationship_types"], data["node_properties"], data.get("property_keys", 0))
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), default=str), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["SchemaCache"]:
+        path = Path(path)
+        if not path.exists():
+            return None
+        return cls.from_dict(json.loads(path.read_text(encoding="utf-8")))
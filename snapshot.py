@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Copy the graph into a local, indexed SQLite snapshot.
+
+One bulk read from Neo4j (all nodes, then all relationships, inside a single
+read transaction so both scans see the same graph) is written to SQLite.
+Any number of exports can then run offline and repeatably against the file
+with graph_source.SqliteGraphSource:
+
+    python3 snapshot.py --out shark2.sqlite
+    python3 render_all.py --snapshot shark2.sqlite
+    python3 export_level.py --level-label Kind --snapshot shark2.sqlite
+
+A JSONL dump (see graph_source.py) can be converted as well:
+
+    python3 snapshot.py --out synthetic.sqlite --from-dump synthetic.jsonl
+
+Layout: ``nodes`` (labels and properties as JSON, Shark_Name as its own
+indexed column), ``node_labels`` (one row per node and label, indexed by
+label), ``rels`` (indexed by type, start and end) and ``meta``.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, Tuple
+
+from export_level import config_from_env, now_utc
+
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE nodes (
+  id INTEGER PRIMARY KEY,
+  shark_name,
+  labels TEXT NOT NULL,
+  properties TEXT NOT NULL
+);
+CREATE TABLE node_labels (
+  node_id INTEGER NOT NULL,
+  label TEXT NOT NULL,
+  PRIMARY KEY (node_id, label)
+) WITHOUT ROWID;
+CREATE TABLE rels (
+  id INTEGER PRIMARY KEY,
+  start_id INTEGER NOT NULL,
+  type TEXT NOT NULL,
+  end_id INTEGER NOT NULL
+);
+"""
+
+# Created after the bulk insert (faster than maintaining them row by row).
+INDEXES = """
+CREATE INDEX node_labels_by_label ON node_labels (label, node_id);
+CREATE INDEX nodes_by_shark_name ON nodes (shark_name);
+CREATE INDEX rels_by_type ON rels (type, start_id, end_id);
+CREATE INDEX rels_by_start ON rels (start_id);
+CREATE INDEX rels_by_end ON rels (end_id);
+"""
+
+Q_SNAPSHOT_NODES = "MATCH (n) RETURN elementId(n) AS id, labels(n) AS labels, properties(n) AS props"
+Q_SNAPSHOT_RELS = "MATCH (a)-[r]->(b) RETURN elementId(a) AS start, type(r) AS type, elementId(b) AS end"
+
+BATCH_SIZE = 10_000
+
+
+def _scalar(value: Any) -> Any:
+    # Shark_Name is a scalar in practice; anything else is stored by its string form.
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return str(value)
+
+
+class SnapshotWriter:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.ids: Dict[str, int] = {}
+        self._nodes = []
+        self._labels = []
+        self._rels = []
+        self.node_count = 0
+        self.rel_count = 0
+
+    def add_node(self, key: str, labels: Iterable[str], props: Dict[str, Any]) -> None:
+        node = self.ids[str(key)] = len(self.ids)
+        labels = list(labels or [])
+        props = dict(props or {})
+        self._nodes.append(
+            (node, _scalar(props.get("Shark_Name")), json.dumps(labels), json.dumps(props, default=str))
+        )
+        self._labels.extend((node, lbl) for lbl in set(labels))
+        self.node_count += 1
+        if len(self._nodes) >= BATCH_SIZE:
+            self.flush()
+
+    def add_relationship(self, start: str, rel_type: str, end: str) -> None:
+        self._rels.append((self.rel_count, self.ids[str(start)], rel_type, self.ids[str(end)]))
+        self.rel_count += 1
+        if len(self._rels) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        self.conn.executemany("INSERT INTO nodes VALUES (?, ?, ?, ?)", self._nodes)
+        self.conn.executemany("INSERT INTO node_labels VALUES (?, ?)", self._labels)
+        self.conn.executemany("INSERT INTO rels VALUES (?, ?, ?, ?)", self._rels)
+        self._nodes, self._labels, self._rels = [], [], []
+
+
+def read_neo4j(writer: SnapshotWriter, cfg: dict) -> None:
+    """
+    Both scans in one explicit read transaction. Not execute_read: the
+    writer flushes batches into SQLite as records arrive, and a retried
+    transaction function would insert them again. A failed scan raises and
+    write_snapshot leaves no snapshot behind.
+    """
+    from neo4j import READ_ACCESS, GraphDatabase
+
+    with GraphDatabase.driver(cfg["uri"], auth=(cfg["user"], cfg["password"])) as driver:
+        with driver.session(database=cfg["database"], default_access_mode=READ_ACCESS) as session:
+            with session.begin_transaction() as tx:
+                for rec in tx.run(Q_SNAPSHOT_NODES):
+                    writer.add_node(rec["id"], rec["labels"], rec["props"])
+                for rec in tx.run(Q_SNAPSHOT_RELS):
+                    writer.add_relationship(rec["start"], rec["type"], rec["end"])
+
+
+def read_dump(writer: SnapshotWriter, path: str) -> None:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            if obj.get("type") == "node":
+                writer.add_node(obj["id"], obj.get("labels"), obj.get("properties"))
+            elif obj.get("type") == "relationship":
+                writer.add_relationship(obj["start"]["id"], obj["label"], obj["end"]["id"])
+
+
+def write_snapshot(out_path: str, *, cfg: dict = None, dump: str = None) -> Tuple[int, int]:
+    """Write the snapshot to ``out_path`` (atomically replaced); returns (nodes, relationships)."""
+    tmp_path = out_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;")
+        conn.executescript(SCHEMA)
+        writer = SnapshotWriter(conn)
+        if dump:
+            read_dump(writer, dump)
+        else:
+            read_neo4j(writer, cfg)
+        writer.flush()
+        conn.executescript(INDEXES)
+        meta = {
+            "schema_version": SCHEMA_VERSION,
+            "created_utc": now_utc(),
+            "database": cfg["database"] if cfg else os.path.basename(dump),
+            "source": cfg["uri"] if cfg else dump,
+            "nodes": writer.node_count,
+            "relationships": writer.rel_count,
+        }
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [(k, str(v)) for k, v in meta.items()])
+        conn.commit()
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, out_path)
+    return writer.node_count, writer.rel_count
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", required=True, help="SQLite snapshot to write")
+    ap.add_argument("--from-dump", default=None,
+                    help="Convert a JSONL node/relationship dump instead of reading Neo4j")
+    args = ap.parse_args()
+
+    cfg = None if args.from_dump else config_from_env()
+    nodes, rels = write_snapshot(args.out, cfg=cfg, dump=args.from_dump)
+    print(f"Wrote {args.out} ({nodes:,} nodes, {rels:,} relationships)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Synthetic ontology graphs with the shape of the Shark2 database.
+
+Hub -> Category -> Kind -> Family at the top, the Air chain (AirType ...
+AirSubModel -> AirInstance) and the Ship chain (ShipType -> ShipSubType ->
+ShipClass -> ShipSubClass -> ShipInstance) below the families, Nation links
+from kinds and instances to countries, WeaponType / Derivative targets for
+the Family-level overrides, and the usual noise labels (SharkNode, Object,
+AirSystem, ...). The upper levels have a fixed size; everything below the
+families grows linearly with ``scale``, so scale 10 is roughly a ten times
+larger database.
+
+The graph can be fed to the exporter directly (node_records /
+relationship_records match bulk_export's Q_NODES / Q_RELATIONSHIPS rows) or
+dumped as APOC-style JSONL:
+
+    python3 synthetic_ontology.py --scale 10 --out synthetic_10x.jsonl
+"""
+
+import argparse
+import json
+import random
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+CATEGORY_KINDS = {
+    "Aircraft": ["Fixed Wing", "Rotary Wing", "Unmanned Aircraft", "Lighter Than Air"],
+    "Ship": ["Surface Combatant", "Submarine", "Amphibious Ship", "Auxiliary Ship"],
+    "Weapon": ["Missile", "Gun", "Torpedo", "Bomb"],
+    "Organization": ["Armed Forces", "Company", "Agency"],
+    "Place": ["Africa", "Asia", "Europe", "North America", "Oceania", "South America"],
+}
+
+FAMILIES_PER_KIND = 6
+COUNTRIES = 60
+COMPANIES = 40
+NATION_LINKS_PER_KIND = 3
+OPTIONAL_PROPERTIES = ["Description", "Country_Code", "Year", "Role", "Status"]
+UNNAMED_INSTANCE_RATE = 0.01
+
+AIR_CHAIN = [
+    ("AirType", None),
+    ("AirSubType", "SubType"),
+    ("AirVariant", "Variant"),
+    ("AirSubVariant", "SubVariant"),
+    ("AirModel", "Model"),
+    ("AirSubModel", "SubModel"),
+]
+
+
+class SyntheticGraph:
+    def __init__(self):
+        self.node_labels: List[Tuple[str, ...]] = []
+        self.node_props: List[Dict[str, Any]] = []
+        self.rels: List[Tuple[int, str, int]] = []
+        self._label_sets: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+    def add_node(self, labels: List[str], name: Optional[str], **props) -> int:
+        key = tuple(labels)
+        labels_t = self._label_sets.setdefault(key, key)  # share one tuple per label set
+        if name is not None:
+            props = dict(Shark_Name=name, **props)
+        self.node_labels.append(labels_t)
+        self.node_props.append(props)
+        return len(self.node_labels) - 1
+
+    def add_rel(self, start: int, rel_type: str, end: int) -> None:
+        self.rels.append((start, rel_type, end))
+
+    def name(self, node: int) -> Any:
+        return self.node_props[node].get("Shark_Name")
+
+    def node_records(self) -> Iterator[Tuple[List[str], Any]]:
+        """(labels, Shark_Name) per node, like bulk_export.Q_NODES."""
+        for labels, props in zip(self.node_labels, self.node_props):
+            yield list(labels), props.get("Shark_Name")
+
+    def relationship_records(self) -> Iterator[Tuple[Any, str, Any, List[str], List[str]]]:
+        """(from_name, rel_type, to_name, source_labels, target_labels), like bulk_export.Q_RELATIONSHIPS."""
+        for start, rel_type, end in self.rels:
+            yield (
+                self.name(start), rel_type, self.name(end),
+                list(self.node_labels[start]), list(self.node_labels[end]),
+            )
+
+    def statistics(self) -> Dict[str, Any]:
+        """Same keys as db_stats.collect_db_statistics()."""
+        nodes_by_label: Counter = Counter()
+        prop_keys = set()
+        for labels, props in zip(self.node_labels, self.node_props):
+            nodes_by_label.update(labels)
+            prop_keys.update(props)
+        rels_by_type: Counter = Counter()
+        outgoing_by_label: Counter = Counter()
+        for start, rel_type, _ in self.rels:
+            rels_by_type[rel_type] += 1
+            outgoing_by_label.update(self.node_labels[start])
+
+        def ordered(c: Counter) -> Dict[str, int]:
+            return dict(sorted(c.items(), key=lambda kv: (-kv[1], kv[0])))
+
+        return {
+            "nodes": len(self.node_labels),
+            "relationships": len(self.rels),
+            "labels": len(nodes_by_label),
+            "relationship_types": len(rels_by_type),
+            "properties": len(prop_keys),
+            "nodes_by_label": ordered(nodes_by_label),
+            "relationships_by_type": ordered(rels_by_type),
+            "outgoing_by_label": ordered(outgoing_by_label),
+        }
+
+    def write_jsonl(self, path: str) -> None:
+        """APOC-style JSONL dump (apoc.export.json.all format)."""
+        with open(path, "w", encoding="utf-8") as f:
+            for i, (labels, props) in enumerate(zip(self.node_labels, self.node_props)):
+                f.write(json.dumps(
+                    {"type": "node", "id": str(i), "labels": list(labels), "properties": props}
+                ) + "\n")
+            for i, (start, rel_type, end) in enumerate(self.rels):
+                f.write(json.dumps({
+                    "type": "relationship",
+                    "id": str(i),
+                    "label": rel_type,
+                    "properties": {},
+                    "start": {"id": str(start), "labels": list(self.node_labels[start])},
+                    "end": {"id": str(end), "labels": list(self.node_labels[end])},
+                }) + "\n")
+
+
+def _extra_props(rng: random.Random) -> Dict[str, Any]:
+    return {k: f"{k} {rng.randrange(1000)}" for k in OPTIONAL_PROPERTIES if rng.random() < 0.3}
+
+
+def generate(scale: int = 1, seed: int = 0) -> SyntheticGraph:
+    """Build a synthetic ontology; levels below Family grow linearly with ``scale``."""
+    rng = random.Random(seed)
+    g = SyntheticGraph()
+
+    def instance(parent: int, labels: List[str], name: str) -> int:
+        unnamed = rng.random() < UNNAMED_INSTANCE_RATE
+        node = g.add_node(labels, None if unnamed else name, **_extra_props(rng))
+        g.add_rel(parent, "Instance", node)
+        g.add_rel(node, "Nation", rng.choice(countries))
+        return node
+
+    hub = g.add_node(["Hub", "SharkNode"], "Shark")
+
+    kinds: Dict[str, List[int]] = {}
+    for cat_name, kind_names in CATEGORY_KINDS.items():
+        cat = g.add_node(["Category", "SharkNode"], cat_name)
+        g.add_rel(hub, "Category", cat)
+        kinds[cat_name] = []
+        for kind_name in kind_names:
+            kind = g.add_node(["Kind", "SharkNode"], kind_name)
+            g.add_rel(cat, "Kind", kind)
+            kinds[cat_name].append(kind)
+
+    countries = []
+    for i in range(COUNTRIES):
+        country = g.add_node(["Country", "Place", "SharkNode"], f"Country {i:03d}", Country_Code=f"C{i:03d}")
+        g.add_rel(rng.choice(kinds["Place"]), "Country", country)
+        countries.append(country)
+
+    companies = [
+        g.add_node(["Company", "Manufacturer", "Organization", "SharkNode"], f"Company {i:03d}")
+        for i in range(COMPANIES)
+    ]
+    for company in companies:
+        g.add_rel(company, "Nation", rng.choice(countries))
+
+    families: Dict[str, List[int]] = {}
+    for cat_name, cat_kinds in kinds.items():
+        families[cat_name] = []
+        for kind in cat_kinds:
+            for country in rng.sample(countries, NATION_LINKS_PER_KIND):
+                g.add_rel(kind, "Nation", country)
+            if cat_name == "Place":
+                continue
+            for f in range(FAMILIES_PER_KIND):
+                family = g.add_node(["Family", "SharkNode"], f"{g.name(kind)} Family {f}", **_extra_props(rng))
+                g.add_rel(kind, "Family", family)
+                families[cat_name].append(family)
+
+    weapon_types = []
+    for family in families["Weapon"]:
+        for w in range(scale * 2):
+            wt = g.add_node(["WeaponType", "Weapon", "SharkNode"], f"{g.name(family)} W{w}", **_extra_props(rng))
+            g.add_rel(family, "Weapon_Type", wt)
+            weapon_types.append(wt)
+
+    # Air chain: one AirType per Aircraft family and scale step, 1-2 children per step.
+    for family in families["Aircraft"]:
+        for t in range(scale):
+            level_nodes = []
+            air_type = g.add_node(
+                ["AirType", "AirSystem", "AirVehicle", "SharkNode"], f"{g.name(family)} T{t}", **_extra_props(rng)
+            )
+            g.add_rel(family, "AirType", air_type)
+            g.add_rel(family, "Derivative", air_type)
+            g.add_rel(air_type, "Manufacturer", rng.choice(companies))
+            if weapon_types and rng.random() < 0.5:
+                g.add_rel(air_type, "Weapon", rng.choice(weapon_types))
+            level_nodes.append([air_type])
+
+            for label, rel_type in AIR_CHAIN[1:]:
+                children = []
+                for parent in level_nodes[-1]:
+                    for c in range(rng.randint(1, 2)):
+                        child = g.add_node(
+                            [label, "AirSystem", "AirVehicle", "SharkNode"], f"{g.name(parent)}.{c}",
+                            **_extra_props(rng)
+                        )
+                        g.add_rel(parent, rel_type, child)
+                        children.append(child)
+                level_nodes.append(children)
+
+            for depth, nodes in enumerate(level_nodes):
+                leaf = depth == len(level_nodes) - 1
+                for parent in nodes:
+                    for i in range(3 if leaf else rng.randint(0, 1)):
+                        instance(parent, ["AirInstance", "AirVehicle", "Object", "SharkNode"],
+                                 f"{g.name(parent)} #{i}")
+
+    # Ship chain: ShipType -> ShipSubType, both -> ShipClass -> ShipSubClass, classes -> instances.
+    for family in families["Ship"]:
+        for t in range(scale):
+            ship_type = g.add_node(["ShipType", "SeaVessel", "SharkNode"], f"{g.name(family)} T{t}",
+                                   **_extra_props(rng))
+            g.add_rel(family, "ShipType", ship_type)
+            g.add_rel(ship_type, "Manufacturer", rng.choice(companies))
+            parents = [ship_type]
+            for s in range(2):
+                sub = g.add_node(["ShipSubType", "SeaVessel", "SharkNode"], f"{g.name(ship_type)}.{s}",
+                                 **_extra_props(rng))
+                g.add_rel(ship_type, "SubType", sub)
+                parents.append(sub)
+            for parent in parents:
+                for c in range(2):
+                    ship_class = g.add_node(["ShipClass", "SeaVessel", "SharkNode"], f"{g.name(parent)} C{c}",
+                                            **_extra_props(rng))
+                    g.add_rel(parent, "Class", ship_class)
+                    holders = [ship_class]
+                    if rng.random() < 0.5:
+                        sub_class = g.add_node(["ShipSubClass", "SeaVessel", "SharkNode"],
+                                               f"{g.name(ship_class)}.1", **_extra_props(rng))
+                        g.add_rel(ship_class, "SubClass", sub_class)
+                        holders.append(sub_class)
+                    for holder in holders:
+                        for i in range(3):
+                            instance(holder, ["ShipInstance", "SeaVessel", "Object", "SharkNode"],
+                                     f"{g.name(holder)} #{i}")
+
+    for family in families["Organization"]:
+        for i in range(scale):
+            org = g.add_node(["ArmedForces", "Organization", "SharkNode"], f"{g.name(family)} Unit {i}")
+            g.add_rel(family, "Unit", org)
+            g.add_rel(org, "Nation", rng.choice(countries))
+
+    return g
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scale", type=int, default=1, help="Size multiplier for levels below Family (default: 1)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", required=True, help="JSONL output path")
+    args = ap.parse_args()
+
+    g = generate(args.scale, args.seed)
+    g.write_jsonl(args.out)
+    print(f"Wrote {args.out} ({len(g.node_labels):,} nodes, {len(g.rels):,} relationships)")
+
+
+if __name__ == "__main__":
+    main()
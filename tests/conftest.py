@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from graph_source import InMemoryGraphSource  # noqa: E402
+
+
+@pytest.fixture
+def graph():
+    """
+    A small ontology: one Hub, two Categories, three Kinds, two Families,
+    an Air chain (with numeric names) and a Ship chain whose instance sits
+    under both its class and its subclass.
+    """
+    g = InMemoryGraphSource("fixture")
+
+    def node(labels, name):
+        return g.add_node(labels, {"Shark_Name": name})
+
+    hub = node(["Hub", "SharkNode"], "Hub")
+    air = node(["Category"], "Air")
+    sea = node(["Category"], "Sea")
+    aircraft = node(["Kind"], "Aircraft")
+    ships = node(["Kind"], "Ship")
+    submarine = node(["Kind"], "Submarine")
+    fighter = node(["Family", "Object"], "Fighter")
+    frigate = node(["Family"], "Frigate")
+    jet = node(["AirType"], "Jet")
+    prop = node(["AirType"], 7)
+    f16 = node(["AirSubType"], "F-16")
+    f16_block = node(["AirSubType"], 16)
+    bronco = node(["AirSubType"], "Bronco")
+    missile = node(["WeaponType"], "Missile")
+    usa = node(["Country", "Place"], "USA")
+    maker = node(["Manufacturer"], "General Dynamics")
+    ship_type = node(["ShipType"], "Surface")
+    ship_class = node(["ShipClass"], "Oliver Hazard Perry")
+    ship_subclass = node(["ShipSubClass"], "FFG-7 Long Hull")
+    instance = node(["ShipInstance"], "USS Ingraham")
+    g.add_node(["Kind"], None)  # unnamed: not listed, no outgoing rows
+
+    for start, rel, end in [
+        (hub, "Category", air), (hub, "Category", sea),
+        (air, "Kind", aircraft), (sea, "Kind", ships), (sea, "Kind", submarine),
+        (aircraft, "Family", fighter), (ships, "Family", frigate),
+        (aircraft, "Nation", usa), (ships, "Nation", usa), (submarine, "Nation", usa),
+        (submarine, "Related", ships),
+        (fighter, "Weapon_Type", missile), (fighter, "Derivative", jet),
+        (fighter, "Manufacturer", maker),
+        (frigate, "ShipType", ship_type),
+        (jet, "SubType", f16), (jet, "SubType", f16_block), (prop, "SubType", bronco),
+        (ship_type, "Class", ship_class), (ship_class, "SubClass", ship_subclass),
+        (ship_class, "Instance", instance), (ship_subclass, "Instance", instance),
+    ]:
+        g.add_relationship(start, rel, end)
+    return g
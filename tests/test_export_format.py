@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import export_format
+from export_level import export_level
+
+
+@pytest.fixture
+def doc(graph):
+    return export_level({"database": "fixture"}, "Kind", source=graph)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trip(tmp_path, doc, compact, compress):
+    path = export_format.write_export(doc, tmp_path / "Kind.json", compact=compact, compress=compress)
+    assert path.endswith(".gz") == compress
+
+    loaded = export_format.load_export(tmp_path / "Kind.json")
+    rels = loaded["card"].pop("relationships")
+    expected = json.loads(json.dumps(doc))
+    expected_rels = expected["card"].pop("relationships")
+
+    assert loaded == expected
+    assert isinstance(rels["outgoing"], export_format.OutgoingColumns) == compact
+    assert len(rels["outgoing"]) == len(expected_rels["outgoing"])
+    assert list(rels["outgoing"]) == expected_rels["outgoing"]
+    for key in ("outgoing_generalized", "outgoing_generalized_exceptions"):
+        assert rels[key] == expected_rels[key]
+
+
+def test_compact_stores_each_value_once(doc):
+    compact = export_format.encode_compact(doc)
+    tables = compact["tables"]
+
+    assert export_format.is_compact(compact)
+    assert len(tables["names"]) == len(set(tables["names"]))
+    assert sorted(tables["rel_types"]) == ["Family", "Related"]
+    assert compact["card"]["relationships"]["outgoing"]["count"] == len(doc["card"]["relationships"]["outgoing"])
+
+
+def test_switching_compression_removes_the_stale_file(tmp_path, doc):
+    export_format.write_export(doc, tmp_path / "Kind.json", compress=True)
+    export_format.write_export(doc, tmp_path / "Kind.json")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["Kind.json"]
+
+    export_format.write_export(doc, tmp_path / "Kind.json", compress=True)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["Kind.json.gz"]
+
+
+def test_unknown_compact_version_is_rejected(doc):
+    compact = export_format.encode_compact(doc)
+    compact["format_version"] = export_format.FORMAT_VERSION + 1
+    with pytest.raises(SystemExit):
+        export_format.open_compact(compact)
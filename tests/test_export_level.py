@@ -0,0 +1,86 @@
+import pytest
+
+from bulk_export import cypher_sort_key
+from export_level import export_level
+
+CFG = {"database": "fixture"}
+
+
+def triples(rows):
+    return [(r["from_name"], r["rel_type"], r["to_name"]) for r in rows]
+
+
+def test_outgoing_rows_follow_cypher_order(graph):
+    rows = export_level(CFG, "AirType", source=graph)["card"]["relationships"]["outgoing"]
+
+    assert triples(rows) == sorted(triples(rows), key=lambda t: tuple(map(cypher_sort_key, t)))
+    # strings sort before numbers, as in Cypher ORDER BY
+    assert triples(rows) == [("Jet", "SubType", "F-16"), ("Jet", "SubType", 16), (7, "SubType", "Bronco")]
+
+
+def test_kind_collapses_nation_rows(graph):
+    rels = export_level(CFG, "Kind", source=graph)["card"]["relationships"]
+
+    assert triples(rels["outgoing"]) == [
+        ("Aircraft", "Family", "Fighter"),
+        ("Ship", "Family", "Frigate"),
+        ("Submarine", "Related", "Ship"),
+    ]
+    assert rels["outgoing_generalized"] == [
+        {"from_level": "Kind", "rel_type": "Family", "to_level": "Family", "count": 2},
+        {"from_level": "Kind", "rel_type": "Related", "to_level": "Kind", "count": 1},
+    ]
+    assert rels["outgoing_generalized_exceptions"] == [
+        {"from_level": name, "rel_type": "Nation", "to_level": "Country", "count": 1}
+        for name in ("Aircraft", "Ship", "Submarine")
+    ]
+
+
+def test_family_patterns_use_target_overrides(graph):
+    rels = export_level(CFG, "Family", source=graph)["card"]["relationships"]
+
+    assert rels["outgoing_generalized"] == [
+        {"from_level": "Family", "rel_type": "Derivative", "to_level": "AirType", "count": 1},
+        {"from_level": "Family", "rel_type": "Manufacturer", "to_level": "Company", "count": 1},
+        {"from_level": "Family", "rel_type": "ShipType", "to_level": "ShipType", "count": 1},
+        {"from_level": "Family", "rel_type": "Weapon_Type", "to_level": "WeaponType", "count": 1},
+    ]
+
+
+@pytest.mark.parametrize("level", ["Kind", "Family", "AirType"])
+@pytest.mark.parametrize("mode", [{"stream": True}, {"server_aggregate": True}])
+def test_streamed_aggregation_matches_single_shot(graph, level, mode):
+    expected = export_level(CFG, level, source=graph)["card"]["relationships"]
+    rels = export_level(CFG, level, source=graph, **mode)["card"]["relationships"]
+
+    assert rels["outgoing_generalized"] == expected["outgoing_generalized"]
+    assert rels["outgoing_generalized_exceptions"] == expected["outgoing_generalized_exceptions"]
+    if "outgoing_total" in rels:
+        assert rels["outgoing"] == []
+        assert rels["outgoing_total"] == len(expected["outgoing"])
+    else:
+        assert rels["outgoing"] == expected["outgoing"]
+
+
+def test_parent_groups_and_node_list(graph):
+    card = export_level(CFG, "Category", source=graph)["card"]
+
+    assert card["node_names"] == ["Air", "Sea"]
+    assert card["total_nodes"] == 2
+    assert card["parent_groups"] == [{"parent": "Hub", "heading": "Hub (Parent)", "nodes": ["Air", "Sea"]}]
+
+    groups = export_level(CFG, "Kind", source=graph)["card"]["parent_groups"]
+    assert [(g["parent"], g["heading"], g["nodes"]) for g in groups] == [
+        ("Air", "Air Kind", ["Aircraft"]),
+        ("Sea", "Sea Kind", ["Ship", "Submarine"]),
+    ]
+
+
+def test_deep_level_counts_names_only(graph):
+    card = export_level(CFG, "ShipInstance", source=graph)["card"]
+
+    assert card["show_node_list"] is False
+    assert card["node_names"] == []
+    assert card["parent_groups"] == []
+    assert card["total_nodes"] == 1
+    assert card["relationships_mode"] == "generalized"
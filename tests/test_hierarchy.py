@@ -0,0 +1,67 @@
+import hierarchy
+
+LEVELS = [
+    "Hub", "Category", "Kind", "Family",
+    "AirType", "AirSubType", "AirVariant", "AirSubVariant", "AirModel", "AirSubModel", "AirInstance",
+    "ShipType", "ShipSubType", "ShipClass", "ShipSubClass", "ShipInstance",
+]
+
+
+def build(graph):
+    return hierarchy.build_from_source(graph, LEVELS)
+
+
+def test_rollup_counts_descendants_per_level(graph):
+    index = build(graph)
+
+    assert index.rollup(index.find("Hub", "Hub")) == {
+        "Category": 2, "Kind": 3, "Family": 2, "WeaponType": 1,
+        "AirType": 1, "AirSubType": 2,
+        "ShipType": 1, "ShipClass": 1, "ShipSubClass": 1, "ShipInstance": 1,
+    }
+    assert index.rollup(index.find("AirType", "Jet")) == {"AirSubType": 2}
+    assert index.rollup(index.find("AirSubType", 16)) == {}
+
+
+def test_node_with_two_parents_is_counted_once(graph):
+    index = build(graph)
+    ship_class = index.find("ShipClass", "Oliver Hazard Perry")
+    instance = index.find("ShipInstance", "USS Ingraham")
+
+    assert sorted(index.children(ship_class)) == sorted([index.find("ShipSubClass", "FFG-7 Long Hull"), instance])
+    # the primary parent is the most specific one
+    assert index.parent[instance] == index.find("ShipSubClass", "FFG-7 Long Hull")
+    assert index.rollup(ship_class) == {"ShipSubClass": 1, "ShipInstance": 1}
+
+
+def test_level_totals_and_card_rollup(graph):
+    index = build(graph)
+
+    assert index.level_totals("Category")["Kind"] == 3
+    card = index.card_rollup("Category", ["Air", "Sea", "Nowhere"])
+    assert [row["name"] for row in card["rows"]] == ["Air", "Sea"]
+    assert card["rows"][0]["counts"][0] == {"level": "Kind", "count": 1}
+    assert index.card_rollup("ShipInstance", ["USS Ingraham"]) is None
+
+
+def test_save_and_load_round_trip(tmp_path, graph):
+    index = build(graph)
+    index.counts = hierarchy.counts_digest(graph.statistics(), LEVELS)
+    index.save(tmp_path)
+
+    loaded = hierarchy.HierarchyIndex.load(tmp_path)
+    assert loaded.digest == index.digest
+    assert loaded.counts == index.counts
+    assert loaded.names == index.names
+    assert [loaded.rollup(n) for n in range(len(loaded))] == [index.rollup(n) for n in range(len(index))]
+    assert hierarchy.HierarchyIndex.load(tmp_path / "missing") is None
+
+
+def test_counts_digest_follows_hierarchy_counts(graph):
+    before = hierarchy.counts_digest(graph.statistics(), LEVELS)
+
+    graph.add_node(["Country"], {"Shark_Name": "France"})
+    assert hierarchy.counts_digest(graph.statistics(), LEVELS) == before
+
+    graph.add_relationship(graph.by_label["Kind"][0], "Family", graph.add_node(["Family"], {"Shark_Name": "Bomber"}))
+    assert hierarchy.counts_digest(graph.statistics(), LEVELS) != before
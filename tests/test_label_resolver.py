@@ -0,0 +1,54 @@
+import pytest
+
+from label_resolver import RULES, LabelResolver
+
+
+def test_lowest_priority_index_wins_regardless_of_label_order():
+    resolver = LabelResolver(["A", "B", "C"], fallback="Node")
+
+    assert resolver.resolve(["C", "B"]) == "B"
+    assert resolver.resolve(("B", "C", "A")) == "A"
+    assert resolver.resolve(["C", "Zed"]) == "C"
+
+
+def test_fallback_skips_excluded_labels():
+    resolver = LabelResolver(["A"], exclude={"Noise"}, canonical={"Beta": "B"}, fallback="Node")
+
+    assert resolver.resolve(["Noise", "Gamma", "Beta"]) == "B"
+    assert resolver.resolve(["Noise"]) == "Node"
+    assert resolver.resolve([]) == "Node"
+
+
+def test_prioritized_label_cannot_be_excluded():
+    with pytest.raises(SystemExit):
+        LabelResolver(["A", "B"], exclude={"B"}, fallback="Node")
+
+
+def test_results_are_memoized_per_label_set():
+    resolver = LabelResolver(["A", "B"], fallback="Node")
+
+    assert resolver.resolve(["B", "A"]) == "A"
+    assert resolver.resolve(("B", "A")) is resolver.resolve(["B", "A"])
+    assert resolver._by_labels == {("B", "A"): "A"}
+
+
+def test_export_profile_prefers_most_specific_chain_label():
+    export = RULES.export
+
+    assert export.resolve(["AirType", "AirSubModel", "Family"]) == "AirSubModel"
+    assert export.resolve(["ShipType", "Hub", "AirType"]) == "AirType"
+    assert export.resolve(["ShipClass", "ShipType", "Kind"]) == "ShipClass"
+    assert export.resolve(["Organization", "Company"]) == "Company"
+    assert export.resolve(["Manufacturer"]) == "Company"
+    assert export.resolve(["Object", "Zebra", "Apple"]) == "Apple"
+    assert export.resolve(["Object", "SharkNode"]) == "Node"
+
+
+def test_render_profile_prefers_core_levels_then_least_specific():
+    render = RULES.render
+
+    assert render.resolve(["AirSubType", "Kind"]) == "Kind"
+    assert render.resolve(["AirSubModel", "AirType"]) == "AirType"
+    assert render.resolve(["City", "Place"]) == "Place"
+    assert render.resolve(["SharkNode", "Zebra"]) == "Zebra"
+    assert render.resolve(["SharkNode", "AirSystem"]) == "Unknown"
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Pipeline tracing for --trace.
+
+Spans record wall time and, when the instrumented code reports them, rows
+fetched and bytes written. Spans on the main thread also record the
+tracemalloc peak reached while they were open; tracemalloc keeps one
+process-wide peak, so spans on worker threads (the Graphviz pool) or on
+their own ``tid`` track (the asyncio export workers) record none. Their
+memory shows up in the peak of the main-thread stage that ran the pool.
+The result is a Chrome trace file (open it in
+chrome://tracing or https://ui.perfetto.dev) plus a summary table on stdout:
+
+    python3 render_all.py --trace trace.json
+
+Scripts that render_all.py runs as subprocesses (export_level.py,
+render_one.py, generate_diagrams.py) find the trace directory in the
+ONTOLOGY_TRACE_DIR environment variable, write their own events there as
+``<process>-<pid>.json`` and render_all.py merges them into the one file.
+Each script also accepts --trace on its own.
+
+With tracing off, span() and progress() return shared no-op objects.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+TRACE_DIR_ENV = "ONTOLOGY_TRACE_DIR"
+
+# Progress lines start once a task has run this long, then refresh at most this often.
+PROGRESS_AFTER_S = 2.0
+PROGRESS_EVERY_S = 0.5
+
+
+class Tracer:
+    def __init__(self, process_name: str):
+        self.process_name = process_name
+        self.pid = os.getpid()
+        self.events: List[Dict[str, Any]] = [{
+            "name": "process_name", "ph": "M", "pid": self.pid, "tid": 0, "args": {"name": process_name},
+        }]
+        self.expected_rows: Dict[str, int] = {}
+        # perf_counter for durations, anchored to wall time so events of several processes line up
+        self._t0 = time.perf_counter()
+        self._wall0 = time.time()
+        self._local = threading.local()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _now_us(self) -> float:
+        return (self._wall0 + time.perf_counter() - self._t0) * 1e6
+
+    def _stack(self) -> List[Dict[str, Any]]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str, cat: str = "stage", *, tid: Optional[int] = None, **args):
+        """
+        Time a block. Yields the span's ``args`` dict; set ``rows`` / ``bytes``
+        on it to have them recorded and summed in the summary. ``tid`` puts
+        the span on its own track (e.g. one per asyncio worker); such spans,
+        like those on worker threads, run concurrently and record no peak.
+        """
+        track = threading.get_ident() % 2**31 if tid is None else tid
+        if tid is not None or threading.current_thread() is not threading.main_thread():
+            start = self._now_us()
+            try:
+                yield args
+            finally:
+                self._complete(name, cat, start, track, args)
+            return
+        stack = self._stack()
+        # Nested spans share tracemalloc's single peak: fold the peak so far
+        # into the enclosing span before resetting it for this one.
+        peak = tracemalloc.get_traced_memory()[1]
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        frame = {"peak": 0}
+        stack.append(frame)
+        start = self._now_us()
+        try:
+            yield args
+        finally:
+            end = self._now_us()
+            stack.pop()
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            args["peak_bytes"] = peak
+            self._complete(name, cat, start, track, args, end)
+
+    def _complete(self, name: str, cat: str, start: float, track: int, args: Dict[str, Any],
+                  end: Optional[float] = None):
+        self.events.append({
+            "name": name, "cat": cat, "ph": "X", "ts": start, "dur": (end or self._now_us()) - start,
+            "pid": self.pid, "tid": track, "args": args,
+        })
+
+
+class _NullSpan:
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Progress:
+    """Single stderr status line with rate and ETA, shown only for long-running tasks."""
+
+    def __init__(self, label: str, total: Optional[int] = None, unit: str = "rows"):
+        self.label = label
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.start = time.perf_counter()
+        self._next = self.start + PROGRESS_AFTER_S
+        self._shown = False
+
+    def advance(self, n: int = 1) -> None:
+        self.done += n
+        now = time.perf_counter()
+        if now >= self._next:
+            self._next = now + PROGRESS_EVERY_S
+            self._show(now)
+
+    def _show(self, now: float) -> None:
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        line = f"{self.label}: {self.done:,}"
+        if self.total:
+            line += f"/{self.total:,} {self.unit} ({min(self.done / self.total, 1):.0%})"
+            if rate > 0 and self.done < self.total:
+                line += f", ETA {(self.total - self.done) / rate:,.0f}s"
+        else:
+            line += f" {self.unit}"
+        line += f", {rate:,.0f} {self.unit}/s, {elapsed:,.1f}s"
+        sys.stderr.write("\r" + line.ljust(100))
+        sys.stderr.flush()
+        self._shown = True
+
+    def close(self) -> None:
+        if self._shown:
+            self._show(time.perf_counter())
+            sys.stderr.write("\n")
+            sys.stderr.flush()
+
+
+class _NullProgress:
+    def advance(self, n: int = 1) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+_NULL_PROGRESS = _NullProgress()
+_tracer: Optional[Tracer] = None
+_output: Optional[Path] = None
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, cat: str = "stage", *, tid: Optional[int] = None, **args):
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, cat, tid=tid, **args)
+
+
+def progress(label: str, total: Optional[int] = None, unit: str = "rows"):
+    if _tracer is None:
+        return _NULL_PROGRESS
+    return Progress(label, total, unit)
+
+
+def set_expected_rows(counts: Dict[str, int]) -> None:
+    """Expected outgoing rows per level label (e.g. db statistics), used as progress totals."""
+    if _tracer is not None:
+        _tracer.expected_rows.update(counts)
+
+
+def expected_rows(level_label: str) -> Optional[int]:
+    return _tracer.expected_rows.get(level_label) if _tracer is not None else None
+
+
+def setup(process_name: str, trace_path: Optional[str] = None) -> None:
+    """
+    Enable tracing when ``trace_path`` is given (this process writes the
+    trace file) or when a parent process exported ONTOLOGY_TRACE_DIR.
+
+    A no-op when tracing is already on, e.g. render_all.py calling
+    generate_diagrams.main() in process.
+    """
+    global _tracer, _output
+    if _tracer is not None:
+        return
+    if trace_path:
+        _output = Path(trace_path)
+        # Subprocesses write their parts next to the trace file.
+        parts = _output.with_name(_output.name + ".parts")
+        parts.mkdir(parents=True, exist_ok=True)
+        for stale in parts.glob("*.json"):
+            stale.unlink()
+        os.environ[TRACE_DIR_ENV] = str(parts)
+    elif not os.environ.get(TRACE_DIR_ENV):
+        return
+    _tracer = Tracer(process_name)
+
+
+def finish(process_name: str) -> None:
+    """
+    Write this process's events: the merged trace plus summary, or a part
+    file for the parent. Only the caller that set tracing up finishes it.
+    """
+    global _tracer
+    if _tracer is None or _tracer.process_name != process_name:
+        return
+    tracer, _tracer = _tracer, None
+    tracemalloc.stop()
+
+    parts_dir = Path(os.environ[TRACE_DIR_ENV]) if os.environ.get(TRACE_DIR_ENV) else None
+    if _output is None:
+        if parts_dir is not None:
+            part = parts_dir / f"{tracer.process_name}-{tracer.pid}.json"
+            part.write_text(json.dumps(tracer.events), encoding="utf-8")
+        return
+
+    events = list(tracer.events)
+    if parts_dir is not None and parts_dir.is_dir():
+        for part in sorted(parts_dir.glob("*.json")):
+            events.extend(json.loads(part.read_text(encoding="utf-8")))
+            part.unlink()
+        parts_dir.rmdir()
+        os.environ.pop(TRACE_DIR_ENV, None)
+
+    _output.parent.mkdir(parents=True, exist_ok=True)
+    _output.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8")
+    print(summary_table(events))
+    print(f"Wrote trace {_output}")
+
+
+def summary_table(events: List[Dict[str, Any]], limit: int = 40) -> str:
+    """Spans grouped by name and level, slowest first."""
+    groups: Dict[tuple, Dict[str, Any]] = defaultdict(lambda: {"calls": 0, "us": 0.0, "rows": 0, "bytes": 0, "peak": None})
+    for e in events:
+        if e.get("ph") != "X":
+            continue
+        args = e.get("args") or {}
+        g = groups[(e["name"], str(args.get("level", "")))]
+        g["calls"] += 1
+        g["us"] += e["dur"]
+        g["rows"] += int(args.get("rows") or 0)
+        g["bytes"] += int(args.get("bytes") or 0)
+        if "peak_bytes" in args:
+            g["peak"] = max(g["peak"] or 0, int(args["peak_bytes"]))
+
+    lines = [
+        "Trace summary (slowest first):",
+        f"  {'span':<22} {'level':<14} {'calls':>5} {'seconds':>9} {'rows':>11} {'bytes':>13} {'peak MiB':>9}",
+    ]
+    ordered = sorted(groups.items(), key=lambda kv: -kv[1]["us"])
+    for (name, level), g in ordered[:limit]:
+        lines.append(
+            f"  {name:<22} {level:<14} {g['calls']:>5} {g['us'] / 1e6:>9.3f} {g['rows']:>11,} "
+            f"{g['bytes']:>13,} {'-' if g['peak'] is None else format(g['peak'] / 2**20, '.1f'):>9}"
+        )
+    if len(ordered) > limit:
+        lines.append(f"  ... {len(ordered) - limit} more")
+    return "\n".join(lines)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+render_all.py --watch: rebuild only what a changed file affects.
+
+After the normal build, render_all keeps the graph source (and its Neo4j
+driver) open and the exported level documents in memory, then polls the
+inputs every --watch-interval seconds:
+
+  templates/*.j2 (cards)        re-render the cards from memory, reassemble
+  templates/title.md.j2,        reassemble only
+  templates/diagrams.md
+  <json-dir>/<Level>.json[.gz]  reload that level, re-render its card,
+                                regenerate the diagrams, reassemble
+  levels.txt                    export added levels from the open source,
+                                render them, reassemble
+  label_rules.json              exports depend on the rules: restart
+                                render_all with the same arguments
+
+Cards, diagrams and the assembly go through the build caches, so a rebuild
+only writes the artifacts whose inputs changed. Polling uses modification
+times only (no extra dependency); stop with Ctrl-C.
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import label_resolver
+import render_all
+import tracing
+from export_format import load_export
+
+# Templates that only feed the assembled document, not the cards
+ASSEMBLY_TEMPLATES = {"title.md.j2", "diagrams.md"}
+
+Stamp = Tuple[int, int]
+
+
+def stamp(path: Path) -> Optional[Stamp]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def export_level_name(path: Path) -> Optional[str]:
+    """Level of an export file name (<Level>.json or <Level>.json.gz), else None."""
+    name = path.name
+    for suffix in (".json.gz", ".json"):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return None
+
+
+class Watcher:
+    def __init__(self, args, root: Path, source, cfg: dict, levels: List[str], docs: Dict[str, dict],
+                 hierarchy_index, db_stats: dict, card_cache, diagram_args: List[str]):
+        self.args = args
+        self.root = root
+        self.source = source
+        self.cfg = cfg
+        self.levels = list(levels)
+        self.docs = docs
+        self.hierarchy_index = hierarchy_index
+        self.db_stats = db_stats
+        self.card_cache = card_cache
+        self.diagram_args = diagram_args
+
+        self.templates_dir = root / "templates"
+        self.json_dir = root / args.json_dir
+        self.out_dir = root / args.out_dir
+        self.levels_path = None if args.levels else root / args.levels_file
+        self.cache_dir = None if args.no_cache else root / args.cache_dir
+        self.stamps = self.scan()
+
+    # -- polling -----------------------------------------------------------
+
+    def watched_files(self) -> List[Path]:
+        files = [p for p in self.templates_dir.iterdir() if p.is_file()]
+        files += [p for p in self.json_dir.iterdir() if export_level_name(p) is not None]
+        files.append(label_resolver.RULES_PATH)
+        if self.levels_path is not None:
+            files.append(self.levels_path)
+        return files
+
+    def scan(self) -> Dict[Path, Stamp]:
+        stamps = {p: stamp(p) for p in self.watched_files()}
+        return {p: s for p, s in stamps.items() if s is not None}
+
+    def changes(self) -> List[Path]:
+        current = self.scan()
+        changed = [p for p in current.keys() | self.stamps.keys() if current.get(p) != self.stamps.get(p)]
+        self.stamps = current
+        return sorted(changed)
+
+    # -- rebuild steps -----------------------------------------------------
+
+    def render_cards(self, levels: List[str]) -> None:
+        with tracing.span("render_cards"):
+            render_all.render_levels_in_process(levels, self.json_dir, self.out_dir, self.templates_dir,
+                                                self.card_cache, self.hierarchy_index, docs=self.docs)
+        self.card_cache.save()
+
+    def generate_diagrams(self) -> None:
+        if (self.root / "generate_diagrams.py").exists():
+            import generate_diagrams
+            with tracing.span("diagrams"):
+                generate_diagrams.main(self.diagram_args)
+
+    def assemble(self) -> None:
+        rendered_files = [self.out_dir / f"{lvl}.md" for lvl in self.levels]
+        render_all.assemble_document(self.templates_dir, self.levels, rendered_files, self.db_stats,
+                                     self.root / self.args.assembled_md, self.cache_dir)
+
+    def export_levels(self, levels: List[str]) -> None:
+        args = self.args
+        with tracing.span("export"):
+            render_all.export_levels_in_process(
+                self.source, self.cfg, levels, self.json_dir, args.stream, args.server_aggregate,
+                args.compact, args.gzip, args.property_profile, args.chunk_size,
+            )
+        self.hierarchy_index = render_all.update_hierarchy_index(
+            self.source, self.levels, self.json_dir, self.source.statistics()
+        )
+        for lvl in levels:
+            self.docs.pop(lvl, None)
+        # The new exports are handled here, not as changes on the next poll
+        self.stamps = self.scan()
+
+    def restart(self) -> None:
+        print("label_rules.json changed: exports depend on the rules, restarting render_all")
+        self.source.close()
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    def rebuild(self, changed: List[Path]) -> None:
+        if label_resolver.RULES_PATH in changed:
+            self.restart()
+
+        cards = False
+        card_levels = set()
+        diagrams = False
+        if self.levels_path is not None and self.levels_path in changed:
+            levels = render_all.read_levels_file(self.levels_path)
+            added = [lvl for lvl in levels if lvl not in self.levels]
+            self.levels = levels
+            if added:
+                print(f"levels.txt: exporting {', '.join(added)}")
+                self.export_levels(added)
+                # The rebuilt rollup index can change every card's rollups
+                cards = diagrams = True
+
+        for path in changed:
+            if path.parent == self.templates_dir and path.name not in ASSEMBLY_TEMPLATES:
+                cards = True
+            elif path.parent == self.json_dir:
+                lvl = export_level_name(path)
+                if lvl in self.levels and path.exists():
+                    self.docs[lvl] = load_export(path)
+                    card_levels.add(lvl)
+                    diagrams = True
+
+        if cards:
+            self.render_cards(self.levels)
+        elif card_levels:
+            self.render_cards([lvl for lvl in self.levels if lvl in card_levels])
+        if diagrams:
+            self.generate_diagrams()
+        self.assemble()
+
+    def run(self) -> None:
+        interval = self.args.watch_interval
+        print(f"Watching {self.templates_dir}, {self.json_dir}"
+              + (f", {self.levels_path}" if self.levels_path is not None else "")
+              + f" and {label_resolver.RULES_PATH.name} (Ctrl-C to stop)")
+        try:
+            while True:
+                time.sleep(interval)
+                changed = self.changes()
+                if not changed:
+                    continue
+                # Let multi-step editor saves settle before reading the files
+                time.sleep(min(interval, 0.1))
+                changed = sorted(set(changed) | set(self.changes()))
+                print("Changed: " + ", ".join(os.path.relpath(p, self.root) for p in changed))
+                started = time.perf_counter()
+                self.rebuild(changed)
+                print(f"Rebuilt in {time.perf_counter() - started:.2f}s")
+        except KeyboardInterrupt:
+            print("Stopped watching")
+        finally:
+            self.source.close()